@@ -0,0 +1,214 @@
+# backend/apps/accounts/bulk_import.py
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import connection, connections, transaction
+
+from organizations.personal import create_personal_organizations, is_lazy
+from .models import User
+
+# Columns copied onto the user; everything else in a row is ignored
+FIELDS = ('email', 'first_name', 'last_name', 'phone', 'country', 'city', 'county')
+
+# Below this many passwords a batch is hashed inline; the pool isn't worth the round trip
+POOL_THRESHOLD = 16
+
+
+class ImportFormatError(ValueError):
+    """The input isn't CSV with an email column or JSON Lines"""
+
+
+def read_csv(lines):
+    """Yield one dict per CSV row"""
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames or 'email' not in reader.fieldnames:
+        raise ImportFormatError("CSV input needs a header row with an 'email' column")
+    yield from reader
+
+
+def read_jsonl(lines):
+    """Yield one dict per line of JSON Lines input (blank lines are skipped)"""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise ImportFormatError(f"Line {number}: {e}")
+        if not isinstance(row, dict):
+            raise ImportFormatError(f"Line {number}: expected a JSON object")
+        yield row
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def _hash(password):
+    return make_password(password or None)
+
+
+def _init_worker():
+    django.setup()
+
+
+class UserImporter:
+    """
+    Create users with their personal organization and OWNER membership in bulk.
+
+    Rows are read `batch_size` at a time. Each batch costs a handful of
+    queries: one to skip emails and phones already taken, one bulk_create
+    each for users, organizations and memberships, and one slug counter
+    claim per distinct organization name. Passwords, the expensive part,
+    are hashed across a process pool. `password_hash` columns that are
+    already Django hashes are stored as they are.
+
+    No post_save signals fire; the organizations and memberships are built
+    with the same helpers the signup signal uses, so the end state matches
+    creating each user through User.objects.create_user().
+    """
+
+    def __init__(self, batch_size=1000, processes=None, max_errors=1000):
+        self.batch_size = batch_size
+        self.processes = processes or getattr(settings, 'USER_IMPORT_PROCESSES', None) or os.cpu_count()
+        self.max_errors = max_errors
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+        self._pool = None
+        self._seen_emails = set()
+        self._seen_phones = set()
+
+    def run(self, rows):
+        """Import an iterable of dicts; returns a report"""
+        rows = enumerate(rows, 1)
+        try:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self._import_batch(batch)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        return {
+            'created': self.created,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'errors_truncated': self.skipped > len(self.errors),
+        }
+
+    def _skip(self, number, email, reason):
+        self.skipped += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': number, 'email': email, 'error': reason})
+
+    def _clean(self, batch):
+        """Normalize rows and drop those that can't be imported"""
+        cleaned = []
+        for number, row in batch:
+            values = {field: (row.get(field) or '').strip() for field in FIELDS}
+            values['email'] = User.objects.normalize_email(values['email'])
+            values['phone'] = User.objects.normalize_phone(values['phone'])
+            values['country'] = values['country'] or 'KE'
+            if not values['email'] or '@' not in values['email']:
+                self._skip(number, values['email'], 'Invalid email')
+                continue
+            too_long = _too_long(values)
+            if too_long:
+                self._skip(number, values['email'], too_long)
+                continue
+            if values['email'] in self._seen_emails:
+                self._skip(number, values['email'], 'Duplicate email in input')
+                continue
+            if values['phone'] and values['phone'] in self._seen_phones:
+                self._skip(number, values['email'], 'Duplicate phone in input')
+                continue
+            self._seen_emails.add(values['email'])
+            if values['phone']:
+                self._seen_phones.add(values['phone'])
+            cleaned.append((number, values, row.get('password') or '', row.get('password_hash') or ''))
+
+        taken_emails = set(User.objects.filter(
+            email__in=[values['email'] for _, values, _, _ in cleaned]
+        ).values_list('email', flat=True))
+        taken_phones = set(User.objects.filter(
+            phone__in=[values['phone'] for _, values, _, _ in cleaned if values['phone']]
+        ).values_list('phone', flat=True))
+
+        kept = []
+        for number, values, password, password_hash in cleaned:
+            if values['email'] in taken_emails:
+                self._skip(number, values['email'], 'Email already registered')
+            elif values['phone'] in taken_phones:
+                self._skip(number, values['email'], 'Phone already registered')
+            else:
+                kept.append((values, password, password_hash))
+        return kept
+
+    def _hash_passwords(self, passwords):
+        if len(passwords) < POOL_THRESHOLD or self.processes <= 1:
+            return [_hash(password) for password in passwords]
+        if self._pool is None:
+            # Forked workers must not inherit open database connections
+            if not connection.in_atomic_block:
+                connections.close_all()
+            self._pool = ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker)
+        chunksize = max(1, len(passwords) // (self.processes * 4))
+        return list(self._pool.map(_hash, passwords, chunksize=chunksize))
+
+    def _import_batch(self, batch):
+        rows = self._clean(batch)
+        if not rows:
+            return
+
+        # Pre-hashed passwords are kept; plain ones go to the pool
+        hashes = [password_hash if _is_hash(password_hash) else None for _, _, password_hash in rows]
+        to_hash = [i for i, hashed in enumerate(hashes) if hashed is None]
+        for i, hashed in zip(to_hash, self._hash_passwords([rows[i][1] for i in to_hash])):
+            hashes[i] = hashed
+
+        # Like signup, personal organizations wait for the first organizer request in lazy mode
+        eager = not is_lazy()
+        users = [
+            User(password=hashed, has_personal_organization=eager, **values)
+            for (values, _, _), hashed in zip(rows, hashes)
+        ]
+
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            if eager:
+                create_personal_organizations(users)
+        self.created += len(users)
+
+
+def _too_long(values):
+    # One oversized value would fail the whole bulk_create on databases that enforce lengths
+    for field in FIELDS:
+        max_length = User._meta.get_field(field).max_length
+        if values[field] and len(values[field]) > max_length:
+            return f"{field} is longer than {max_length} characters"
+    return None
+
+
+def _is_hash(value):
+    if not value:
+        return False
+    try:
+        identify_hasher(value)
+    except ValueError:
+        return False
+    return True
+
+
+def import_users(lines, format='csv', **options):
+    """Import users from text lines in `format` ('csv' or 'jsonl')"""
+    if format not in READERS:
+        raise ImportFormatError(f"Unknown format {format!r}; use one of {', '.join(READERS)}")
+    return UserImporter(**options).run(READERS[format](lines))
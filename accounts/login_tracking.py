@@ -0,0 +1,178 @@
+# backend/apps/accounts/login_tracking.py
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import models
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+class LoginTracker:
+    """
+    Write-behind buffer for User.last_login and User.login_count.
+
+    - record() touches only the cache: it increments the user's pending
+      login count, stores the login time, and appends the user id to a
+      pending log (a sequence counter plus one key per entry)
+    - Once `flush_interval` seconds have passed, the next record() flushes
+      the log from the last flushed position, with one UPDATE per
+      `batch_size` entries; a cache lock keeps to one flusher at a time
+      across workers
+    - The process flushes once more at exit
+
+    Everything pending lives in the cache, so a worker killed before
+    flushing loses nothing as long as that cache is shared: any worker's
+    next flush writes its logins. With a process-local cache (LocMemCache,
+    DummyCache) that doesn't hold, and record() writes each login straight
+    to the database instead; pass `shared_cache` to override the check.
+    Entries older than `key_timeout` expire unflushed.
+    """
+
+    def __init__(self, prefix='accounts:logins', flush_interval=None, batch_size=500,
+                 key_timeout=7 * 24 * 3600, lock_timeout=60, shared_cache=None):
+        self.prefix = prefix
+        self.flush_interval = flush_interval or getattr(settings, 'LOGIN_TRACKING_FLUSH_INTERVAL', 5)
+        self.batch_size = batch_size
+        self.key_timeout = key_timeout
+        self.lock_timeout = lock_timeout
+        self.shared_cache = shared_cache
+
+        self._next_flush = 0.0
+        self._lock = threading.Lock()
+
+    def _count_key(self, user_id):
+        return f"{self.prefix}:count:{user_id}"
+
+    def _last_key(self, user_id):
+        return f"{self.prefix}:last:{user_id}"
+
+    def _log_key(self, position):
+        return f"{self.prefix}:log:{position}"
+
+    def _write_behind(self):
+        if self.shared_cache is not None:
+            return self.shared_cache
+        return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+    def record(self, user, when=None):
+        """Count one login for `user`"""
+        when = when or timezone.now()
+        if not self._write_behind():
+            User.objects.filter(pk=user.pk).update(login_count=F('login_count') + 1, last_login=when)
+            return
+
+        count_key = self._count_key(user.pk)
+        cache.add(count_key, 0, self.key_timeout)
+        try:
+            cache.incr(count_key)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(count_key, 1, self.key_timeout)
+        cache.set(self._last_key(user.pk), when, self.key_timeout)
+        cache.set(self._log_key(self._next_position()), user.pk, self.key_timeout)
+
+        with self._lock:
+            due = time.monotonic() >= self._next_flush
+            if due:
+                self._next_flush = time.monotonic() + self.flush_interval
+        if due:
+            self.flush()
+
+    def _next_position(self):
+        head_key = f"{self.prefix}:head"
+        while True:
+            # Restart after the flushed position if the counter was evicted, so no position is reused
+            cache.add(head_key, cache.get(f"{self.prefix}:flushed") or 0, None)
+            try:
+                return cache.incr(head_key)
+            except ValueError:
+                continue
+
+    def flush(self):
+        """Write pending logins to the database; returns the number of users updated"""
+        lock_key = f"{self.prefix}:flush-lock"
+        if not cache.add(lock_key, 1, self.lock_timeout):
+            # Another worker is flushing; the log waits for the next one
+            return 0
+
+        flushed_key, seen_key = f"{self.prefix}:flushed", f"{self.prefix}:seen-head"
+        try:
+            position = cache.get(flushed_key) or 0
+            head = cache.get(f"{self.prefix}:head") or 0
+            # A position claimed before the previous flush started has had its entry written by
+            # now; a missing one there expired. Newer gaps may still be being written: stop at them.
+            settled = cache.get(seen_key) or 0
+            cache.set(seen_key, head, None)
+
+            flushed = 0
+            while position < head:
+                positions = range(position + 1, min(head, position + self.batch_size) + 1)
+                entries = cache.get_many([self._log_key(n) for n in positions])
+                flushed += self._flush_batch(list(dict.fromkeys(entries.values())))
+
+                done = position
+                for n in positions:
+                    if self._log_key(n) not in entries and n > settled:
+                        break
+                    done = n
+                cache.delete_many([self._log_key(n) for n in range(position + 1, done + 1)])
+                cache.set(flushed_key, done, None)
+                if done < positions[-1]:
+                    break
+                position = done
+        finally:
+            cache.delete(lock_key)
+        return flushed
+
+    def _flush_batch(self, user_ids):
+        counts = cache.get_many([self._count_key(user_id) for user_id in user_ids])
+        lasts = cache.get_many([self._last_key(user_id) for user_id in user_ids])
+        logins = {
+            user_id: (counts.get(self._count_key(user_id)) or 0, lasts.get(self._last_key(user_id)))
+            for user_id in user_ids
+        }
+        logins = {user_id: login for user_id, login in logins.items() if login[0] or login[1]}
+        if not logins:
+            return 0
+
+        User.objects.filter(pk__in=logins).update(
+            login_count=F('login_count') + Case(
+                *[When(pk=user_id, then=Value(count)) for user_id, (count, _) in logins.items()],
+                default=Value(0),
+                output_field=models.IntegerField(),
+            ),
+            last_login=Case(
+                *[When(pk=user_id, then=Value(last)) for user_id, (_, last) in logins.items() if last],
+                default=F('last_login'),
+                output_field=models.DateTimeField(),
+            ),
+        )
+
+        # Subtract what was written; logins recorded meanwhile stay pending
+        for user_id, (count, _) in logins.items():
+            if count:
+                try:
+                    cache.decr(self._count_key(user_id), count)
+                except ValueError:
+                    pass
+        return len(logins)
+
+    def flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.warning("Could not flush pending logins at exit", exc_info=True)
+
+
+login_tracker = LoginTracker()
+atexit.register(login_tracker.flush_at_exit)
@@ -0,0 +1,35 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.bulk_import import READERS, ImportFormatError, import_users
+
+
+class Command(BaseCommand):
+    help = "Bulk-import users (with personal organizations) from CSV or JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="CSV with a header row, or JSON Lines ('-' for stdin)")
+        parser.add_argument('--format', choices=sorted(READERS), help="Default: from the file extension")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--processes', type=int, help="Password hashing processes (default: one per CPU)")
+
+    def handle(self, *args, **options):
+        path = options['file']
+        format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        try:
+            report = import_users(
+                stream, format, batch_size=options['batch_size'], processes=options['processes']
+            )
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']} ({error['email']}): {error['error']}")
+        self.stdout.write(json.dumps({k: v for k, v in report.items() if k != 'errors'}))
+        self.stderr.write(self.style.SUCCESS(f"Imported {report['created']} users, skipped {report['skipped']}"))
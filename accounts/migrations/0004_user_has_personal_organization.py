@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+def flag_existing_personal_organizations(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    User.objects.filter(owned_organizations__org_type='personal').update(has_personal_organization=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_remove_kycverification_deevents_ky_user_id_f00963_idx_and_more'),
+        ('organizations', '0002_slugcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='has_personal_organization',
+            field=models.BooleanField(default=False, verbose_name='has personal organization'),
+        ),
+        migrations.RunPython(flag_existing_personal_organizations, migrations.RunPython.noop),
+    ]
@@ -8,6 +8,16 @@ from django.utils.translation import gettext_lazy as _
 
 
 class UserManager(BaseUserManager):
+    @classmethod
+    def normalize_phone(cls, phone):
+        """Store Kenyan numbers in +254 form, as signup does (0712345678 -> +254712345678)"""
+        phone = (phone or '').strip()
+        if not phone:
+            return None
+        if phone.startswith('0') and len(phone) == 10:
+            return '+254' + phone[1:]
+        return phone
+
     def create_user(self, email, password=None, **extra_fields):
         """Create and return a regular user with an email and password."""
         if not email:
@@ -82,6 +92,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_verified = models.BooleanField(_('verified status'), default=False)
     is_active = models.BooleanField(_('active'), default=True)
     is_staff = models.BooleanField(_('staff status'), default=False)
+    # Set once the personal organization exists (see organizations.personal)
+    has_personal_organization = models.BooleanField(_('has personal organization'), default=False)
     
     # Settings - FIXED: Change from 'timezone' to 'timezone_field' to avoid conflict
     language = models.CharField(_('language'), max_length=10, default='en')
@@ -37,16 +37,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         validated_data.pop('password2')
         
         # Handle phone
-        phone = validated_data.get('phone')
-        if phone:
-            # Format phone
-            phone = phone.strip()
-            if phone.startswith('0') and len(phone) == 10:
-                validated_data['phone'] = '+254' + phone[1:]
-            elif phone.startswith('+254'):
-                validated_data['phone'] = phone
-            elif not phone:  # If empty string
-                validated_data['phone'] = None
+        if 'phone' in validated_data:
+            validated_data['phone'] = User.objects.normalize_phone(validated_data['phone'])
         
         # Set default country
         if not validated_data.get('country'):
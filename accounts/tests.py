@@ -1,15 +1,24 @@
 # backend/apps/accounts/tests.py
 from datetime import timezone
+import io
+import json
 import os
 import tempfile
 from unittest.mock import patch, MagicMock
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models.signals import post_save
+from django.contrib.auth.hashers import make_password
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient, APIRequestFactory
 from rest_framework_simplejwt.tokens import RefreshToken
+from organizations.models import Organization, OrganizationMember
+from .bulk_import import POOL_THRESHOLD, ImportFormatError, UserImporter, import_users
+from .login_tracking import LoginTracker, login_tracker
 from .models import User, KYCVerification
 from .views import (
     RegisterView, LoginView, LogoutView, RequestPasswordResetView, UserProfileView, 
@@ -219,7 +228,8 @@ class UserLoginTests(BaseTestCase):
         self.assertEqual(response.data['user']['email'], 'testuser@example.com')
         self.assertEqual(response.data['message'], 'Login successful!')
         
-        # Verify login count was incremented
+        # Verify login count was incremented once pending logins are written
+        login_tracker.flush()
         user = User.objects.get(email='testuser@example.com')
         self.assertGreater(user.login_count, 0)
     
@@ -990,4 +1000,252 @@ class KYCVerificationModelTests(TestCase):
         self.assertEqual(self.kyc.status, 'rejected')
         self.assertEqual(self.kyc.verified_by, admin_user)
         self.assertEqual(self.kyc.verified_at, fixed_time)
-        self.assertEqual(self.kyc.rejection_reason, reason)
\ No newline at end of file
+        self.assertEqual(self.kyc.rejection_reason, reason)
+
+
+class LoginTrackingTests(TestCase):
+    """Test the write-behind login tracker"""
+    
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(email=f'login{i}@example.com', password='x', first_name='Login', last_name='User')
+            for i in range(3)
+        ]
+        self.tracker = self.make_tracker()
+    
+    def make_tracker(self):
+        # The test cache is process-local; behave as if it were shared between workers
+        tracker = LoginTracker(flush_interval=3600, shared_cache=True)
+        tracker._next_flush = float('inf')
+        return tracker
+    
+    def test_logins_are_written_behind(self):
+        """Test logins reach the database only on flush, in one UPDATE"""
+        for user in self.users + self.users[:1]:
+            self.tracker.record(user)
+        self.assertEqual(User.objects.get(pk=self.users[0].pk).login_count, 0)
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(self.tracker.flush(), 3)
+        
+        counts = dict(User.objects.filter(pk__in=[u.pk for u in self.users]).values_list('email', 'login_count'))
+        self.assertEqual(counts, {'login0@example.com': 2, 'login1@example.com': 1, 'login2@example.com': 1})
+        self.assertIsNotNone(User.objects.get(pk=self.users[1].pk).last_login)
+        self.assertEqual(self.tracker.flush(), 0)
+    
+    def test_counts_survive_worker_restart(self):
+        """Test a worker that dies unflushed leaves its counts for the next flush"""
+        self.tracker.record(self.users[0])
+        self.tracker.record(self.users[0])
+        
+        self.tracker.record(self.users[1])
+        
+        # Another worker's flush picks them up without either user logging in again
+        self.assertEqual(self.make_tracker().flush(), 2)
+        
+        counts = dict(User.objects.filter(pk__in=[u.pk for u in self.users[:2]]).values_list('email', 'login_count'))
+        self.assertEqual(counts, {'login0@example.com': 2, 'login1@example.com': 1})
+    
+    def test_flush_stops_at_an_entry_still_being_written(self):
+        """Test a log position claimed but not yet filled is waited for once, then skipped"""
+        self.tracker.record(self.users[0])
+        cache.incr(f'{self.tracker.prefix}:head')  # Claimed; the worker hasn't stored the user yet
+        self.tracker.record(self.users[1])
+        
+        self.assertEqual(self.tracker.flush(), 2)
+        self.assertEqual(cache.get(f'{self.tracker.prefix}:flushed'), 1)
+        
+        self.tracker.flush()
+        self.assertEqual(cache.get(f'{self.tracker.prefix}:flushed'), 3)
+        self.assertEqual(User.objects.get(pk=self.users[1].pk).login_count, 1)
+    
+    def test_process_local_cache_writes_through(self):
+        """Test logins go straight to the database when the cache isn't shared"""
+        tracker = LoginTracker()
+        with self.assertNumQueries(1):
+            tracker.record(self.users[0])
+        self.assertEqual(User.objects.get(pk=self.users[0].pk).login_count, 1)
+    
+    def test_flush_waits_for_other_worker(self):
+        """Test pending logins are kept while another worker holds the flush lock"""
+        self.tracker.record(self.users[0])
+        cache.add(f'{self.tracker.prefix}:flush-lock', 1)
+        
+        self.assertEqual(self.tracker.flush(), 0)
+        cache.delete(f'{self.tracker.prefix}:flush-lock')
+        self.assertEqual(self.tracker.flush(), 1)
+        self.assertEqual(User.objects.get(pk=self.users[0].pk).login_count, 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BulkUserImportTests(BaseTestCase):
+    """Test bulk user import (command and admin endpoint)"""
+    
+    CSV = (
+        "email,password,first_name,last_name,phone,country\n"
+        "jane@example.com,JanePass123!,Jane,Doe,+254700000001,KE\n"
+        "john@example.com,JohnPass123!,John,,,UG\n"
+    )
+    
+    def test_import_matches_create_user(self):
+        """Test imported users end up like users created one by one"""
+        report = import_users(io.StringIO(self.CSV))
+        
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['skipped'], 0)
+        jane = User.objects.get(email='jane@example.com')
+        self.assertTrue(jane.check_password('JanePass123!'))
+        self.assertEqual(jane.phone, '+254700000001')
+        
+        expected = User.objects.create_user(email='ref@example.com', password='x', first_name='Jane')
+        for user in (jane, expected):
+            organization = Organization.objects.get(owner=user)
+            self.assertEqual(organization.name, "Jane's Events")
+            self.assertEqual(organization.org_type, Organization.OrganizationType.PERSONAL)
+            self.assertEqual(organization.email, user.email)
+            membership = OrganizationMember.objects.get(organization=organization, user=user)
+            self.assertEqual(membership.role, OrganizationMember.Role.OWNER)
+            self.assertTrue(membership.can_create_events)
+            self.assertTrue(membership.can_manage_tickets)
+            self.assertTrue(membership.can_manage_team)
+            self.assertTrue(membership.can_view_analytics)
+        
+        slugs = set(Organization.objects.filter(name="Jane's Events").values_list('slug', flat=True))
+        self.assertEqual(slugs, {'janes-events', 'janes-events-1'})
+    
+    def test_import_skips_duplicate_and_existing_users(self):
+        """Test rows for taken emails or phones are reported, not imported"""
+        lines = [
+            '{"email": "new@example.com", "password": "x", "phone": "+254700000009"}',
+            '',
+            '{"email": "new@EXAMPLE.com", "password": "x"}',
+            '{"email": "testuser@example.com", "password": "x"}',
+            '{"email": "other@example.com", "password": "x", "phone": "+254712345678"}',
+            '{"email": "not-an-email"}',
+        ]
+        
+        report = import_users(lines, 'jsonl')
+        
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['skipped'], 4)
+        self.assertCountEqual([error['row'] for error in report['errors']], [2, 3, 4, 5])
+        self.assertFalse(User.objects.filter(email='other@example.com').exists())
+    
+    def test_import_normalizes_phones_and_checks_lengths(self):
+        """Test phones are stored like signup stores them and oversized values are skipped"""
+        lines = [
+            '{"email": "local@example.com", "password": "x", "phone": "0712345678"}',
+            '{"email": "fresh@example.com", "password": "x", "phone": "0700000010"}',
+            '{"email": "long@example.com", "password": "x", "phone": "07123456789999"}',
+            '{"email": "name@example.com", "password": "x", "first_name": "%s"}' % ('A' * 101),
+        ]
+        
+        report = import_users(lines, 'jsonl')
+        
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(
+            {error['row']: error['error'] for error in report['errors']},
+            {
+                1: 'Phone already registered',
+                3: 'phone is longer than 13 characters',
+                4: 'first_name is longer than 100 characters',
+            },
+        )
+        self.assertEqual(User.objects.get(email='fresh@example.com').phone, '+254700000010')
+    
+    def test_import_fires_no_signals(self):
+        """Test the import bypasses the per-row post_save signals"""
+        with patch('organizations.signals.create_personal_organization') as handler:
+            with patch.object(post_save, 'send', wraps=post_save.send) as send:
+                import_users(io.StringIO(self.CSV), batch_size=1)
+        
+        senders = {call.kwargs['sender'] for call in send.call_args_list}
+        self.assertFalse(senders & {User, Organization, OrganizationMember})
+        handler.assert_not_called()
+        self.assertEqual(Organization.objects.filter(owner__email__in=['jane@example.com', 'john@example.com']).count(), 2)
+    
+    def test_import_keeps_password_hashes(self):
+        """Test pre-hashed passwords are stored as they are"""
+        hashed = make_password('Migrated123!')
+        
+        import_users([f'{{"email": "old@example.com", "password_hash": "{hashed}"}}'], 'jsonl')
+        
+        self.assertEqual(User.objects.get(email='old@example.com').password, hashed)
+    
+    @override_settings(PERSONAL_ORGANIZATION_MODE='lazy')
+    def test_import_defers_organizations_in_lazy_mode(self):
+        """Test lazy mode imports users without personal organizations, like signup"""
+        import_users(io.StringIO(self.CSV))
+        
+        jane = User.objects.get(email='jane@example.com')
+        self.assertFalse(jane.has_personal_organization)
+        self.assertFalse(Organization.objects.filter(owner=jane).exists())
+    
+    def test_import_rejects_csv_without_email_column(self):
+        """Test CSV input needs an email column"""
+        with self.assertRaises(ImportFormatError):
+            import_users(io.StringIO("name,phone\nJane,+254700000001\n"))
+    
+    def test_admin_import_endpoint(self):
+        """Test admin bulk import endpoint"""
+        url = reverse('admin_import_users')
+        upload = SimpleUploadedFile('users.csv', self.CSV.encode(), content_type='text/csv')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.admin_access_token}')
+        
+        response = self.client.post(url, {'file': upload}, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertTrue(User.objects.filter(email='john@example.com').exists())
+    
+    def test_admin_import_endpoint_does_not_fork(self):
+        """Test the endpoint hashes passwords without a process pool"""
+        url = reverse('admin_import_users')
+        upload = SimpleUploadedFile('users.csv', self.CSV.encode(), content_type='text/csv')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.admin_access_token}')
+        
+        with override_settings(USER_IMPORT_PROCESSES=8), \
+                patch('accounts.bulk_import.POOL_THRESHOLD', 0), \
+                patch('accounts.bulk_import.ProcessPoolExecutor') as pool:
+            response = self.client.post(url, {'file': upload}, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        pool.assert_not_called()
+    
+    def test_admin_import_endpoint_non_admin(self):
+        """Test bulk import endpoint as non-admin user"""
+        url = reverse('admin_import_users')
+        upload = SimpleUploadedFile('users.csv', self.CSV.encode(), content_type='text/csv')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        
+        response = self.client.post(url, {'file': upload}, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(User.objects.filter(email='jane@example.com').exists())
+    
+    def test_import_users_command(self):
+        """Test the import_users management command"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(self.CSV)
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        
+        call_command('import_users', f.name, stdout=out, stderr=io.StringIO())
+        
+        self.assertEqual(json.loads(out.getvalue())['created'], 2)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PooledUserImportTests(TransactionTestCase):
+    """Test password hashing across the process pool"""
+    
+    def test_import_hashes_passwords_in_pool(self):
+        rows = [{'email': f'user{i}@example.com', 'password': f'Pass{i}!'} for i in range(POOL_THRESHOLD * 2)]
+        
+        report = UserImporter(batch_size=POOL_THRESHOLD, processes=2).run(rows)
+        
+        self.assertEqual(report['created'], len(rows))
+        self.assertTrue(User.objects.get(email='user5@example.com').check_password('Pass5!'))
+        self.assertEqual(OrganizationMember.objects.filter(role=OrganizationMember.Role.OWNER).count(), len(rows))
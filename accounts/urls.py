@@ -27,4 +27,7 @@ urlpatterns = [
     # Admin KYC management
     path('admin/kyc/', views.AdminKYCListView.as_view(), name='admin_kyc_list'),
     path('admin/kyc/<uuid:kyc_id>/review/', views.AdminKYCReviewView.as_view(), name='admin_kyc_review'),
+
+    # Admin bulk user import
+    path('admin/import-users/', views.AdminUserImportView.as_view(), name='admin_import_users'),
 ]
\ No newline at end of file
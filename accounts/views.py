@@ -1,12 +1,14 @@
 # backend/apps/accounts/views.py
+import io
+
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.utils import timezone
-from django.db.models import F
 
+from .bulk_import import ImportFormatError, import_users
+from .login_tracking import login_tracker
 from .models import User, KYCVerification
 from .serializers import (
     UserRegistrationSerializer,
@@ -66,11 +68,8 @@ class LoginView(APIView):
             # Generate tokens
             refresh = RefreshToken.for_user(user)
             
-            # Update login tracking
-            user.last_login = timezone.now()
-            user.login_count = F('login_count') + 1
-            user.save(update_fields=['last_login'])
-            user.refresh_from_db()
+            # Update login tracking (written behind, in batches)
+            login_tracker.record(user)
             
             return Response({
                 'user': UserProfileSerializer(user).data,
@@ -285,4 +284,33 @@ class AdminKYCReviewView(APIView):
         return Response({
             "message": message,
             "kyc": KYCSerializer(kyc).data
-        })
\ No newline at end of file
+        })
+
+
+class AdminUserImportView(APIView):
+    """
+    Admin view to bulk-import users from an uploaded CSV or JSON Lines file.
+
+    Meant for modest uploads; large migrations should use the import_users
+    management command. Passwords are hashed in the request process, since
+    forking a worker pool from inside a web server is not safe.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {"error": "Upload the user list as 'file'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        format = request.data.get('format') or ('jsonl' if upload.name.endswith(('.jsonl', '.json')) else 'csv')
+
+        try:
+            report = import_users(io.TextIOWrapper(upload.file, encoding='utf-8-sig'), format, processes=1)
+        except (ImportFormatError, UnicodeDecodeError) as e:
+            return Response(
+                {"error": str(e), "detail": "Could not read the user list."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(report)
@@ -0,0 +1,24 @@
+# Stand-alone performance benchmarks, run with `python -m benchmarks.<name>`
+import os
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    """Configure Django so benchmarks can use the project's settings and apps"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'deevent.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Run against a throwaway test database instead of db.sqlite3"""
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,61 @@
+"""
+Checkout quote latency for typical and large carts.
+
+    python -m benchmarks.bench_checkout_quote --runs 5000
+
+Country rules are compiled once up front, as they are in a warm worker;
+every quote after that runs without a database query.
+"""
+import argparse
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from benchmarks import setup, test_database
+
+setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from core.models import Country, CountryConfiguration  # noqa: E402
+from payments.quotes import quote_cart  # noqa: E402
+from payments.tax_rules import tax_rules  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with test_database():
+        kenya = Country.objects.create(code='KE', name='Kenya', currency='KES', currency_symbol='KSh')
+        CountryConfiguration.objects.create(country=kenya)
+        tax_rules.invalidate()
+        tax_rules.calculator('KE')
+
+        for lines in (1, 5, 20, 100):
+            carts = [
+                [(Decimal(rng.choice([0, 500, 1000, 2500, 5000, 15000])), rng.randint(1, 4)) for _ in range(lines)]
+                for _ in range(args.runs)
+            ]
+            samples = []
+            with CaptureQueriesContext(connection) as queries:
+                for cart in carts:
+                    started = time.perf_counter()
+                    quote_cart('KE', cart)
+                    samples.append((time.perf_counter() - started) * 1000)
+
+            print(f"{lines:3d} lines: p50 {statistics.median(samples):.3f}ms  "
+                  f"p99 {percentile(samples, 99):.3f}ms  ({len(queries)} queries)")
+
+
+if __name__ == '__main__':
+    main()
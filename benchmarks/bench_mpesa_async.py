@@ -0,0 +1,83 @@
+"""
+Compare sync and async M-Pesa gateway throughput against a local stub.
+
+    python -m benchmarks.bench_mpesa_async --requests 1000 --concurrency 200 --latency 0.1
+
+The Daraja simulator answers OAuth, STK push and B2C after `--latency`
+seconds, which stands in for Safaricom's response time. The sync gateway
+runs on a thread pool (the WSGI model), the async gateway on a single
+event loop.
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import setup
+
+setup()
+
+from django.core.cache import cache  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+from payments.http import AsyncGatewayHttpClient, GatewayHttpClient  # noqa: E402
+from payments.mpesa import MpesaGateway  # noqa: E402
+from payments.mpesa_async import AsyncMpesaGateway  # noqa: E402
+from payments.simulator import DarajaSimulator  # noqa: E402
+
+
+def run_sync(total, concurrency):
+    gateway = MpesaGateway(http_client=GatewayHttpClient(pool_size=concurrency))
+    gateway.get_access_token()  # Warm the token cache
+
+    def call(i):
+        return gateway.stk_push('0712345678', 100, f"BENCH{i}", 'Benchmark')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(total)))
+    return time.perf_counter() - started
+
+
+async def run_async(total, concurrency):
+    http = AsyncGatewayHttpClient(pool_size=concurrency)
+    gateway = AsyncMpesaGateway(http_client=http)
+    await gateway.get_access_token()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(i):
+        async with semaphore:
+            return await gateway.stk_push('0712345678', 100, f"BENCH{i}", 'Benchmark')
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    await http.aclose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.1, help='Stub response time in seconds')
+    args = parser.parse_args()
+
+    simulator = DarajaSimulator(latency=args.latency, send_callbacks=False)
+    base_url = simulator.start()
+
+    with override_settings(MPESA_BASE_URL=base_url):
+        cache.clear()
+        sync_elapsed = run_sync(args.requests, args.concurrency)
+        cache.clear()
+        async_elapsed = asyncio.run(run_async(args.requests, args.concurrency))
+
+    simulator.stop()
+
+    print(f"{args.requests} STK pushes, concurrency {args.concurrency}, upstream latency {args.latency * 1000:.0f}ms")
+    print(f"  sync  (thread pool): {sync_elapsed:7.2f}s  {args.requests / sync_elapsed:8.1f} req/s")
+    print(f"  async (event loop):  {async_elapsed:7.2f}s  {args.requests / async_elapsed:8.1f} req/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Sustained M-Pesa callback ingestion and batched processing throughput.
+
+    python -m benchmarks.bench_mpesa_callbacks --callbacks 20000 --duplicates 0.1
+
+Callbacks are posted through the full Django stack (middleware, URL
+routing, the webhook view) against a throwaway database. A share of them
+are retries of earlier callbacks, which must be dropped. The batched
+worker then applies the B2C results to their payouts.
+"""
+import argparse
+import json
+import random
+import time
+from decimal import Decimal
+
+from benchmarks import setup, test_database
+
+setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from payments.callbacks import CallbackProcessor  # noqa: E402
+from payments.models import MpesaCallback, Payout  # noqa: E402
+
+
+def stk_callback(i):
+    return {'Body': {'stkCallback': {
+        'MerchantRequestID': f"29115-{i}",
+        'CheckoutRequestID': f"ws_CO_{i:012d}",
+        'ResultCode': 0,
+        'ResultDesc': 'The service request is processed successfully.',
+        'CallbackMetadata': {'Item': [
+            {'Name': 'Amount', 'Value': 1000},
+            {'Name': 'MpesaReceiptNumber', 'Value': f"NLJ{i:07d}"},
+            {'Name': 'PhoneNumber', 'Value': 254712345678},
+        ]},
+    }}}
+
+
+def b2c_result(i):
+    return {'Result': {
+        'ResultType': 0,
+        'ResultCode': 0 if i % 20 else 2001,
+        'ResultDesc': 'The service request is processed successfully.',
+        'OriginatorConversationID': f"OC-{i}",
+        'ConversationID': f"AG_{i:012d}",
+        'TransactionID': f"NLJ{i:07d}",
+    }}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--callbacks', type=int, default=20000)
+    parser.add_argument('--duplicates', type=float, default=0.1, help="Share of callbacks that are retries")
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    with test_database():
+        user = get_user_model().objects.create_user(
+            email='bench@example.com', password='BenchPass123!', first_name='Bench', last_name='User'
+        )
+        organization = user.owned_organizations.first()
+        half = args.callbacks // 2
+        Payout.objects.bulk_create([
+            Payout(
+                organization=organization,
+                amount=Decimal('1000'),
+                phone_number='0712345678',
+                status=Payout.Status.SUBMITTED,
+                conversation_id=f"AG_{i:012d}",
+            )
+            for i in range(half)
+        ], batch_size=1000)
+
+        bodies = [(reverse('mpesa_stk_callback'), stk_callback(i)) for i in range(half)]
+        bodies += [(reverse('mpesa_b2c_result'), b2c_result(i)) for i in range(half)]
+        bodies += random.sample(bodies, int(len(bodies) * args.duplicates))
+        random.shuffle(bodies)
+        encoded = [(url, json.dumps(body)) for url, body in bodies]
+
+        client = Client(SERVER_NAME='localhost')
+        started = time.perf_counter()
+        for url, body in encoded:
+            response = client.post(url, body, content_type='application/json')
+            assert response.status_code == 200, response.content
+        ingest_elapsed = time.perf_counter() - started
+
+        stored = MpesaCallback.objects.count()
+        started = time.perf_counter()
+        processed = CallbackProcessor(batch_size=args.batch_size).drain()
+        process_elapsed = time.perf_counter() - started
+        completed = Payout.objects.filter(status=Payout.Status.COMPLETED).count()
+
+    print(f"Ingested {len(encoded)} callbacks ({len(encoded) - stored} duplicates dropped)")
+    print(f"  webhook:   {ingest_elapsed:7.2f}s  {len(encoded) / ingest_elapsed:8.0f} callbacks/s")
+    print(f"  processor: {process_elapsed:7.2f}s  {processed / process_elapsed:8.0f} callbacks/s "
+          f"({processed} B2C results, {completed} payouts completed)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Membership-scoped organization listing at scale.
+
+    python -m benchmarks.bench_org_listing --memberships 1000000
+
+Seeds users who each belong to ten organizations (one membership in ten
+inactive), then prints the EXPLAIN plan and median latency of the old
+OR + JOIN + DISTINCT listing against Organization.objects.accessible_to()
+(UNION of the owner index and the active-membership index), and of
+my_organizations' old two-query split against the new single pass.
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from benchmarks import setup, test_database
+
+setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db.models import Q  # noqa: E402
+
+from organizations.models import Organization, OrganizationMember  # noqa: E402
+
+User = get_user_model()
+
+PER_USER = 10
+# Coprime with any organization count that's a power of ten, so a user's ten picks are distinct
+STRIDE = 1009
+
+
+def seed(memberships, batch=20000):
+    user_count = memberships // PER_USER
+    organization_count = max(PER_USER * 100, user_count // 10)
+
+    users = [
+        User(id=uuid.uuid4(), email=f"bench{i}@example.com", first_name='Bench', last_name=str(i))
+        for i in range(user_count)
+    ]
+    User.objects.bulk_create(users, batch_size=batch)
+    organizations = [
+        Organization(
+            id=uuid.uuid4(), name=f"Org {i}", slug=f"org-{i}", owner=users[i % user_count],
+            org_type=Organization.OrganizationType.BUSINESS,
+        )
+        for i in range(organization_count)
+    ]
+    Organization.objects.bulk_create(organizations, batch_size=batch)
+
+    rows = []
+    for u, user in enumerate(users):
+        for j in range(PER_USER):
+            organization = organizations[(u * 7 + j * STRIDE) % organization_count]
+            rows.append(OrganizationMember(organization=organization, user=user, is_active=j != 0))
+        if len(rows) >= batch:
+            OrganizationMember.objects.bulk_create(rows)
+            rows = []
+    OrganizationMember.objects.bulk_create(rows)
+    return users
+
+
+def old_listing(user):
+    return Organization.objects.filter(
+        Q(owner=user) | Q(members__user=user, members__is_active=True)
+    ).distinct()
+
+
+def old_split(user):
+    organizations = old_listing(user)
+    return list(organizations.filter(owner=user)), list(organizations.exclude(owner=user))
+
+
+def new_split(user):
+    owned, member_of = [], []
+    for organization in Organization.objects.accessible_to(user):
+        (owned if organization.owner_id == user.pk else member_of).append(organization)
+    return owned, member_of
+
+
+def median_ms(function, users):
+    samples = []
+    for user in users:
+        started = time.perf_counter()
+        function(user)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--memberships', type=int, default=1000000)
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+
+    with test_database():
+        started = time.perf_counter()
+        users = seed(args.memberships)
+        print(f"seeded {OrganizationMember.objects.count()} memberships, "
+              f"{Organization.objects.count()} organizations in {time.perf_counter() - started:.1f}s")
+
+        sample = users[::max(1, len(users) // args.samples)][:args.samples]
+        user = sample[0]
+        assert set(old_listing(user)) == set(Organization.objects.accessible_to(user))
+
+        print("\nOR + JOIN + DISTINCT plan:")
+        print(old_listing(user).explain())
+        print("\nUNION plan:")
+        print(Organization.objects.accessible_to(user).explain())
+
+        print()
+        print(f"listing           old {median_ms(lambda u: list(old_listing(u)), sample):7.3f}ms  "
+              f"new {median_ms(lambda u: list(Organization.objects.accessible_to(u)), sample):7.3f}ms")
+        print(f"my_organizations  old {median_ms(old_split, sample):7.3f}ms  "
+              f"new {median_ms(new_split, sample):7.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Organization slug allocation under heavily colliding names.
+
+    python -m benchmarks.bench_org_slugs --organizations 10000
+
+Creates organizations that all share one name (the "ten-thousandth John"
+case) and reports latency and queries per create as the collisions pile
+up. Both should stay flat.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import setup, test_database
+
+setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from organizations.models import Organization  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--organizations', type=int, default=10000)
+    args = parser.parse_args()
+
+    with test_database():
+        owner = get_user_model().objects.create_user(
+            email='bench@example.com', password='BenchPass123!', first_name='John', last_name='User'
+        )
+        report_every = max(1, args.organizations // 5)
+        samples = []
+        for i in range(1, args.organizations + 1):
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                organization = Organization.objects.create(name="John's Events", owner=owner)
+                samples.append((time.perf_counter() - started) * 1000)
+            if i % report_every == 0:
+                print(f"{i:7d} collisions: {statistics.median(samples):6.3f}ms median create  "
+                      f"{len(queries)} queries  last slug {organization.slug}")
+                samples = []
+
+
+if __name__ == '__main__':
+    main()
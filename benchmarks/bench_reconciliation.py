@@ -0,0 +1,97 @@
+"""
+M-Pesa statement reconciliation throughput and memory use.
+
+    python -m benchmarks.bench_reconciliation --payments 100000
+
+Paid intents are bulk-inserted and a matching statement (with a few
+mismatches) is generated in memory, then reconciled at several chunk
+sizes. One payment in 50 has no receipt on our side (its STK callback
+never arrived), so the receipt-less matching runs too, and
+`--old-intents` receipt-less intents from months back sit in the table
+without being part of the statement. The peak Python allocation
+(tracemalloc, measured on a separate pass) should depend on the chunk
+size rather than the statement length or the table's history.
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks import setup, test_database
+
+setup()
+
+from django.utils import timezone  # noqa: E402
+
+from payments.models import PaymentIntent  # noqa: E402
+from payments.reconciliation import Reconciliation, read_statement  # noqa: E402
+
+
+def unreceipted(i):
+    return i % 50 == 25
+
+
+def seed(count, old_count, batch=5000):
+    now = timezone.now()
+    for offset in range(0, count, batch):
+        PaymentIntent.objects.bulk_create([
+            PaymentIntent(
+                amount=Decimal(100 + i % 5000), phone_number=f"07{i % 100000000:08d}", account_reference='EVT',
+                status=PaymentIntent.Status.EXPIRED if unreceipted(i) else PaymentIntent.Status.PAID,
+                mpesa_receipt_number='' if unreceipted(i) else f"RK{i:08d}",
+                paid_at=None if unreceipted(i) else now, expires_at=now,
+            )
+            for i in range(offset, min(count, offset + batch))
+        ])
+
+    # Expired receipt-less intents from long before the statement, same amounts and phones
+    long_ago = now - timedelta(days=90)
+    for offset in range(0, old_count, batch):
+        old = PaymentIntent.objects.bulk_create([
+            PaymentIntent(
+                amount=Decimal(100 + i % 5000), phone_number=f"07{i % 100000000:08d}", account_reference='OLD',
+                status=PaymentIntent.Status.EXPIRED, expires_at=long_ago,
+            )
+            for i in range(offset, min(old_count, offset + batch))
+        ])
+        PaymentIntent.objects.filter(pk__in=[intent.pk for intent in old]).update(created_at=long_ago)
+
+
+def statement(count):
+    completed = f"{timezone.localtime():%d-%m-%Y %H:%M:%S}"
+    yield 'Receipt No.,Completion Time,Details,Transaction Status,Paid In,Withdrawn,Other Party Info\n'
+    for i in range(count):
+        # Every 100th payment is short by a shilling
+        amount = 100 + i % 5000 - (i % 100 == 0)
+        yield f"RK{i:08d},{completed},Pay Bill,Completed,\"{amount:,}.00\",,2547{i % 100000000:08d} - CUSTOMER\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--payments', type=int, default=100000)
+    parser.add_argument('--old-intents', type=int, default=200000)
+    args = parser.parse_args()
+
+    with test_database():
+        seed(args.payments, args.old_intents)
+        for chunk_size in (1000, 5000, 20000):
+            started = time.perf_counter()
+            report = Reconciliation(chunk_size=chunk_size).run(
+                read_statement(statement(args.payments)), end=timezone.now() + timedelta(seconds=1)
+            )
+            elapsed = time.perf_counter() - started
+
+            tracemalloc.start()
+            Reconciliation(chunk_size=chunk_size).run(
+                read_statement(statement(args.payments)), end=timezone.now() + timedelta(seconds=1)
+            )
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            print(f"chunk {chunk_size:6d}: {elapsed:6.2f}s  {args.payments / elapsed:8.0f} rows/s  "
+                  f"peak {peak / 1e6:6.2f} MB  {report['counts']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Streaming CSV export throughput and memory use as the ledger grows.
+
+    python -m benchmarks.bench_statements --transactions 200000
+
+Sale transactions are bulk-inserted straight into the ledger tables, then
+the finance export is streamed to /dev/null at several sizes. The peak
+Python allocation (tracemalloc, measured on a separate pass) should stay
+flat as the row count grows.
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks import setup, test_database
+
+setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from payments.models import LedgerEntry, LedgerTransaction  # noqa: E402
+from payments.statements import csv_chunks, statement_rows, with_totals  # noqa: E402
+
+Account = LedgerEntry.Account
+
+
+def seed(organization, count, batch=5000):
+    for offset in range(0, count, batch):
+        transactions = LedgerTransaction.objects.bulk_create([
+            LedgerTransaction(
+                kind=LedgerTransaction.Kind.SALE, reference=f"intent-{i}", organization=organization
+            )
+            for i in range(offset, min(count, offset + batch))
+        ])
+        LedgerEntry.objects.bulk_create([
+            LedgerEntry(transaction=t, account=account, organization=org, amount=amount)
+            for t in transactions
+            for account, org, amount in (
+                (Account.CUSTOMER_FUNDS, None, Decimal('1058')),
+                (Account.ORGANIZER_PAYABLE, organization, Decimal('-1000')),
+                (Account.PLATFORM_REVENUE, None, Decimal('-50')),
+                (Account.VAT_PAYABLE, None, Decimal('-8')),
+            )
+        ], batch_size=batch * 4)
+
+
+def export(start, end):
+    written = 0
+    with open(os.devnull, 'w') as sink:
+        for chunk in csv_chunks(with_totals(statement_rows(start, end))):
+            written += sink.write(chunk)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=200000)
+    args = parser.parse_args()
+
+    with test_database():
+        user = get_user_model().objects.create_user(
+            email='bench@example.com', password='BenchPass123!', first_name='Bench', last_name='User'
+        )
+        seed(user.owned_organizations.first(), args.transactions)
+        ids = list(LedgerTransaction.objects.order_by('id').values_list('id', flat=True))
+        start = timezone.now() - timedelta(days=1)
+        end = timezone.now() + timedelta(days=1)
+
+        for size in (args.transactions // 10, args.transactions // 2, args.transactions):
+            # Limit the export to the first `size` transactions by moving the rest out of range
+            LedgerTransaction.objects.filter(id__gt=ids[size - 1]).update(created_at=end)
+            LedgerTransaction.objects.filter(id__lte=ids[size - 1]).update(created_at=timezone.now())
+
+            started = time.perf_counter()
+            written = export(start, end)
+            elapsed = time.perf_counter() - started
+
+            # Memory is measured on a second pass: tracemalloc slows the export down a lot
+            tracemalloc.start()
+            export(start, end)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            print(f"{size:8d} rows: {elapsed:6.2f}s  {size / elapsed:8.0f} rows/s  "
+                  f"{written / 1e6:6.1f} MB CSV  peak {peak / 1e6:5.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Scalar vs batch KenyaTaxCalculator over a settlement-sized set of line items.
+
+    python -m benchmarks.bench_tax_batch --items 200000
+
+The scalar path is what a settlement job does today: one calculator per
+line item and one call per figure. Both paths are checked to produce the
+same Decimals before timings are reported.
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from benchmarks import setup
+
+setup()
+
+from payments.tax import KenyaTaxCalculator  # noqa: E402
+
+
+def line_items(count, seed=0):
+    rng = random.Random(seed)
+    amounts = [Decimal(rng.randint(100, 5_000_000)) / 100 for _ in range(count)]
+    fees = [Decimal(rng.randint(0, 50_000)) / 100 for _ in range(count)]
+    residency = [rng.random() < 0.9 for _ in range(count)]
+    return amounts, fees, residency
+
+
+def scalar(amounts, fees, residency):
+    vat, withholding, receipts = [], [], []
+    for amount, fee, resident in zip(amounts, fees, residency):
+        calculator = KenyaTaxCalculator(amount)
+        vat.append(calculator.calculate_vat())
+        withholding.append(calculator.calculate_withholding_tax(amount, is_resident=resident))
+        receipts.append(calculator.generate_receipt_details(amount, fee))
+    return vat, withholding, receipts
+
+
+def batch(amounts, fees, residency):
+    return (
+        KenyaTaxCalculator.calculate_vat_batch(amounts),
+        KenyaTaxCalculator.calculate_withholding_tax_batch(amounts, residency),
+        KenyaTaxCalculator.generate_receipt_details_batch(amounts, fees),
+    )
+
+
+def check(scalar_results, batch_results):
+    vat, withholding, receipts = scalar_results
+    vat_batch, withholding_batch, receipt_batch = batch_results
+    for i in range(len(vat)):
+        assert vat[i]['vat_amount'] == vat_batch['vat_amount'][i]
+        assert vat[i]['net_amount'] == vat_batch['net_amount'][i]
+        assert withholding[i]['withholding_tax'] == withholding_batch['withholding_tax'][i]
+        assert withholding[i]['net_payout'] == withholding_batch['net_payout'][i]
+        assert receipts[i]['vat']['amount'] == receipt_batch['vat']['amount'][i]
+        assert receipts[i]['subtotal'] == receipt_batch['subtotal'][i]
+        assert receipts[i]['total'] == receipt_batch['total'][i]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=200_000)
+    args = parser.parse_args()
+
+    columns = line_items(args.items)
+    scalar_results, scalar_elapsed = timed(scalar, *columns)
+    batch_results, batch_elapsed = timed(batch, *columns)
+    check(scalar_results, batch_results)
+
+    print(f"{args.items} line items (VAT, withholding tax and receipt breakdown each)")
+    print(f"  scalar: {scalar_elapsed:7.3f}s  {args.items / scalar_elapsed:10.0f} items/s")
+    print(f"  batch:  {batch_elapsed:7.3f}s  {args.items / batch_elapsed:10.0f} items/s")
+    print(f"  speedup: {scalar_elapsed / batch_elapsed:.1f}x (results identical)")
+
+
+if __name__ == '__main__':
+    main()
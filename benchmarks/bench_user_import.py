@@ -0,0 +1,57 @@
+"""
+Bulk user import against creating users one at a time.
+
+    python -m benchmarks.bench_user_import --users 500
+
+Imports the same generated user list through User.objects.create_user()
+(one user, organization and membership per round of signals) and through
+accounts.bulk_import, and reports users per second for each. Password
+hashing dominates both; the bulk path spreads it over --processes.
+"""
+import argparse
+import io
+import time
+
+from benchmarks import setup, test_database
+
+setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+
+from accounts.bulk_import import import_users  # noqa: E402
+
+
+def rows(count, prefix):
+    lines = ["email,password,first_name,last_name"]
+    lines += [f"{prefix}{i}@example.com,Pass{i}word!,John,User{i}" for i in range(count)]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    User = get_user_model()
+    with test_database():
+        started = time.perf_counter()
+        for i in range(args.users):
+            User.objects.create_user(
+                email=f"single{i}@example.com", password=f"Pass{i}word!", first_name='John', last_name=f"User{i}"
+            )
+        single = time.perf_counter() - started
+        print(f"create_user: {args.users} users in {single:7.2f}s  ({args.users / single:8.1f} users/s)")
+
+        started = time.perf_counter()
+        report = import_users(
+            io.StringIO(rows(args.users, 'bulk')), batch_size=args.batch_size, processes=args.processes
+        )
+        bulk = time.perf_counter() - started
+        print(f"bulk import: {report['created']} users in {bulk:7.2f}s  ({report['created'] / bulk:8.1f} users/s)  "
+              f"{single / bulk:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-17 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='countryconfiguration',
+            name='non_resident_withholding_rate',
+            field=models.DecimalField(decimal_places=2, default=20.0, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='countryconfiguration',
+            name='resident_withholding_rate',
+            field=models.DecimalField(decimal_places=2, default=5.0, max_digits=5),
+        ),
+    ]
@@ -50,6 +50,10 @@ class CountryConfiguration(models.Model):
     platform_fee_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=3.0)
     min_platform_fee = models.DecimalField(max_digits=10, decimal_places=2, default=50.0)  # Min 50 KES
     
+    # Withholding tax on organizer payouts (%)
+    resident_withholding_rate = models.DecimalField(max_digits=5, decimal_places=2, default=5.0)
+    non_resident_withholding_rate = models.DecimalField(max_digits=5, decimal_places=2, default=20.0)
+    
     # Payout
     min_payout_amount = models.DecimalField(max_digits=10, decimal_places=2, default=500.0)  # Min 500 KES
     payout_processing_days = models.IntegerField(default=3)  # Business days
@@ -0,0 +1,18 @@
+# backend/apps/core/testing.py - Helpers shared by the apps' test suites
+from functools import wraps
+
+from django.db import connection
+
+
+def requires_file_database(test):
+    """
+    Skip a test that writes from several threads when the test database is
+    in-memory SQLite, where concurrent writers get "table is locked". Set
+    DJANGO_TEST_DB_NAME to a file path to run it.
+    """
+    @wraps(test)
+    def wrapper(self, *args, **kwargs):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("threaded writes need an on-disk test database (set DJANGO_TEST_DB_NAME)")
+        return test(self, *args, **kwargs)
+    return wrapper
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'accounts',
     'organizations',
     'core',
+    'payments',
 ]
 
 MIDDLEWARE = [
@@ -82,6 +83,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Tests run in memory unless DJANGO_TEST_DB_NAME names a file; the
+        # multi-threaded tests need one, since threads sharing the in-memory
+        # database get "table is locked"
+        'TEST': {'NAME': os.environ.get('DJANGO_TEST_DB_NAME')},
     }
 }
 
@@ -119,6 +124,24 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Cache (shared across workers when REDIS_URL is set)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -202,6 +225,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
 ]
 
 # Email backend for development
@@ -260,4 +284,72 @@ DEEVENTS = {
     'MAX_TICKETS_PER_USER': 10,
     'TICKET_RESERVATION_MINUTES': 15,
     'MPESA_SANDBOX': True,  # Set to False in production
-}
\ No newline at end of file
+}
+
+# M-Pesa (Daraja API) credentials
+MPESA_CONSUMER_KEY = os.environ.get('MPESA_CONSUMER_KEY', '')
+MPESA_CONSUMER_SECRET = os.environ.get('MPESA_CONSUMER_SECRET', '')
+MPESA_BUSINESS_SHORTCODE = os.environ.get('MPESA_BUSINESS_SHORTCODE', '174379')  # Sandbox shortcode
+MPESA_PASSKEY = os.environ.get('MPESA_PASSKEY', '')
+MPESA_INITIATOR_NAME = os.environ.get('MPESA_INITIATOR_NAME', '')
+MPESA_SECURITY_CREDENTIAL = os.environ.get('MPESA_SECURITY_CREDENTIAL', '')
+MPESA_CALLBACK_URL = os.environ.get('MPESA_CALLBACK_URL', 'http://localhost:8000/api/payments/mpesa/callback/')
+MPESA_RESULT_URL = os.environ.get('MPESA_RESULT_URL', 'http://localhost:8000/api/payments/mpesa/result/')
+MPESA_TIMEOUT_URL = os.environ.get('MPESA_TIMEOUT_URL', 'http://localhost:8000/api/payments/mpesa/timeout/')
+MPESA_BASE_URL = os.environ.get('MPESA_BASE_URL', '')  # Empty = sandbox when DEBUG, else production
+
+# Refresh the cached OAuth token this many seconds before it expires
+MPESA_TOKEN_REFRESH_MARGIN = 300
+
+# Pooled HTTP client used for Safaricom calls
+MPESA_HTTP_POOL_SIZE = 20
+MPESA_HTTP_CONNECT_TIMEOUT = 3.05  # seconds
+MPESA_HTTP_READ_TIMEOUT = 30  # seconds
+MPESA_HTTP_MAX_RETRIES = 3  # Idempotent requests only
+MPESA_HTTP_BACKOFF_FACTOR = 0.3
+MPESA_HTTP_BACKOFF_JITTER = 0.3
+
+# Fail fast instead of tying up workers when Safaricom struggles
+MPESA_CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive failures that open an endpoint's circuit
+MPESA_CIRCUIT_RESET_TIMEOUT = 30  # Seconds before a trial call is let through
+MPESA_CIRCUIT_SLOW_CALL_SECONDS = 10  # Slower successful calls count as failures
+MPESA_MAX_CONCURRENT_CALLS = 50  # Outbound STK/B2C calls in flight per process (>= PAYOUT_MAX_IN_FLIGHT)
+
+# Callbacks that arrive before their intent/payout has the reference are retried this often
+# (seconds), and dropped with a warning once this old
+MPESA_CALLBACK_RETRY_INTERVAL = 10
+MPESA_CALLBACK_MATCH_TIMEOUT = 3600
+
+# Responses to payment requests carrying an Idempotency-Key are replayed for this long (seconds)
+IDEMPOTENCY_KEY_TTL = 24 * 3600
+
+# Payment providers the router chooses between (see payments.routing)
+PAYMENT_PROVIDERS = [
+    'payments.routing.MpesaProvider',
+]
+PAYMENT_ROUTER_MIN_SUCCESS_RATE = 0.8  # Moving-average success rate below which a provider is degraded
+PAYMENT_ROUTER_PROBE_INTERVAL = 30  # Seconds before a degraded provider is tried again
+
+# 'eager' creates every user's personal organization at signup; 'lazy' waits for
+# their first organizer request (or the create_personal_organizations command)
+PERSONAL_ORGANIZATION_MODE = 'eager'
+
+# Seconds a user's organization memberships stay cached (organizations.memberships);
+# every membership save or delete invalidates them sooner
+MEMBERSHIP_CACHE_TIMEOUT = 300
+
+# Seconds between batched writes of last_login/login_count (accounts.login_tracking)
+LOGIN_TRACKING_FLUSH_INTERVAL = 5
+
+# Bulk user import (accounts.bulk_import)
+USER_IMPORT_PROCESSES = None  # Password hashing processes; None uses one per CPU
+
+# Organizer payouts (B2C)
+PAYOUT_MAX_IN_FLIGHT = 20  # Concurrent B2C requests
+PAYOUT_RATE_PER_SECOND = 50  # Stay under Safaricom's B2C rate limit
+
+# Per-country tax rules are compiled in memory; workers check for changes this often (seconds)
+TAX_RULES_CHECK_INTERVAL = 5
+
+# Statements: worker processes for PDF rendering (None = one per CPU)
+STATEMENT_PDF_PROCESSES = None
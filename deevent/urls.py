@@ -32,11 +32,11 @@ urlpatterns = [
     # API Endpoints
     path('api/auth/', include('accounts.urls')),
     path('api/v1/', include('organizations.urls')),
+    path('api/payments/', include('payments.urls')),
     
     # Coming soon...
     # path('api/events/', include('events.urls')),
     # path('api/tickets/', include('tickets.urls')),
-    # path('api/payments/', include('payments.urls')),
 ]
 
 # Serve media files in development
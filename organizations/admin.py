@@ -10,10 +10,11 @@ class OrganizationMemberInline(admin.TabularInline):
 
 @admin.register(Organization)
 class OrganizationAdmin(admin.ModelAdmin):
-    list_display = ['name', 'org_type', 'status', 'owner', 'is_verified', 'created_at']
+    list_display = ['name', 'org_type', 'status', 'owner', 'member_count', 'is_verified', 'created_at']
     list_filter = ['org_type', 'status', 'is_verified', 'created_at']
+    list_select_related = ['owner']
     search_fields = ['name', 'email', 'tax_id', 'owner__email']
-    readonly_fields = ['created_at', 'updated_at', 'slug']
+    readonly_fields = ['created_at', 'updated_at', 'slug', 'member_count']
     inlines = [OrganizationMemberInline]
     fieldsets = (
         ('Basic Information', {
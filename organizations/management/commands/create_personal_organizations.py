@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from organizations.personal import backfill_personal_organizations
+
+
+class Command(BaseCommand):
+    help = "Create personal organizations for users who don't have one yet (lazy mode backfill)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--organizers-only', action='store_true', help="Only users flagged is_organizer")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(has_personal_organization=False, is_active=True)
+        if options['organizers_only']:
+            users = users.filter(is_organizer=True)
+
+        created = 0
+        while True:
+            # Each batch flags its users, so the next query picks up where this one stopped
+            batch = list(users.order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            created += len(backfill_personal_organizations(batch))
+        self.stdout.write(self.style.SUCCESS(f"Created {created} personal organizations"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from organizations.models import Organization
+
+
+class Command(BaseCommand):
+    help = "Recount Organization.member_count from the membership rows and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drifted organizations without fixing them")
+
+    def handle(self, *args, **options):
+        organizations = Organization.objects.all()
+        if options['dry_run']:
+            drifted = organizations.with_drifted_member_count()
+            for name, stored, actual in drifted.values_list('name', 'member_count', 'actual_member_count'):
+                self.stdout.write(f"{name}: {stored} stored, {actual} active")
+            self.stdout.write(self.style.SUCCESS(f"{drifted.count()} organizations drifted"))
+            return
+
+        fixed = organizations.reconcile_member_counts()
+        self.stdout.write(self.style.SUCCESS(f"Fixed member_count on {fixed} organizations"))
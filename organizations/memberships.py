@@ -0,0 +1,112 @@
+# backend/apps/organizations/memberships.py
+import time
+import zlib
+from functools import cached_property
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ROLE_CAPABILITIES, Capability, Organization, OrganizationMember
+
+# Entries hold capability masks, so the key changes whenever the role presets do
+CACHE_PREFIX = 'organizations:memberships:%x' % zlib.crc32(repr(sorted(
+    (role, int(capabilities)) for role, capabilities in ROLE_CAPABILITIES.items()
+)).encode())
+
+
+def _version_key(user_id):
+    return f"{CACHE_PREFIX}:version:{user_id}"
+
+
+def _current_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # A clock value rather than 0, so a lost version key can't revive old entries
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(user_ids):
+    for user_id in user_ids:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+def invalidate_memberships(user_ids):
+    """
+    Drop the cached memberships of `user_ids`.
+
+    The version is bumped now and again once the transaction commits: a
+    request that read the old rows in between can only have cached them
+    under the intermediate version, which nothing reads once the second
+    bump has run.
+    """
+    user_ids = list(user_ids)
+    _bump(user_ids)
+    transaction.on_commit(lambda: _bump(user_ids))
+
+
+class MembershipResolver:
+    """
+    The user's active memberships as {organization id: Capability},
+    loaded the first time any permission class or view asks, then shared
+    for the rest of the request.
+
+    The map comes from the shared cache when another request has loaded
+    it since the memberships last changed, otherwise from one query. Any
+    save or delete of one of the user's memberships (including through an
+    organization deletion) invalidates the entry.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def memberships(self):
+        if not self.user.is_authenticated:
+            return {}
+
+        key = f"{CACHE_PREFIX}:{self.user.pk}:{_current_version(self.user.pk)}"
+        masks = cache.get(key)
+        if masks is None:
+            masks = {
+                organization_id: int(ROLE_CAPABILITIES.get(role, 0))
+                for organization_id, role in OrganizationMember.objects.filter(
+                    user=self.user, is_active=True
+                ).values_list('organization_id', 'role')
+            }
+            cache.set(key, masks, getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', 300))
+        return {organization_id: Capability(mask) for organization_id, mask in masks.items()}
+
+    def capabilities(self, organization):
+        """
+        What the user may do in `organization` (an Organization or its id);
+        None if they aren't an active member
+        """
+        if isinstance(organization, Organization):
+            organization = organization.pk
+        return self.memberships.get(organization)
+
+    def is_member(self, organization):
+        return self.capabilities(organization) is not None
+
+    def has(self, organization, capability):
+        capabilities = self.capabilities(organization)
+        return capabilities is not None and (capabilities & capability) == capability
+
+    def reset(self):
+        """Forget the loaded memberships (after changing them mid-request)"""
+        self.__dict__.pop('memberships', None)
+
+
+def memberships_for(request):
+    """Return the request's MembershipResolver, creating it on first use"""
+    resolver = getattr(request, '_membership_resolver', None)
+    if resolver is None or resolver.user != request.user:
+        resolver = request._membership_resolver = MembershipResolver(request.user)
+    return resolver
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-17 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlugCounter',
+            fields=[
+                ('base', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('last_suffix', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-17 11:26
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0002_slugcounter'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='organizationmember',
+            name='can_create_events',
+        ),
+        migrations.RemoveField(
+            model_name='organizationmember',
+            name='can_manage_team',
+        ),
+        migrations.RemoveField(
+            model_name='organizationmember',
+            name='can_manage_tickets',
+        ),
+        migrations.RemoveField(
+            model_name='organizationmember',
+            name='can_view_analytics',
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-17 11:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_members(apps, schema_editor):
+    Organization = apps.get_model('organizations', 'Organization')
+    OrganizationMember = apps.get_model('organizations', 'OrganizationMember')
+    counts = OrganizationMember.objects.filter(
+        organization=OuterRef('pk'), is_active=True
+    ).order_by().values('organization').annotate(count=Count('pk')).values('count')
+    Organization.objects.update(member_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0004_active_membership_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_members, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,104 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.text import slugify
+import enum
 import uuid
 
 User = get_user_model()
 
+class SlugCounter(models.Model):
+    """
+    Last numeric suffix handed out per base slug ("johns-events" -> 41 means
+    "johns-events-41" was the last one; 0 is the bare slug).
+
+    Lets Organization.save() pick a free slug in a couple of queries however
+    many organizations share a name, instead of probing one suffix at a time.
+    """
+    base = models.CharField(max_length=255, primary_key=True)
+    last_suffix = models.PositiveIntegerField(default=0)
+    
+    # Leave room for "-<suffix>" within Organization.slug's 255 characters
+    MAX_BASE_LENGTH = 240
+    
+    @classmethod
+    def next_slug(cls, base):
+        """Claim the next free slug for `base`"""
+        return cls.next_slugs(base, 1)[0]
+    
+    @classmethod
+    def next_slugs(cls, base, count):
+        """Claim `count` consecutive slugs for `base` in one counter update"""
+        with transaction.atomic():
+            # The row lock taken by the UPDATE serializes concurrent claims
+            if cls.objects.filter(base=base).update(last_suffix=F('last_suffix') + count):
+                last = cls.objects.values_list('last_suffix', flat=True).get(base=base)
+                return [f"{base}-{suffix}" for suffix in range(last - count + 1, last + 1)]
+        
+        # First claim for this base: start after whatever already exists
+        first = cls.highest_existing_suffix(base) + 1
+        try:
+            with transaction.atomic():
+                cls.objects.create(base=base, last_suffix=first + count - 1)
+        except IntegrityError:
+            # A concurrent first claim created the counter
+            return cls.next_slugs(base, count)
+        return [f"{base}-{suffix}" if suffix else base for suffix in range(first, first + count)]
+    
+    @staticmethod
+    def highest_existing_suffix(base):
+        """One prefix scan over existing slugs: -1 if none, 0 for the bare slug, else the largest -<n>"""
+        highest = -1
+        slugs = Organization.objects.filter(Q(slug=base) | Q(slug__startswith=f"{base}-")).values_list('slug', flat=True)
+        for slug in slugs.iterator():
+            rest = slug[len(base) + 1:]
+            if slug == base:
+                highest = max(highest, 0)
+            elif rest.isdigit():
+                highest = max(highest, int(rest))
+        return highest
+
+
+def _active_member_count():
+    counts = OrganizationMember.objects.filter(
+        organization=OuterRef('pk'), is_active=True
+    ).order_by().values('organization').annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+class OrganizationQuerySet(models.QuerySet):
+    """Organization lookups scoped to a user"""
+    
+    def accessible_to(self, user):
+        """
+        Organizations `user` owns or is an active member of.
+        
+        A semi-join over the UNION of two index-only lookups (owned ids from
+        the owner index, member ids from the active-membership index), so
+        there is no join fan-out to deduplicate with DISTINCT.
+        """
+        owned = Organization.objects.filter(owner=user).order_by().values('pk')
+        member_of = OrganizationMember.objects.filter(user=user, is_active=True).order_by().values('organization_id')
+        return self.filter(pk__in=owned.union(member_of))
+    
+    def with_actual_member_count(self):
+        """Annotate `actual_member_count`, counted from the membership rows"""
+        return self.annotate(actual_member_count=_active_member_count())
+    
+    def with_drifted_member_count(self):
+        """Organizations whose stored member_count disagrees with their membership rows"""
+        return self.with_actual_member_count().exclude(member_count=F('actual_member_count'))
+    
+    def reconcile_member_counts(self):
+        """Reset drifted member_count values from the membership rows; returns how many were off"""
+        drifted = list(self.with_drifted_member_count().values_list('pk', flat=True))
+        if drifted:
+            Organization.objects.filter(pk__in=drifted).update(member_count=_active_member_count())
+        return len(drifted)
+
+
 class Organization(models.Model):
     """
     Hybrid model: Both personal (auto-created) and business organizations
@@ -58,9 +153,13 @@ class Organization(models.Model):
     # Metadata
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_organizations')
     is_verified = models.BooleanField(default=False)
+    # Active members; kept current by OrganizationMember (see reconcile_member_counts)
+    member_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = OrganizationQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -72,24 +171,50 @@ class Organization(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_org_type_display()})"
     
+    @classmethod
+    def base_slug(cls, name):
+        return slugify(name)[:SlugCounter.MAX_BASE_LENGTH].strip('-') or 'organization'
+    
+    @classmethod
+    def personal_for(cls, user):
+        """The (unsaved) personal organization every new user gets"""
+        name = f"{user.first_name}'s Events" if user.first_name else f"{user.get_username()}'s Events"
+        return cls(
+            name=name,
+            owner=user,
+            org_type=cls.OrganizationType.PERSONAL,
+            email=user.email,
+            is_verified=False,
+        )
+    
     def save(self, *args, **kwargs):
-        # Auto-generate slug from name if not provided
-        if not self.slug:
-            from django.utils.text import slugify
-            self.slug = slugify(self.name)
-            
-            # Ensure uniqueness
-            original_slug = self.slug
-            counter = 1
-            while Organization.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
-                self.slug = f"{original_slug}-{counter}"
-                counter += 1
-        
         # Business orgs start as PENDING (needs admin approval)
         if self.org_type == self.OrganizationType.BUSINESS and not self.pk:
             self.status = self.Status.PENDING
         
-        super().save(*args, **kwargs)
+        # member_count only moves by F() updates; never write back a stale copy
+        if not self._state.adding and kwargs.get('update_fields') is None and not args:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'member_count'
+            ]
+        
+        if self.slug:
+            super().save(*args, **kwargs)
+            return
+        
+        # Auto-generate a unique slug from the name
+        base = self.base_slug(self.name)
+        while True:
+            self.slug = SlugCounter.next_slug(base)
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                # Someone chose this slug by hand; claim the next one
+                if not Organization.objects.filter(slug=self.slug).exists():
+                    raise
     
     @property
     def is_personal(self):
@@ -100,6 +225,31 @@ class Organization(models.Model):
         return self.org_type == self.OrganizationType.BUSINESS
 
 
+class Capability(enum.IntFlag):
+    """What a membership allows, as bits of one small int"""
+    CREATE_EVENTS = 1
+    MANAGE_TICKETS = 2
+    MANAGE_TEAM = 4
+    VIEW_ANALYTICS = 8
+    ADMINISTER = 16  # Edit the organization and change members' roles
+    
+    ALL = CREATE_EVENTS | MANAGE_TICKETS | MANAGE_TEAM | VIEW_ANALYTICS | ADMINISTER
+
+
+class MembershipQuerySet(models.QuerySet):
+    """Set-based operations on memberships"""
+    
+    def set_role(self, role):
+        """Move every membership in the queryset to `role` in one UPDATE"""
+        from .memberships import invalidate_memberships
+        
+        user_ids = set(self.values_list('user_id', flat=True))
+        updated = self.update(role=role, updated_at=timezone.now())
+        # update() sends no signals
+        invalidate_memberships(user_ids)
+        return updated
+
+
 class OrganizationMember(models.Model):
     """
     Team members within an organization with specific roles
@@ -116,11 +266,7 @@ class OrganizationMember(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='organization_memberships')
     role = models.CharField(max_length=20, choices=Role.choices, default=Role.MEMBER)
     
-    # Permissions (can be expanded)
-    can_create_events = models.BooleanField(default=False)
-    can_manage_tickets = models.BooleanField(default=False)
-    can_manage_team = models.BooleanField(default=False)
-    can_view_analytics = models.BooleanField(default=False)
+    # Permissions come from the role: see ROLE_CAPABILITIES
     
     # Status
     is_active = models.BooleanField(default=True)
@@ -130,34 +276,74 @@ class OrganizationMember(models.Model):
     joined_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = MembershipQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['organization', 'user']
         ordering = ['organization', '-role']
+        indexes = [
+            # Covers "which organizations is this user active in" without touching the table
+            models.Index(fields=['user', 'is_active', 'organization'], name='org_member_active_user_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.role} at {self.organization.name}"
     
     def save(self, *args, **kwargs):
-        # Set permissions based on role
-        if self.role == self.Role.OWNER:
-            self.can_create_events = True
-            self.can_manage_tickets = True
-            self.can_manage_team = True
-            self.can_view_analytics = True
-        elif self.role == self.Role.ADMIN:
-            self.can_create_events = True
-            self.can_manage_tickets = True
-            self.can_manage_team = True
-            self.can_view_analytics = True
-        elif self.role == self.Role.MANAGER:
-            self.can_create_events = True
-            self.can_manage_tickets = True
-            self.can_manage_team = False
-            self.can_view_analytics = True
-        elif self.role == self.Role.MEMBER:
-            self.can_create_events = False
-            self.can_manage_tickets = False
-            self.can_manage_team = False
-            self.can_view_analytics = False
+        update_fields = kwargs.get('update_fields')
+        if not self._state.adding and update_fields is not None and 'is_active' not in update_fields:
+            # Can't change the count
+            super().save(*args, **kwargs)
+            return
         
-        super().save(*args, **kwargs)
\ No newline at end of file
+        with transaction.atomic():
+            if self._state.adding:
+                delta = 1 if self.is_active else 0
+            else:
+                # Flip is_active in the database first, so exactly one writer sees each transition
+                flipped = OrganizationMember.objects.filter(pk=self.pk).exclude(
+                    is_active=self.is_active
+                ).update(is_active=self.is_active)
+                delta = (1 if self.is_active else -1) if flipped else 0
+            
+            super().save(*args, **kwargs)
+            if delta:
+                self._adjust_member_count(delta)
+    
+    def _adjust_member_count(self, delta):
+        Organization.objects.filter(pk=self.organization_id).update(member_count=F('member_count') + delta)
+        if OrganizationMember.organization.is_cached(self):
+            self.organization.member_count += delta
+    
+    @property
+    def capabilities(self):
+        return ROLE_CAPABILITIES.get(self.role, Capability(0))
+    
+    def has(self, capability):
+        return (self.capabilities & capability) == capability
+    
+    # The flags the API has always exposed, now read off the role's bitmask
+    @property
+    def can_create_events(self):
+        return self.has(Capability.CREATE_EVENTS)
+    
+    @property
+    def can_manage_tickets(self):
+        return self.has(Capability.MANAGE_TICKETS)
+    
+    @property
+    def can_manage_team(self):
+        return self.has(Capability.MANAGE_TEAM)
+    
+    @property
+    def can_view_analytics(self):
+        return self.has(Capability.VIEW_ANALYTICS)
+
+
+# What each role may do; the single place to change a role's permissions
+ROLE_CAPABILITIES = {
+    OrganizationMember.Role.OWNER: Capability.ALL,
+    OrganizationMember.Role.ADMIN: Capability.ALL,
+    OrganizationMember.Role.MANAGER: Capability.CREATE_EVENTS | Capability.MANAGE_TICKETS | Capability.VIEW_ANALYTICS,
+    OrganizationMember.Role.MEMBER: Capability(0),
+}
\ No newline at end of file
@@ -1,5 +1,6 @@
 from rest_framework import permissions
-from .models import Organization, OrganizationMember
+from .memberships import memberships_for
+from .models import Capability, Organization
 
 
 class IsOrganizationOwner(permissions.BasePermission):
@@ -12,18 +13,11 @@ class IsOrganizationOwner(permissions.BasePermission):
 
 
 class IsOrganizationAdmin(permissions.BasePermission):
-    """Check if user is admin or owner of the organization"""
+    """Check if user is admin or owner of the organization (may administer it)"""
     
     def has_object_permission(self, request, view, obj):
         if isinstance(obj, Organization):
-            try:
-                membership = obj.members.get(user=request.user)
-                return membership.role in [
-                    OrganizationMember.Role.OWNER,
-                    OrganizationMember.Role.ADMIN
-                ]
-            except OrganizationMember.DoesNotExist:
-                return False
+            return memberships_for(request).has(obj, Capability.ADMINISTER)
         return False
 
 
@@ -32,7 +26,7 @@ class IsOrganizationMember(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         if isinstance(obj, Organization):
-            return obj.members.filter(user=request.user, is_active=True).exists()
+            return memberships_for(request).is_member(obj)
         return False
 
 
@@ -41,11 +35,7 @@ class CanCreateEvents(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         if isinstance(obj, Organization):
-            try:
-                membership = obj.members.get(user=request.user, is_active=True)
-                return membership.can_create_events
-            except OrganizationMember.DoesNotExist:
-                return False
+            return memberships_for(request).has(obj, Capability.CREATE_EVENTS)
         return False
 
 
@@ -63,9 +53,5 @@ class CanManageOrganizationTeam(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         if isinstance(obj, Organization):
-            try:
-                membership = obj.members.get(user=request.user, is_active=True)
-                return membership.can_manage_team
-            except OrganizationMember.DoesNotExist:
-                return False
+            return memberships_for(request).has(obj, Capability.MANAGE_TEAM)
         return False
\ No newline at end of file
@@ -0,0 +1,107 @@
+# backend/apps/organizations/personal.py
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .memberships import invalidate_memberships
+from .models import Organization, OrganizationMember, SlugCounter
+
+User = get_user_model()
+
+# PERSONAL_ORGANIZATION_MODE values
+EAGER = 'eager'  # Created by the signup signal
+LAZY = 'lazy'  # Created on the user's first organizer request, or by create_personal_organizations
+
+
+def is_lazy():
+    return getattr(settings, 'PERSONAL_ORGANIZATION_MODE', EAGER) == LAZY
+
+
+def ensure_personal_organization(user):
+    """
+    Give `user` their personal organization if they've never had one.
+
+    Free for users who already have it (the flag is on the user row), so
+    organizer endpoints call it on every request. A personal organization
+    the owner later deletes isn't recreated.
+    """
+    if not user.is_authenticated or user.has_personal_organization:
+        return
+    with transaction.atomic():
+        # Lock the user row so concurrent first requests create one organization
+        if User.objects.select_for_update().filter(pk=user.pk, has_personal_organization=False).exists():
+            organization = Organization.personal_for(user)
+            organization.save()
+            OrganizationMember.objects.create(
+                organization=organization,
+                user=user,
+                role=OrganizationMember.Role.OWNER
+            )
+            User.objects.filter(pk=user.pk).update(has_personal_organization=True)
+    user.has_personal_organization = True
+
+
+def create_personal_organizations(users):
+    """
+    Create personal organizations and OWNER memberships for saved `users`
+    in bulk: slugs are claimed with one counter update per distinct name,
+    and no signals fire.
+    """
+    users = list(users)
+    organizations = [Organization.personal_for(user) for user in users]
+    for organization in organizations:
+        # bulk_create skips OrganizationMember.save(), which would count the owner
+        organization.member_count = 1
+    memberships = [
+        OrganizationMember(organization=organization, user=organization.owner, role=OrganizationMember.Role.OWNER)
+        for organization in organizations
+    ]
+
+    with transaction.atomic():
+        _assign_slugs(organizations)
+        Organization.objects.bulk_create(organizations)
+        OrganizationMember.objects.bulk_create(memberships)
+        # bulk_create sends no signals
+        invalidate_memberships(user.pk for user in users)
+        unflagged = [user.pk for user in users if not user.has_personal_organization]
+        if unflagged:
+            User.objects.filter(pk__in=unflagged).update(has_personal_organization=True)
+    for user in users:
+        user.has_personal_organization = True
+    return organizations
+
+
+def backfill_personal_organizations(user_ids):
+    """
+    Create personal organizations for those of `user_ids` still without one.
+
+    The user rows are locked and re-checked first, as in
+    ensure_personal_organization, so a user whose first organizer request
+    races the backfill gets one organization either way.
+    """
+    with transaction.atomic():
+        users = list(
+            User.objects.select_for_update()
+            .filter(pk__in=list(user_ids), has_personal_organization=False)
+            .order_by('pk')
+        )
+        return create_personal_organizations(users) if users else []
+
+
+def _assign_slugs(organizations):
+    by_base = defaultdict(list)
+    for organization in organizations:
+        by_base[Organization.base_slug(organization.name)].append(organization)
+    for base, group in by_base.items():
+        for organization, slug in zip(group, SlugCounter.next_slugs(base, len(group))):
+            organization.slug = slug
+
+    # Hand-picked slugs can sit where the counter expects free ones
+    taken = set(Organization.objects.filter(
+        slug__in=[organization.slug for organization in organizations]
+    ).values_list('slug', flat=True))
+    for organization in organizations:
+        while organization.slug in taken:
+            organization.slug = SlugCounter.next_slug(Organization.base_slug(organization.name))
@@ -29,7 +29,6 @@ class OrganizationMemberSerializer(serializers.ModelSerializer):
 class OrganizationSerializer(serializers.ModelSerializer):
     owner_email = serializers.EmailField(source='owner.email', read_only=True)
     owner_name = serializers.CharField(source='owner.get_full_name', read_only=True)
-    member_count = serializers.SerializerMethodField()
     is_owner = serializers.SerializerMethodField()
     
     class Meta:
@@ -68,13 +67,10 @@ class OrganizationSerializer(serializers.ModelSerializer):
             'owner': {'write_only': True},
         }
     
-    def get_member_count(self, obj):
-        return obj.members.filter(is_active=True).count()
-    
     def get_is_owner(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.owner == request.user
+            return obj.owner_id == request.user.pk
         return False
     
     def validate(self, data):
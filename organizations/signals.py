@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from .models import Organization, OrganizationMember
+from .memberships import invalidate_memberships
+from .personal import is_lazy
 
 User = get_user_model()
 
@@ -11,24 +14,37 @@ def create_personal_organization(sender, instance, created, **kwargs):
     Auto-create a personal organization when a new user signs up
     (Assuming all users can be organizers - adjust as needed)
     """
-    if created:
-        # Check if user should get an auto-organization
-        # You might want to check user type/role here
-        from django.utils.text import slugify
+    if created and not instance.has_personal_organization:
+        # In lazy mode it's created on the first organizer request instead
+        if is_lazy():
+            return
         
-        org_name = f"{instance.first_name}'s Events" if instance.first_name else f"{instance.username}'s Events"
-        
-        organization = Organization.objects.create(
-            name=org_name,
-            owner=instance,
-            org_type=Organization.OrganizationType.PERSONAL,
-            email=instance.email,
-            is_verified=False
-        )
+        organization = Organization.personal_for(instance)
+        organization.save()
         
         # Add user as OWNER of their personal organization
         OrganizationMember.objects.create(
             organization=organization,
             user=instance,
             role=OrganizationMember.Role.OWNER
-        )
\ No newline at end of file
+        )
+        User.objects.filter(pk=instance.pk).update(has_personal_organization=True)
+        instance.has_personal_organization = True
+
+
+@receiver(post_save, sender=OrganizationMember)
+@receiver(post_delete, sender=OrganizationMember)
+def invalidate_cached_memberships(sender, instance, **kwargs):
+    """Drop the member's cached memberships (organization deletes cascade here too)"""
+    invalidate_memberships([instance.user_id])
+
+
+@receiver(post_delete, sender=OrganizationMember)
+def decrement_member_count(sender, instance, origin=None, **kwargs):
+    """Deleting an active membership takes it off the organization's count"""
+    if not instance.is_active:
+        return
+    # The organization itself is going; nothing left to count
+    if isinstance(origin, Organization) or getattr(origin, 'model', None) is Organization:
+        return
+    Organization.objects.filter(pk=instance.organization_id).update(member_count=F('member_count') - 1)
@@ -1,3 +1,543 @@
-from django.test import TestCase
+import io
+import threading
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.testing import requires_file_database
+
+from .memberships import MembershipResolver
+from .personal import backfill_personal_organizations, create_personal_organizations
+from .models import ROLE_CAPABILITIES, Capability, Organization, OrganizationMember, SlugCounter
+
+User = get_user_model()
+
+
+def make_user(i, first_name='John'):
+    return User.objects.create_user(
+        email=f"user{i}@example.com", password='TestPass123!', first_name=first_name, last_name='Doe'
+    )
+
+
+class SlugAllocationTests(TestCase):
+    """Test that organization slugs stay unique in a constant number of queries"""
+
+    def setUp(self):
+        self.owner = make_user(0)
+
+    def test_colliding_names_get_numbered_slugs(self):
+        slugs = [
+            Organization.objects.create(name='Nairobi Jazz', owner=self.owner).slug
+            for _ in range(4)
+        ]
+        self.assertEqual(slugs, ['nairobi-jazz', 'nairobi-jazz-1', 'nairobi-jazz-2', 'nairobi-jazz-3'])
+
+    def test_signups_with_the_same_first_name(self):
+        for i in range(1, 4):
+            make_user(i)
+        slugs = sorted(Organization.objects.values_list('slug', flat=True))
+        self.assertEqual(slugs, ['johns-events', 'johns-events-1', 'johns-events-2', 'johns-events-3'])
+
+    def test_query_count_does_not_grow_with_collisions(self):
+        for _ in range(20):
+            Organization.objects.create(name='Busy Name', owner=self.owner)
+        # Counter update, counter read, insert (each in a savepoint)
+        with self.assertNumQueries(7):
+            org = Organization.objects.create(name='Busy Name', owner=self.owner)
+        self.assertEqual(org.slug, 'busy-name-20')
+
+    def test_counter_starts_after_existing_slugs(self):
+        Organization.objects.create(name='Legacy', slug='legacy', owner=self.owner)
+        Organization.objects.create(name='Legacy', slug='legacy-7', owner=self.owner)
+        Organization.objects.create(name='Legacy', slug='legacy-vip', owner=self.owner)
+
+        self.assertEqual(Organization.objects.create(name='Legacy', owner=self.owner).slug, 'legacy-8')
+        self.assertEqual(SlugCounter.objects.get(base='legacy').last_suffix, 8)
+
+    def test_hand_picked_slug_is_skipped(self):
+        Organization.objects.create(name='Taken', owner=self.owner)
+        Organization.objects.create(name='Other', slug='taken-1', owner=self.owner)
+
+        self.assertEqual(Organization.objects.create(name='Taken', owner=self.owner).slug, 'taken-2')
+
+    def test_name_without_slug_characters(self):
+        self.assertEqual(Organization.objects.create(name='!!!', owner=self.owner).slug, 'organization')
+
+
+class ConcurrentSlugAllocationTests(TransactionTestCase):
+    """Test slug allocation from several threads at once"""
+
+    @requires_file_database
+    def test_concurrent_signups_get_distinct_slugs(self):
+        owner = make_user(0, first_name='Owner')
+        errors = []
+
+        def create():
+            try:
+                for _ in range(5):
+                    Organization.objects.create(name='Crowded Night', owner=owner)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=create) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        slugs = list(Organization.objects.filter(name='Crowded Night').values_list('slug', flat=True))
+        self.assertEqual(len(slugs), 20)
+        self.assertEqual(len(set(slugs)), 20)
+
+
+@override_settings(PERSONAL_ORGANIZATION_MODE='lazy')
+class LazyPersonalOrganizationTests(TestCase):
+    """Test creating personal organizations on the first organizer request"""
+
+    def setUp(self):
+        self.user = make_user(1, first_name='Wanjiku')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_signup_creates_no_organization(self):
+        self.assertFalse(self.user.has_personal_organization)
+        self.assertFalse(Organization.objects.filter(owner=self.user).exists())
+
+    def test_first_organizer_request_creates_it(self):
+        response = self.client.get(reverse('organization-my-organizations'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([org['name'] for org in response.data['owned']], ["Wanjiku's Events"])
+        membership = OrganizationMember.objects.get(user=self.user)
+        self.assertEqual(membership.role, OrganizationMember.Role.OWNER)
+        self.assertTrue(membership.can_manage_team)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.has_personal_organization)
+
+    def test_created_once(self):
+        self.client.get(reverse('organization-list'))
+        self.client.get(reverse('organization-list'))
+
+        self.assertEqual(Organization.objects.filter(owner=self.user).count(), 1)
+
+    def test_deleted_organization_is_not_recreated(self):
+        self.client.get(reverse('organization-list'))
+        Organization.objects.filter(owner=self.user).delete()
+
+        self.client.get(reverse('organization-list'))
+
+        self.assertFalse(Organization.objects.filter(owner=self.user).exists())
+
+    def test_backfill_command(self):
+        make_user(2)
+        make_user(3)
+
+        call_command('create_personal_organizations', batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(Organization.objects.filter(org_type=Organization.OrganizationType.PERSONAL).count(), 3)
+        self.assertFalse(User.objects.filter(has_personal_organization=False).exists())
+        self.assertEqual(
+            sorted(Organization.objects.values_list('slug', flat=True)),
+            ['johns-events', 'johns-events-1', 'wanjikus-events'],
+        )
+
+    def test_backfill_skips_users_served_meanwhile(self):
+        # Selected for a backfill batch, then given an organization by their own first request
+        other = make_user(2)
+        self.client.get(reverse('organization-list'))
+
+        created = backfill_personal_organizations([self.user.pk, other.pk])
+
+        self.assertEqual([organization.owner for organization in created], [other])
+        self.assertEqual(Organization.objects.filter(owner=self.user).count(), 1)
+
+
+class MembershipResolverTests(TestCase):
+    """Test that permission checks and actions share one membership query per request"""
+
+    def setUp(self):
+        self.owner = make_user(1, first_name='Akinyi')
+        self.organization = Organization.objects.get(owner=self.owner)
+        self.admin = make_user(2, first_name='Baraka')
+        self.member = make_user(3, first_name='Chebet')
+        OrganizationMember.objects.create(
+            organization=self.organization, user=self.admin, role=OrganizationMember.Role.ADMIN
+        )
+        OrganizationMember.objects.create(organization=self.organization, user=self.member)
+        self.client = APIClient()
+
+    def url(self, action):
+        return reverse(f'organization-{action}', args=[self.organization.pk])
+
+    def test_my_role(self):
+        self.client.force_authenticate(self.admin)
+        # Memberships, organization, the membership row to show
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url('my-role'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['role'], OrganizationMember.Role.ADMIN)
+
+    def test_update_member_role(self):
+        self.client.force_authenticate(self.admin)
+        # Memberships, organization, target membership, its update, its user for the response
+        with self.assertNumQueries(5):
+            response = self.client.post(
+                self.url('update-member-role'), {'user_id': self.member.pk, 'role': 'admin'}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            OrganizationMember.objects.get(organization=self.organization, user=self.member).role,
+            OrganizationMember.Role.ADMIN,
+        )
+
+    def test_invite_member(self):
+        invitee = make_user(4)
+        self.client.force_authenticate(self.owner)
+        # Memberships, organization, invitee, existing membership check,
+        # then the insert and the member_count bump in a savepoint
+        with self.assertNumQueries(8):
+            response = self.client.post(self.url('invite-member'), {'email': invitee.email})
+        self.assertEqual(response.status_code, 201)
+
+    def test_plain_member_is_refused(self):
+        self.client.force_authenticate(self.member)
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                self.url('update-member-role'), {'user_id': self.admin.pk, 'role': 'member'}
+            )
+        self.assertEqual(response.status_code, 403)
+
+    def test_removed_member_loses_access(self):
+        OrganizationMember.objects.filter(user=self.admin).update(is_active=False)
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(self.url('my-role'))
+
+        self.assertEqual(response.status_code, 404)
+
+
+class ActionPermissionTests(TestCase):
+    """Test the permission_classes declared on each @action are enforced"""
+
+    def setUp(self):
+        self.owner = make_user(1, first_name='Akinyi')
+        self.organization = Organization.objects.get(owner=self.owner)
+        self.organization.org_type = Organization.OrganizationType.BUSINESS
+        self.organization.save()
+        self.admin = make_user(2, first_name='Baraka')
+        self.member = make_user(3, first_name='Chebet')
+        OrganizationMember.objects.create(
+            organization=self.organization, user=self.admin, role=OrganizationMember.Role.ADMIN
+        )
+        OrganizationMember.objects.create(organization=self.organization, user=self.member)
+        # Staff see every organization, so only the action's own check stops them
+        self.staff = make_user(4, first_name='Dalia')
+        self.staff.is_staff = True
+        self.staff.save()
+        self.client = APIClient()
+
+    def url(self, action):
+        return reverse(f'organization-{action}', args=[self.organization.pk])
+
+    def assertRefused(self, user, method, action, data=None):
+        self.client.force_authenticate(user)
+        response = getattr(self.client, method)(self.url(action), data)
+        self.assertEqual(response.status_code, 403, action)
+
+    def test_members_needs_membership(self):
+        self.assertRefused(self.staff, 'get', 'members')
+
+    def test_my_role_needs_membership(self):
+        self.assertRefused(self.staff, 'get', 'my-role')
+
+    def test_invite_member_needs_team_management(self):
+        self.assertRefused(self.member, 'post', 'invite-member', {'email': self.staff.email})
+        self.assertFalse(self.organization.members.filter(user=self.staff).exists())
+
+    def test_update_member_role_needs_admin(self):
+        self.assertRefused(self.member, 'post', 'update-member-role', {'user_id': self.admin.pk, 'role': 'member'})
+        self.assertEqual(
+            OrganizationMember.objects.get(organization=self.organization, user=self.admin).role,
+            OrganizationMember.Role.ADMIN,
+        )
+
+    def test_remove_member_needs_admin(self):
+        self.assertRefused(self.member, 'post', 'remove-member', {'user_id': self.admin.pk})
+        self.assertTrue(self.organization.members.filter(user=self.admin, is_active=True).exists())
+
+    def test_request_verification_needs_owner(self):
+        self.assertRefused(self.member, 'post', 'request-verification')
+        self.assertRefused(self.admin, 'post', 'request-verification')
+        self.organization.refresh_from_db()
+        self.assertNotEqual(self.organization.status, Organization.Status.PENDING)
+
+
+class MembershipCacheTests(TestCase):
+    """Test the cross-request membership cache and its invalidation"""
+
+    def setUp(self):
+        self.owner = make_user(1, first_name='Akinyi')
+        self.organization = Organization.objects.get(owner=self.owner)
+        self.admin = make_user(2, first_name='Baraka')
+        OrganizationMember.objects.create(
+            organization=self.organization, user=self.admin, role=OrganizationMember.Role.ADMIN
+        )
+        self.client = APIClient()
+
+    def url(self, action):
+        return reverse(f'organization-{action}', args=[self.organization.pk])
+
+    def as_user(self, user, method, action, data=None):
+        self.client.force_authenticate(user)
+        return getattr(self.client, method)(self.url(action), data)
+
+    def test_later_requests_skip_the_membership_query(self):
+        self.as_user(self.admin, 'get', 'my-role')
+        # Organization and the membership row to show
+        with self.assertNumQueries(2):
+            response = self.as_user(self.admin, 'get', 'my-role')
+        self.assertEqual(response.data['role'], OrganizationMember.Role.ADMIN)
+
+    def test_role_change_invalidates(self):
+        self.as_user(self.admin, 'get', 'my-role')
+
+        self.as_user(self.owner, 'post', 'update-member-role', {'user_id': self.admin.pk, 'role': 'member'})
+
+        self.assertEqual(self.as_user(self.admin, 'get', 'my-role').data['role'], OrganizationMember.Role.MEMBER)
+        response = self.as_user(self.admin, 'post', 'remove-member', {'user_id': self.owner.pk})
+        self.assertEqual(response.status_code, 403)
+
+    def test_removal_invalidates(self):
+        self.as_user(self.admin, 'get', 'my-role')
+
+        self.as_user(self.owner, 'post', 'remove-member', {'user_id': self.admin.pk})
+
+        self.assertEqual(self.as_user(self.admin, 'get', 'my-role').status_code, 404)
+
+    def test_organization_deletion_invalidates(self):
+        resolver = MembershipResolver(self.admin)
+        self.assertTrue(resolver.is_member(self.organization))
+
+        self.organization.delete()
+
+        self.assertFalse(MembershipResolver(self.admin).is_member(self.organization.pk))
+
+
+class MembershipCacheStressTests(TransactionTestCase):
+    """Test that no reader sees a membership older than the last completed write"""
+
+    # Distinct capability masks, cycled through by the writer
+    ROLES = [OrganizationMember.Role.MANAGER, OrganizationMember.Role.MEMBER, OrganizationMember.Role.ADMIN]
+
+    @requires_file_database
+    def test_no_stale_reads_under_concurrent_writes(self):
+        owner = make_user(1, first_name='Owner')
+        organization = Organization.objects.get(owner=owner)
+        member = make_user(2)
+        membership = OrganizationMember.objects.create(organization=organization, user=member, role=self.ROLES[0])
+        masks = [ROLE_CAPABILITIES[role] for role in self.ROLES]
+
+        completed = [0]
+        done = threading.Event()
+        stale = []
+        errors = []
+
+        def write():
+            try:
+                for version in range(1, 151):
+                    membership.role = self.ROLES[version % 3]
+                    membership.save()
+                    completed[0] = version
+            except Exception as e:
+                errors.append(e)
+            finally:
+                done.set()
+                connection.close()
+
+        def read():
+            try:
+                while not done.is_set():
+                    before = completed[0]
+                    seen = MembershipResolver(member).capabilities(organization)
+                    after = completed[0]
+                    # Anything from the last completed write to one still in flight is current
+                    allowed = {masks[version % 3] for version in range(before, after + 2)}
+                    if seen not in allowed:
+                        stale.append((seen, before, after))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(stale, [])
+        self.assertEqual(MembershipResolver(member).capabilities(organization), masks[150 % 3])
+
+
+class CapabilityTests(TestCase):
+    """Test role presets and bulk role changes"""
+
+    def setUp(self):
+        self.owner = make_user(1, first_name='Owner')
+        self.organization = Organization.objects.get(owner=self.owner)
+        self.members = [make_user(i) for i in range(2, 6)]
+        for user in self.members:
+            OrganizationMember.objects.create(organization=self.organization, user=user)
+
+    def test_role_presets(self):
+        manager = OrganizationMember(role=OrganizationMember.Role.MANAGER)
+        self.assertTrue(manager.can_create_events)
+        self.assertTrue(manager.can_view_analytics)
+        self.assertFalse(manager.can_manage_team)
+        self.assertFalse(manager.has(Capability.CREATE_EVENTS | Capability.ADMINISTER))
+        self.assertEqual(OrganizationMember(role=OrganizationMember.Role.MEMBER).capabilities, 0)
+        self.assertTrue(OrganizationMember(role=OrganizationMember.Role.ADMIN).has(Capability.ALL))
+
+    def test_bulk_role_change_is_one_update(self):
+        members = OrganizationMember.objects.filter(organization=self.organization, role=OrganizationMember.Role.MEMBER)
+        resolver = MembershipResolver(self.members[0])
+        self.assertFalse(resolver.has(self.organization, Capability.CREATE_EVENTS))
+
+        # Affected users (for cache invalidation), then the UPDATE
+        with self.assertNumQueries(2):
+            self.assertEqual(members.set_role(OrganizationMember.Role.MANAGER), 4)
+
+        self.assertTrue(MembershipResolver(self.members[0]).has(self.organization, Capability.CREATE_EVENTS))
+        self.assertEqual(
+            OrganizationMember.objects.filter(role=OrganizationMember.Role.MANAGER).count(), 4
+        )
+
+
+class OrganizationListingTests(TestCase):
+    """Test the membership-scoped organization listing"""
+
+    def setUp(self):
+        self.user = make_user(1, first_name='Njeri')
+        self.personal = Organization.objects.get(owner=self.user)
+        self.other_owner = make_user(2, first_name='Otieno')
+        self.joined = Organization.objects.get(owner=self.other_owner)
+        OrganizationMember.objects.create(organization=self.joined, user=self.user)
+        self.left = Organization.objects.create(name='Left', owner=self.other_owner)
+        OrganizationMember.objects.create(organization=self.left, user=self.user, is_active=False)
+        # Owned without a membership row
+        self.owned_only = Organization.objects.create(name='Owned Only', owner=self.user)
+
+    def test_accessible_to(self):
+        organizations = Organization.objects.accessible_to(self.user)
+
+        self.assertCountEqual(organizations, [self.personal, self.joined, self.owned_only])
+        sql = str(organizations.query).upper()
+        self.assertIn('UNION', sql)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertNotIn('JOIN', sql)
+
+    def test_my_organizations_splits_one_query(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('organization-my-organizations'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual([org['name'] for org in response.data['owned']], ["Njeri's Events", 'Owned Only'])
+        self.assertEqual([org['name'] for org in response.data['member_of']], ["Otieno's Events"])
+        listing = [query for query in queries if 'UNION' in query['sql']]
+        self.assertEqual(len(listing), 1)
+
+
+class MemberCountTests(TestCase):
+    """Test the denormalized Organization.member_count"""
+
+    def setUp(self):
+        self.owner = make_user(1, first_name='Wanjiru')
+        self.organization = Organization.objects.get(owner=self.owner)
+        self.member = make_user(2, first_name='Kamau')
+        self.membership = OrganizationMember.objects.create(organization=self.organization, user=self.member)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def count(self):
+        return Organization.objects.values_list('member_count', flat=True).get(pk=self.organization.pk)
+
+    def url(self, action):
+        return reverse(f'organization-{action}', args=[self.organization.pk])
+
+    def test_create_remove_reinvite(self):
+        self.assertEqual(self.count(), 2)
+
+        self.client.post(self.url('remove-member'), {'user_id': self.member.pk})
+        self.assertEqual(self.count(), 1)
+
+        response = self.client.post(self.url('invite-member'), {'email': self.member.email})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.count(), 2)
+
+    def test_each_transition_counts_once(self):
+        stale = OrganizationMember.objects.get(pk=self.membership.pk)
+        self.membership.is_active = False
+        self.membership.save()
+        stale.is_active = False
+        stale.save()
+        self.assertEqual(self.count(), 1)
+
+        # Saving without changing is_active leaves the count alone
+        self.membership.role = OrganizationMember.Role.MANAGER
+        self.membership.save()
+        self.membership.save(update_fields=['role'])
+        self.assertEqual(self.count(), 1)
+
+    def test_delete(self):
+        self.membership.delete()
+        self.assertEqual(self.count(), 1)
+
+    def test_stale_organization_save_keeps_count(self):
+        stale = Organization.objects.get(pk=self.organization.pk)
+        OrganizationMember.objects.create(organization=self.organization, user=make_user(3))
+
+        stale.description = 'Updated'
+        stale.save()
+
+        self.assertEqual(self.count(), 3)
+
+    def test_personal_organizations_in_bulk(self):
+        user = User.objects.create_user(email='bulk@example.com', password='TestPass123!', has_personal_organization=True)
+        [organization] = create_personal_organizations([user])
+        self.assertEqual(Organization.objects.get(pk=organization.pk).member_count, 1)
+
+    def test_reconcile_command(self):
+        Organization.objects.filter(pk=self.organization.pk).update(member_count=7)
+        out = io.StringIO()
+
+        call_command('reconcile_member_counts', '--dry-run', stdout=out)
+        self.assertIn('7 stored, 2 active', out.getvalue())
+        self.assertEqual(self.count(), 7)
+
+        call_command('reconcile_member_counts', stdout=io.StringIO())
+        self.assertEqual(self.count(), 2)
+        self.assertFalse(Organization.objects.with_drifted_member_count().exists())
+
+    def test_listing_queries_do_not_grow_with_organizations(self):
+        def list_organizations():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('organization-list'))
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        before = list_organizations()
+        for i in range(5):
+            Organization.objects.create(name=f'Extra {i}', owner=self.owner)
+        self.assertEqual(list_organizations(), before)
@@ -3,10 +3,10 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
 from django.contrib.auth import get_user_model
 
 from .models import Organization, OrganizationMember
+from .personal import ensure_personal_organization, is_lazy
 from .serializers import (
     OrganizationSerializer,
     OrganizationCreateSerializer,
@@ -55,9 +55,16 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         elif self.action == 'destroy':
             permission_classes = [IsAuthenticated, IsOrganizationOwner]
         else:
-            permission_classes = [IsAuthenticated]
+            # Custom actions declare their own classes in @action
+            permission_classes = [IsAuthenticated, *self.permission_classes]
         return [permission() for permission in permission_classes]
     
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Any organizer request is the moment a lazily-created personal org appears
+        if is_lazy():
+            ensure_personal_organization(request.user)
+    
     def get_queryset(self):
         """
         Return organizations based on user role:
@@ -66,14 +73,12 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
         
+        # member_count is a column, so owner is the only relation the serializer follows
         if user.is_staff:
-            return Organization.objects.all()
+            return Organization.objects.select_related('owner')
         
-        # For regular users, return organizations they're members of
-        return Organization.objects.filter(
-            Q(owner=user) | 
-            Q(members__user=user, members__is_active=True)
-        ).distinct()
+        # For regular users, return organizations they own or are members of
+        return Organization.objects.accessible_to(user).select_related('owner')
     
     def perform_create(self, serializer):
         """Set the current user as owner when creating organization"""
@@ -93,13 +98,14 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         organization = self.get_object()
         try:
             membership = organization.members.get(user=request.user, is_active=True)
-            serializer = OrganizationMemberSerializer(membership)
-            return Response(serializer.data)
         except OrganizationMember.DoesNotExist:
             return Response(
                 {"detail": "You are not a member of this organization"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        membership.user = request.user
+        serializer = OrganizationMemberSerializer(membership)
+        return Response(serializer.data)
     
     @action(detail=True, methods=['post'], permission_classes=[CanManageOrganizationTeam])
     def invite_member(self, request, pk=None):
@@ -129,20 +135,29 @@ class OrganizationViewSet(viewsets.ModelViewSet):
             )
         
         # Check if already a member
-        if organization.members.filter(user=user, is_active=True).exists():
+        membership = organization.members.filter(user=user).first()
+        if membership and membership.is_active:
             return Response(
                 {"detail": "User is already a member of this organization"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create membership
-        membership = OrganizationMember.objects.create(
-            organization=organization,
-            user=user,
-            role=role,
-            invited_by=request.user,
-            invited_email=email
-        )
+        if membership:
+            # Re-invited after removal: reactivate the old membership
+            membership.is_active = True
+            membership.role = role
+            membership.invited_by = request.user
+            membership.invited_email = email
+            membership.save()
+        else:
+            # Create membership
+            membership = OrganizationMember.objects.create(
+                organization=organization,
+                user=user,
+                role=role,
+                invited_by=request.user,
+                invited_email=email
+            )
         
         serializer = OrganizationMemberSerializer(membership)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -174,7 +189,7 @@ class OrganizationViewSet(viewsets.ModelViewSet):
                 )
             
             membership.role = new_role
-            membership.save()
+            membership.save(update_fields=['role', 'updated_at'])
             
             serializer = OrganizationMemberSerializer(membership)
             return Response(serializer.data)
@@ -228,14 +243,15 @@ class OrganizationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def my_organizations(self, request):
         """Get organizations where current user is owner or member"""
-        organizations = Organization.objects.filter(
-            Q(owner=request.user) | 
-            Q(members__user=request.user, members__is_active=True)
-        ).distinct()
+        organizations = Organization.objects.accessible_to(request.user).select_related('owner')
         
-        # Separate owned vs member organizations
-        owned_orgs = organizations.filter(owner=request.user)
-        member_orgs = organizations.exclude(owner=request.user)
+        # Separate owned vs member organizations from the one query
+        owned_orgs, member_orgs = [], []
+        for organization in organizations:
+            if organization.owner_id == request.user.pk:
+                owned_orgs.append(organization)
+            else:
+                member_orgs.append(organization)
         
         owned_serializer = self.get_serializer(owned_orgs, many=True)
         member_serializer = self.get_serializer(member_orgs, many=True)
@@ -290,7 +306,7 @@ class AdminOrganizationViewSet(viewsets.ModelViewSet):
     """
     Admin-only API for managing all organizations
     """
-    queryset = Organization.objects.all()
+    queryset = Organization.objects.select_related('owner')
     serializer_class = OrganizationSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
@@ -1,3 +1,65 @@
 from django.contrib import admin
+from .models import (
+    LedgerEntry, LedgerTransaction, MpesaCallback, OrganizationBalance, PaymentIntent, Payout, PayoutBatch
+)
 
-# Register your models here.
+
+@admin.register(PayoutBatch)
+class PayoutBatchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'total_count', 'total_amount', 'created_at', 'completed_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = ['created_at', 'started_at', 'completed_at']
+
+
+@admin.register(Payout)
+class PayoutAdmin(admin.ModelAdmin):
+    list_display = ['organization', 'amount', 'currency', 'phone_number', 'status', 'attempts', 'requested_at']
+    list_filter = ['status', 'country', 'requested_at']
+    search_fields = ['organization__name', 'phone_number', 'idempotency_key', 'conversation_id']
+    readonly_fields = [
+        'idempotency_key', 'attempts', 'conversation_id', 'originator_conversation_id',
+        'response_data', 'requested_at', 'submitted_at', 'completed_at', 'updated_at'
+    ]
+
+
+@admin.register(MpesaCallback)
+class MpesaCallbackAdmin(admin.ModelAdmin):
+    list_display = ['reference', 'kind', 'result_code', 'received_at', 'processed_at']
+    list_filter = ['kind', 'result_code']
+    search_fields = ['reference']
+    readonly_fields = ['kind', 'reference', 'result_code', 'payload', 'received_at', 'processed_at']
+
+
+@admin.register(PaymentIntent)
+class PaymentIntentAdmin(admin.ModelAdmin):
+    list_display = ['account_reference', 'amount', 'currency', 'phone_number', 'status', 'created_at', 'expires_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['account_reference', 'phone_number', 'checkout_request_id', 'mpesa_receipt_number']
+    readonly_fields = [
+        'checkout_request_id', 'merchant_request_id', 'mpesa_receipt_number', 'result_code',
+        'created_at', 'updated_at', 'expires_at', 'paid_at'
+    ]
+
+
+class LedgerEntryInline(admin.TabularInline):
+    model = LedgerEntry
+    extra = 0
+    can_delete = False
+    readonly_fields = ['account', 'organization', 'amount', 'currency', 'created_at']
+
+
+@admin.register(LedgerTransaction)
+class LedgerTransactionAdmin(admin.ModelAdmin):
+    list_display = ['reference', 'kind', 'organization', 'currency', 'created_at']
+    list_filter = ['kind', 'currency', 'created_at']
+    search_fields = ['reference', 'organization__name']
+    readonly_fields = ['kind', 'reference', 'organization', 'currency', 'description', 'created_at']
+    inlines = [LedgerEntryInline]
+
+
+@admin.register(OrganizationBalance)
+class OrganizationBalanceAdmin(admin.ModelAdmin):
+    list_display = ['organization', 'currency', 'balance', 'entry_count', 'updated_at']
+    list_filter = ['currency']
+    search_fields = ['organization__name']
+    readonly_fields = ['organization', 'currency', 'balance', 'entry_count', 'updated_at']
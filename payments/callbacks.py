@@ -0,0 +1,195 @@
+# backend/apps/payments/callbacks.py
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import metrics
+from .intents import apply_stk_results
+from .models import MpesaCallback, Payout
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCallback(ValueError):
+    """Callback body is missing the fields we key on"""
+
+
+def parse_callback(kind, payload):
+    """Return (reference, result_code) for a Safaricom callback body"""
+    try:
+        if kind == MpesaCallback.Kind.STK:
+            body = payload['Body']['stkCallback']
+            return body['CheckoutRequestID'], _int_or_none(body.get('ResultCode'))
+
+        result = payload.get('Result', payload)
+        reference = result.get('ConversationID') or result.get('OriginatorConversationID')
+        if not reference:
+            raise KeyError('ConversationID')
+        return reference, _int_or_none(result.get('ResultCode'))
+    except (KeyError, TypeError, AttributeError) as e:
+        raise InvalidCallback(f"Missing {e} in {kind} callback")
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def ingest_callback(kind, payload):
+    """
+    Store a callback with a single INSERT.
+
+    Duplicates (same kind and CheckoutRequestID/ConversationID) are dropped
+    by the unique constraint inside that same statement.
+    """
+    reference, result_code = parse_callback(kind, payload)
+    MpesaCallback.objects.bulk_create(
+        [MpesaCallback(kind=kind, reference=reference, result_code=result_code, payload=payload)],
+        ignore_conflicts=True,
+    )
+    metrics.counter(f"mpesa.callbacks.{kind}.received").inc()
+
+
+class CallbackProcessor:
+    """
+    Applies stored callbacks to payment state in batches.
+
+    Each batch claims up to `batch_size` unprocessed callbacks (skipping rows
+    another worker has locked), hands them to the handler for their kind,
+    and marks them processed in the same transaction. Handlers receive the
+    whole list for their kind, so they can update many rows per query, and
+    return the references they found an intent or payout for.
+
+    A callback can arrive before the view or dispatcher has stored the
+    CheckoutRequestID/ConversationID it refers to. Unmatched callbacks are
+    left unprocessed and claimed again after `retry_interval` seconds;
+    once older than `match_timeout` seconds they are logged and dropped.
+    """
+
+    def __init__(self, batch_size=500, retry_interval=None, match_timeout=None):
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval or getattr(settings, 'MPESA_CALLBACK_RETRY_INTERVAL', 10)
+        self.match_timeout = match_timeout or getattr(settings, 'MPESA_CALLBACK_MATCH_TIMEOUT', 3600)
+        self.handlers = {
+            MpesaCallback.Kind.STK: apply_stk_results,
+            MpesaCallback.Kind.B2C_RESULT: apply_b2c_results,
+            MpesaCallback.Kind.B2C_TIMEOUT: apply_b2c_timeouts,
+        }
+        self.processed = metrics.counter('mpesa.callbacks.processed')
+        self.unmatched = metrics.counter('mpesa.callbacks.unmatched')
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def process_batch(self):
+        """Process one batch; returns the number of callbacks handled (including deferred ones)"""
+        now = timezone.now()
+        with transaction.atomic():
+            callbacks = list(
+                MpesaCallback.objects
+                .select_for_update(skip_locked=True)
+                .filter(processed_at__isnull=True, kind__in=list(self.handlers))
+                .filter(Q(retry_at__isnull=True) | Q(retry_at__lte=now))
+                .order_by('id')[:self.batch_size]
+            )
+            if not callbacks:
+                return 0
+
+            by_kind = {}
+            for callback in callbacks:
+                by_kind.setdefault(callback.kind, []).append(callback)
+            matched = set()
+            for kind, items in by_kind.items():
+                matched.update((kind, reference) for reference in self.handlers[kind](items))
+
+            done, waiting = [], []
+            cutoff = now - timedelta(seconds=self.match_timeout)
+            for callback in callbacks:
+                if (callback.kind, callback.reference) in matched:
+                    done.append(callback.pk)
+                elif callback.received_at < cutoff:
+                    logger.warning(
+                        "No record for %s callback %s after %ss; dropping it",
+                        callback.kind, callback.reference, self.match_timeout,
+                    )
+                    self.unmatched.inc()
+                    done.append(callback.pk)
+                else:
+                    waiting.append(callback.pk)
+
+            if done:
+                MpesaCallback.objects.filter(pk__in=done).update(processed_at=now)
+            if waiting:
+                MpesaCallback.objects.filter(pk__in=waiting).update(
+                    retry_at=now + timedelta(seconds=self.retry_interval)
+                )
+
+        self.processed.inc(len(callbacks))
+        return len(callbacks)
+
+    def drain(self):
+        """Process batches until nothing is left; returns the total handled"""
+        total = 0
+        while True:
+            handled = self.process_batch()
+            if not handled:
+                return total
+            total += handled
+
+
+def apply_b2c_results(callbacks):
+    """Complete or fail the payouts the B2C results refer to; returns the references matched"""
+    now = timezone.now()
+    by_reference = {c.reference: c for c in callbacks}
+    payouts = list(
+        Payout.objects
+        .filter(conversation_id__in=list(by_reference))
+        .only('id', 'status', 'conversation_id')
+        .order_by()
+    )
+
+    awaiting = [Payout.Status.SUBMITTED, Payout.Status.SUBMITTING, Payout.Status.UNCONFIRMED]
+    succeeded = [
+        payout.pk for payout in payouts
+        if payout.status in awaiting and by_reference[payout.conversation_id].result_code == 0
+    ]
+    if succeeded:
+        Payout.objects.filter(pk__in=succeeded, status__in=awaiting).update(
+            status=Payout.Status.COMPLETED,
+            completed_at=now,
+            updated_at=now,
+        )
+
+    failed = [
+        payout for payout in payouts
+        if payout.status in awaiting and by_reference[payout.conversation_id].result_code != 0
+    ]
+    for payout in failed:
+        result = by_reference[payout.conversation_id].payload.get('Result', {})
+        payout.status = Payout.Status.FAILED
+        payout.failure_reason = result.get('ResultDesc', '')
+        payout.updated_at = now
+    if failed:
+        Payout.objects.bulk_update(failed, ['status', 'failure_reason', 'updated_at'])
+    return {payout.conversation_id for payout in payouts}
+
+
+def apply_b2c_timeouts(callbacks):
+    """A queue timeout leaves the payout outcome unknown; returns the references matched"""
+    now = timezone.now()
+    references = [c.reference for c in callbacks]
+    Payout.objects.filter(
+        conversation_id__in=references,
+        status=Payout.Status.SUBMITTED,
+    ).update(
+        status=Payout.Status.UNCONFIRMED,
+        failure_reason='M-Pesa queue timeout',
+        updated_at=now,
+    )
+    return set(Payout.objects.filter(conversation_id__in=references).values_list('conversation_id', flat=True))
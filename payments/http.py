@@ -0,0 +1,249 @@
+# backend/apps/payments/http.py
+import asyncio
+import contextlib
+import json
+import random
+import threading
+import time
+import weakref
+
+import aiohttp
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .resilience import Bulkhead, circuit_breaker
+
+# Only these methods are safe to replay after a failure
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Payment calls share one bulkhead; OAuth is already single-flighted by the token cache
+BULKHEAD_ENDPOINTS = frozenset(['stk_push', 'b2c'])
+
+
+class GatewayHttpClient:
+    """
+    Pooled keep-alive HTTP client for payment gateways.
+
+    One session per process keeps TCP/TLS connections to the upstream open
+    between calls. Every request has connect/read timeouts, idempotent
+    requests are retried with jittered backoff, and latencies are recorded
+    per endpoint as `<prefix>.<endpoint>.latency_ms` histograms.
+
+    Each endpoint has a circuit breaker, and payment calls go through a
+    bulkhead of `max_concurrent` slots; both fail fast with
+    UpstreamUnavailable rather than letting callers pile up.
+    """
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_factor=None, backoff_jitter=None,
+                 metric_prefix='mpesa.http', max_concurrent=None):
+        self.pool_size = pool_size or getattr(settings, 'MPESA_HTTP_POOL_SIZE', 20)
+        self.timeout = (
+            connect_timeout or getattr(settings, 'MPESA_HTTP_CONNECT_TIMEOUT', 3.05),
+            read_timeout or getattr(settings, 'MPESA_HTTP_READ_TIMEOUT', 30),
+        )
+        self.metric_prefix = metric_prefix
+        self.bulkhead = Bulkhead(
+            f"{metric_prefix}.bulkhead", max_concurrent or getattr(settings, 'MPESA_MAX_CONCURRENT_CALLS', 50)
+        )
+
+        retry = Retry(
+            total=max_retries if max_retries is not None else getattr(settings, 'MPESA_HTTP_MAX_RETRIES', 3),
+            backoff_factor=backoff_factor if backoff_factor is not None else getattr(settings, 'MPESA_HTTP_BACKOFF_FACTOR', 0.3),
+            backoff_jitter=backoff_jitter if backoff_jitter is not None else getattr(settings, 'MPESA_HTTP_BACKOFF_JITTER', 0.3),
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, endpoint, **kwargs):
+        """Send a request and record its latency under `endpoint`"""
+        kwargs.setdefault('timeout', self.timeout)
+        breaker = circuit_breaker(f"{self.metric_prefix}.{endpoint}")
+        with _bulkhead(self.bulkhead, endpoint):
+            breaker.allow()
+            ok = False
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+                ok = response.status_code not in RETRY_STATUSES
+                return response
+            except requests.RequestException:
+                metrics.counter(f"{self.metric_prefix}.{endpoint}.errors").inc()
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                breaker.record(ok, elapsed)
+                metrics.histogram(f"{self.metric_prefix}.{endpoint}.latency_ms").observe(elapsed * 1000)
+
+    def get(self, url, endpoint, **kwargs):
+        return self.request('GET', url, endpoint, **kwargs)
+
+    def post(self, url, endpoint, **kwargs):
+        return self.request('POST', url, endpoint, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def _bulkhead(bulkhead, endpoint):
+    return bulkhead if endpoint in BULKHEAD_ENDPOINTS else contextlib.nullcontext()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide pooled client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GatewayHttpClient()
+    return _client
+
+
+class AsyncResponse:
+    """Fully read aiohttp response exposing the bits of requests.Response we use"""
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncGatewayHttpClient:
+    """
+    asyncio counterpart of GatewayHttpClient built on aiohttp.
+
+    Same pool size, timeouts, retry policy, circuit breakers, bulkhead and
+    latency histograms as the sync client, so both paths report into the
+    same metrics. Breakers are shared with the sync client.
+    """
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_factor=None, backoff_jitter=None,
+                 metric_prefix='mpesa.http', max_concurrent=None):
+        self.pool_size = pool_size or getattr(settings, 'MPESA_HTTP_POOL_SIZE', 20)
+        self.timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout or getattr(settings, 'MPESA_HTTP_CONNECT_TIMEOUT', 3.05),
+            sock_read=read_timeout or getattr(settings, 'MPESA_HTTP_READ_TIMEOUT', 30),
+        )
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'MPESA_HTTP_MAX_RETRIES', 3)
+        self.backoff_factor = backoff_factor if backoff_factor is not None else getattr(settings, 'MPESA_HTTP_BACKOFF_FACTOR', 0.3)
+        self.backoff_jitter = backoff_jitter if backoff_jitter is not None else getattr(settings, 'MPESA_HTTP_BACKOFF_JITTER', 0.3)
+        self.metric_prefix = metric_prefix
+        self.bulkhead = Bulkhead(
+            f"{metric_prefix}.bulkhead", max_concurrent or getattr(settings, 'MPESA_MAX_CONCURRENT_CALLS', 50)
+        )
+        self._session = None
+
+    @property
+    def session(self):
+        # aiohttp sessions must be created inside the running loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout,
+            )
+        return self._session
+
+    def _backoff(self, attempt):
+        return self.backoff_factor * (2 ** attempt) + random.uniform(0, self.backoff_jitter)
+
+    async def _send(self, method, url, **kwargs):
+        async with self.session.request(method, url, **kwargs) as response:
+            return AsyncResponse(response.status, await response.read())
+
+    async def request(self, method, url, endpoint, **kwargs):
+        """Send a request and record its latency under `endpoint`"""
+        retries = self.max_retries if method in IDEMPOTENT_METHODS else 0
+        breaker = circuit_breaker(f"{self.metric_prefix}.{endpoint}")
+        with _bulkhead(self.bulkhead, endpoint):
+            breaker.allow()
+            ok = False
+            attempt = 0
+            started = time.perf_counter()
+            try:
+                while True:
+                    try:
+                        response = await self._send(method, url, **kwargs)
+                    except (aiohttp.ClientError, asyncio.TimeoutError):
+                        if attempt >= retries:
+                            metrics.counter(f"{self.metric_prefix}.{endpoint}.errors").inc()
+                            raise
+                    else:
+                        if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                            ok = response.status_code not in RETRY_STATUSES
+                            return response
+                    await asyncio.sleep(self._backoff(attempt))
+                    attempt += 1
+            finally:
+                elapsed = time.perf_counter() - started
+                breaker.record(ok, elapsed)
+                metrics.histogram(f"{self.metric_prefix}.{endpoint}.latency_ms").observe(elapsed * 1000)
+
+    async def get(self, url, endpoint, **kwargs):
+        return await self.request('GET', url, endpoint, **kwargs)
+
+    async def post(self, url, endpoint, **kwargs):
+        return await self.request('POST', url, endpoint, **kwargs)
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+# aiohttp connections are bound to the event loop that opened them
+_async_clients = weakref.WeakKeyDictionary()
+
+
+async def _close_with_loop(loop, client):
+    try:
+        yield
+    finally:
+        # The client's session references the loop, so the entry must go explicitly
+        _async_clients.pop(loop, None)
+        await client.aclose()
+
+
+async def _start(generator):
+    await generator.__anext__()
+
+
+def get_async_client():
+    """
+    Return the pooled async client for the running event loop.
+
+    Under ASGI that's one loop for the life of the worker. Under WSGI,
+    Django runs each async view in a fresh loop via asyncio.run(), so the
+    client is closed and forgotten when its loop shuts down: a suspended
+    async generator holds it, and asyncio.run() finalizes pending async
+    generators before closing the loop.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        client = AsyncGatewayHttpClient()
+        closer = _close_with_loop(loop, client)
+        # Kept here as well: the loop only tracks its async generators weakly
+        _async_clients[loop] = (client, closer)
+        loop.create_task(_start(closer))
+    return _async_clients[loop][0]
@@ -0,0 +1,109 @@
+# backend/apps/payments/idempotency.py
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Statuses that mean the request never left us, so a retry should run again
+UNSTORED_STATUSES = {503}
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was first used for a different request body"""
+
+
+class IdempotencyInProgress(Exception):
+    """The original request is still running after we stopped waiting for it"""
+
+
+def fingerprint(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Replay the first response for each idempotency key.
+
+    - Responses are stored in the Django cache as (status, content) for
+      `ttl` seconds, so every worker can replay them
+    - Only the caller holding the key's cache lock runs the handler; a
+      duplicate arriving meanwhile polls until the response is stored
+      and replays it, instead of running the handler a second time
+    - Only 503s aren't stored: the views return those when nothing reached
+      Safaricom, so a retry may run for real. Everything else is replayed,
+      including 502s for requests that may have been sent
+    - A key sent again with a different body raises IdempotencyKeyReused
+    """
+
+    def __init__(self, prefix='payments:idempotency', ttl=None, lock_timeout=120,
+                 wait_timeout=35, poll_interval=0.05):
+        self.prefix = prefix
+        self.ttl = ttl or getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 3600)
+        # Longer than the slowest request we'd wait on (the Daraja read timeout)
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+        self.replays = metrics.counter('idempotency.replays')
+        self.waits = metrics.counter('idempotency.waits')
+
+    async def arun(self, key, request_fingerprint, handler):
+        """
+        Run `handler()` once per key and return (status, content, replayed).
+
+        `handler` is a coroutine function returning (status, content).
+        """
+        entry_key = f"{self.prefix}:{key}"
+        lock_key = f"{entry_key}:lock"
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+
+        while True:
+            entry = await cache.aget(entry_key)
+            if entry is not None:
+                return self._replay(key, entry, request_fingerprint)
+
+            if await cache.aadd(lock_key, request_fingerprint, self.lock_timeout):
+                try:
+                    # The holder before us may have stored its response in between
+                    entry = await cache.aget(entry_key)
+                    if entry is not None:
+                        return self._replay(key, entry, request_fingerprint)
+
+                    status, content = await handler()
+                    if status not in UNSTORED_STATUSES:
+                        await cache.aset(entry_key, {
+                            'fingerprint': request_fingerprint,
+                            'status': status,
+                            'content': content,
+                        }, self.ttl)
+                    return status, content, False
+                finally:
+                    await cache.adelete(lock_key)
+
+            holder = await cache.aget(lock_key)
+            if holder is not None and holder != request_fingerprint:
+                raise IdempotencyKeyReused(key)
+            if not waited:
+                self.waits.inc()
+                waited = True
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress(key)
+            # If the holder failed without storing a response, the lock is
+            # gone on the next pass and this request runs the handler itself
+            await asyncio.sleep(self.poll_interval)
+
+    def _replay(self, key, entry, request_fingerprint):
+        if entry['fingerprint'] != request_fingerprint:
+            raise IdempotencyKeyReused(key)
+        self.replays.inc()
+        return entry['status'], entry['content'], True
+
+
+idempotency = IdempotencyStore()
@@ -0,0 +1,160 @@
+# backend/apps/payments/intents.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .models import PaymentIntent
+
+
+def reservation_window():
+    return timedelta(minutes=settings.DEEVENTS.get('TICKET_RESERVATION_MINUTES', 15))
+
+
+def create_intent(user, phone_number, amount, account_reference, description=''):
+    return PaymentIntent.objects.create(
+        **_intent_fields(user, phone_number, amount, account_reference, description)
+    )
+
+
+async def acreate_intent(user, phone_number, amount, account_reference, description=''):
+    return await PaymentIntent.objects.acreate(
+        **_intent_fields(user, phone_number, amount, account_reference, description)
+    )
+
+
+def _intent_fields(user, phone_number, amount, account_reference, description):
+    return {
+        'user': user,
+        'phone_number': phone_number,
+        'amount': amount,
+        'account_reference': account_reference,
+        'description': description,
+        'expires_at': timezone.now() + reservation_window(),
+    }
+
+
+def _transition_query(pk, from_statuses, to_status, fields):
+    fields.update(status=to_status, updated_at=timezone.now())
+    return PaymentIntent.objects.filter(pk=pk, status__in=from_statuses), fields
+
+
+def transition(intent, from_statuses, to_status, **fields):
+    """
+    Move an intent to `to_status` if it is still in one of `from_statuses`.
+
+    The check and the write are one conditional UPDATE, so a late callback
+    and the expiry sweep can never both win. Returns True if it moved.
+    """
+    queryset, fields = _transition_query(intent.pk, from_statuses, to_status, fields)
+    return bool(queryset.update(**fields))
+
+
+async def atransition(intent, from_statuses, to_status, **fields):
+    queryset, fields = _transition_query(intent.pk, from_statuses, to_status, fields)
+    return bool(await queryset.aupdate(**fields))
+
+
+def stk_push_accepted(response):
+    return str(response.get('ResponseCode')) == '0'
+
+
+def stk_push_fields(response):
+    """Fields to record on an intent for the STK push response"""
+    if stk_push_accepted(response):
+        return PaymentIntent.Status.PENDING, {
+            'checkout_request_id': response.get('CheckoutRequestID'),
+            'merchant_request_id': response.get('MerchantRequestID', ''),
+        }
+    return PaymentIntent.Status.FAILED, {
+        'failure_reason': response.get('errorMessage') or response.get('ResponseDescription', ''),
+    }
+
+
+def apply_stk_results(callbacks):
+    """
+    Settle the intents the STK callbacks refer to; returns the
+    CheckoutRequestIDs that matched an intent.
+
+    Runs inside CallbackProcessor's transaction; the intents are locked so
+    the expiry sweep cannot change them between the read and the write.
+    """
+    now = timezone.now()
+    references = [c.reference for c in callbacks]
+    intents = {
+        intent.checkout_request_id: intent
+        for intent in PaymentIntent.objects
+        .select_for_update()
+        .filter(checkout_request_id__in=references)
+        .only('id', 'status', 'checkout_request_id')
+        .order_by()
+    }
+
+    payable = PaymentIntent.OPEN_STATUSES + [PaymentIntent.Status.EXPIRED]
+    changed = []
+    for callback in callbacks:
+        intent = intents.get(callback.reference)
+        if intent is None:
+            continue
+        body = callback.payload['Body']['stkCallback']
+
+        if callback.result_code == 0 and intent.status in payable:
+            # The customer has been charged, so a payment that lands after
+            # the reservation expired is still recorded as paid
+            items = {
+                item.get('Name'): item.get('Value')
+                for item in body.get('CallbackMetadata', {}).get('Item', [])
+            }
+            intent.status = PaymentIntent.Status.PAID
+            intent.mpesa_receipt_number = str(items.get('MpesaReceiptNumber', ''))
+            intent.paid_at = now
+        elif callback.result_code != 0 and intent.status in PaymentIntent.OPEN_STATUSES:
+            intent.status = PaymentIntent.Status.FAILED
+            intent.failure_reason = body.get('ResultDesc', '')
+        else:
+            continue
+
+        intent.result_code = callback.result_code
+        intent.updated_at = now
+        changed.append(intent)
+        metrics.counter(f"payments.intents.{intent.status}").inc()
+
+    PaymentIntent.objects.bulk_update(
+        changed,
+        ['status', 'mpesa_receipt_number', 'paid_at', 'failure_reason', 'result_code', 'updated_at'],
+    )
+    return set(intents)
+
+
+def expire_stale_intents(now=None, chunk_size=1000):
+    """
+    Expire every open intent whose reservation window has passed.
+
+    Works in chunks: each one reads the next `chunk_size` ids from the
+    partial expiry index and expires them with a short UPDATE of its own,
+    so no long transaction or table-wide lock is ever held. Returns the
+    number of intents expired.
+    """
+    now = now or timezone.now()
+    stale = PaymentIntent.objects.filter(
+        status__in=PaymentIntent.OPEN_STATUSES,
+        expires_at__lte=now,
+    )
+    expired = metrics.counter('payments.intents.expired')
+
+    total = 0
+    while True:
+        ids = list(stale.order_by('expires_at', 'id').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return total
+        # Repeat the status check: a callback may have settled some of them
+        updated = stale.filter(pk__in=ids).update(
+            status=PaymentIntent.Status.EXPIRED,
+            failure_reason='Payment not completed before the reservation expired',
+            updated_at=now,
+        )
+        expired.inc(updated)
+        total += updated
+        if len(ids) < chunk_size:
+            return total
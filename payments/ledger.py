@@ -0,0 +1,192 @@
+# backend/apps/payments/ledger.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import LedgerEntry, LedgerTransaction, OrganizationBalance
+from .tax import KenyaTaxCalculator
+
+ZERO = Decimal('0')
+Account = LedgerEntry.Account
+
+
+class UnbalancedTransaction(ValueError):
+    """Debits and credits of a posting don't add up to zero"""
+
+
+def post(kind, reference, organization, currency, legs, description=''):
+    """
+    Append one balanced transaction and update the organization's balance.
+
+    `legs` is a list of (account, amount) pairs, debits positive and
+    credits negative. Everything happens in one database transaction, so
+    the running balance never disagrees with the entries. Posting the same
+    (kind, reference) again is a no-op. Returns (transaction, created).
+    """
+    legs = [(account, Decimal(amount)) for account, amount in legs if amount]
+    if sum(amount for _, amount in legs) != 0:
+        raise UnbalancedTransaction(f"{kind} {reference} does not balance: {legs}")
+
+    try:
+        with transaction.atomic():
+            ledger_transaction = LedgerTransaction.objects.create(
+                kind=kind,
+                reference=reference,
+                organization=organization,
+                currency=currency,
+                description=description,
+            )
+            LedgerEntry.objects.bulk_create([
+                LedgerEntry(
+                    transaction=ledger_transaction,
+                    account=account,
+                    organization=organization if account == Account.ORGANIZER_PAYABLE else None,
+                    amount=amount,
+                    currency=currency,
+                )
+                for account, amount in legs
+            ])
+
+            payable = [amount for account, amount in legs if account == Account.ORGANIZER_PAYABLE]
+            if payable:
+                # Organizer payable is a liability: credits (negative) raise what we owe
+                _apply_to_balance(organization, currency, -sum(payable), len(payable))
+    except IntegrityError:
+        existing = LedgerTransaction.objects.filter(kind=kind, reference=reference).first()
+        if existing is None:
+            raise
+        return existing, False
+
+    metrics.counter(f"ledger.{kind}.posted").inc()
+    return ledger_transaction, True
+
+
+def _apply_to_balance(organization, currency, delta, count):
+    balances = OrganizationBalance.objects.filter(organization=organization, currency=currency)
+    changes = {'balance': F('balance') + delta, 'entry_count': F('entry_count') + count, 'updated_at': timezone.now()}
+    if balances.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            OrganizationBalance.objects.create(
+                organization=organization, currency=currency, balance=delta, entry_count=count
+            )
+    except IntegrityError:
+        # Another posting created the row first
+        balances.update(**changes)
+
+
+def post_sale(organization, reference, ticket_price, service_fee, quantity=1, calculator=KenyaTaxCalculator):
+    """
+    Record a paid ticket sale.
+
+    The customer's payment is split, using the receipt breakdown, into the
+    ticket price owed to the organizer, the platform fee net of VAT, and
+    the VAT on that fee.
+    """
+    receipt = calculator(0).generate_receipt_details(ticket_price, service_fee)
+    total = receipt['total'] * quantity
+    price = receipt['ticket_price'] * quantity
+    vat = receipt['vat']['amount'] * quantity
+    return post(LedgerTransaction.Kind.SALE, str(reference), organization, calculator.CURRENCY, [
+        (Account.CUSTOMER_FUNDS, total),
+        (Account.ORGANIZER_PAYABLE, -price),
+        (Account.PLATFORM_REVENUE, -(total - price - vat)),
+        (Account.VAT_PAYABLE, -vat),
+    ], description=f"{quantity} x {receipt['ticket_price']} {calculator.CURRENCY}")
+
+
+def post_payout(payout, is_resident=True, calculator=KenyaTaxCalculator):
+    """
+    Record a completed payout.
+
+    The organizer's balance goes down by the gross amount. Withholding tax
+    is kept back for KRA and the rest leaves through M-Pesa B2C.
+    """
+    amount = Decimal(str(payout.amount))
+    tax = calculator(amount).calculate_withholding_tax(amount, is_resident=is_resident)['withholding_tax']
+    return post(LedgerTransaction.Kind.PAYOUT, str(payout.pk), payout.organization, payout.currency, [
+        (Account.ORGANIZER_PAYABLE, amount),
+        (Account.WITHHOLDING_TAX_PAYABLE, -tax),
+        # amount - tax rather than net_payout: both are rounded separately
+        # and can disagree by a cent on half-cent ties
+        (Account.PAYOUT_FUNDS, -(amount - tax)),
+    ], description=f"Payout {payout.pk}")
+
+
+def balance_for(organization, currency='KES'):
+    """What we owe `organization` in `currency`; a single-row read"""
+    balance = (
+        OrganizationBalance.objects
+        .filter(organization=organization, currency=currency)
+        .values_list('balance', flat=True)
+        .first()
+    )
+    return balance if balance is not None else ZERO
+
+
+def check_balances(chunk_size=5000, repair=False):
+    """
+    Rebuild every balance from the ledger and compare it to the stored one.
+
+    Entries are streamed in id order with keyset pagination, `chunk_size`
+    rows at a time, so memory holds one chunk plus one running total per
+    organization and currency. The same pass checks that each transaction
+    sums to zero; per-transaction totals are dropped as soon as they
+    balance, so only transactions still being read are kept.
+
+    With `repair`, stored balances are overwritten with the rebuilt ones.
+    Returns a report dict.
+    """
+    rebuilt = defaultdict(lambda: [ZERO, 0])
+    open_transactions = defaultdict(Decimal)
+    entries = 0
+    last_id = 0
+
+    while True:
+        chunk = list(
+            LedgerEntry.objects
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'transaction_id', 'account', 'organization_id', 'currency', 'amount')[:chunk_size]
+        )
+        if not chunk:
+            break
+        for entry_id, transaction_id, account, organization_id, currency, amount in chunk:
+            open_transactions[transaction_id] += amount
+            if account == Account.ORGANIZER_PAYABLE:
+                totals = rebuilt[(organization_id, currency)]
+                totals[0] -= amount
+                totals[1] += 1
+        for transaction_id in [t for t, total in open_transactions.items() if not total]:
+            del open_transactions[transaction_id]
+        entries += len(chunk)
+        last_id = chunk[-1][0]
+
+    mismatches = []
+    for balance in OrganizationBalance.objects.order_by('pk').iterator(chunk_size=chunk_size):
+        expected, count = rebuilt.pop((balance.organization_id, balance.currency), (ZERO, 0))
+        if balance.balance != expected or balance.entry_count != count:
+            mismatches.append((balance.organization_id, balance.currency, balance.balance, expected))
+            if repair:
+                OrganizationBalance.objects.filter(pk=balance.pk).update(
+                    balance=expected, entry_count=count, updated_at=timezone.now()
+                )
+    # Entries for which no balance row exists at all
+    for (organization_id, currency), (expected, count) in rebuilt.items():
+        mismatches.append((organization_id, currency, None, expected))
+        if repair:
+            OrganizationBalance.objects.create(
+                organization_id=organization_id, currency=currency, balance=expected, entry_count=count
+            )
+
+    return {
+        'entries': entries,
+        'unbalanced_transactions': sorted(open_transactions),
+        'mismatches': mismatches,
+        'repaired': repair and bool(mismatches),
+    }
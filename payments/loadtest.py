@@ -0,0 +1,134 @@
+# backend/apps/payments/loadtest.py
+import asyncio
+import math
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+OPERATIONS = ('stk_push', 'b2c')
+
+
+class LoadTestResult:
+    """Latencies and outcomes of one load test run"""
+
+    def __init__(self, operation, target_rate):
+        self.operation = operation
+        self.target_rate = target_rate
+        self.latencies = []
+        self.errors = Counter()
+        self.elapsed = 0.0
+
+    def record(self, latency, error=None):
+        self.latencies.append(latency)
+        if error:
+            self.errors[error] += 1
+
+    @property
+    def total(self):
+        return len(self.latencies)
+
+    @property
+    def succeeded(self):
+        return self.total - sum(self.errors.values())
+
+    @property
+    def throughput(self):
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, pct):
+        """Exact nearest-rank percentile in milliseconds"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        rank = max(1, math.ceil(pct / 100 * len(ordered)))
+        return ordered[rank - 1] * 1000
+
+    def summary(self):
+        return {
+            'operation': self.operation,
+            'target_rate': self.target_rate,
+            'requests': self.total,
+            'succeeded': self.succeeded,
+            'errors': dict(self.errors),
+            'elapsed_s': round(self.elapsed, 3),
+            'throughput_rps': round(self.throughput, 1),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+        }
+
+
+def _outcome(response):
+    """None for an accepted request, otherwise an error label"""
+    if str(response.get('ResponseCode')) == '0':
+        return None
+    return response.get('errorCode') or 'rejected'
+
+
+def _arguments(operation, i):
+    if operation == 'stk_push':
+        return ('0712345678', 100, f"LOAD{i}", 'Load test'), {}
+    return ('0712345678', 100, 'Load test payout'), {'occasion': f"LOAD{i}"}
+
+
+def _method(gateway, operation):
+    return gateway.stk_push if operation == 'stk_push' else gateway.b2c_payment
+
+
+def run_sync(gateway, operation, rate, total, concurrency=50):
+    """
+    Drive a blocking gateway at `rate` requests per second from a thread pool.
+
+    Requests are started on a fixed schedule (open loop) and latency is
+    measured from the scheduled start, so a slow upstream shows up as
+    latency instead of silently lowering the offered load.
+    """
+    result = LoadTestResult(operation, rate)
+    call = _method(gateway, operation)
+
+    def send(i, scheduled):
+        args, kwargs = _arguments(operation, i)
+        try:
+            error = _outcome(call(*args, **kwargs))
+        except Exception as e:
+            error = type(e).__name__
+        result.record(time.perf_counter() - scheduled, error)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(total):
+            scheduled = started + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i, scheduled)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def run_async(gateway, operation, rate, total, concurrency=500):
+    """asyncio version of run_sync for AsyncMpesaGateway"""
+    result = LoadTestResult(operation, rate)
+    call = _method(gateway, operation)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i, scheduled):
+        args, kwargs = _arguments(operation, i)
+        async with semaphore:
+            try:
+                error = _outcome(await call(*args, **kwargs))
+            except Exception as e:
+                error = type(e).__name__
+        result.record(time.perf_counter() - scheduled, error)
+
+    started = time.perf_counter()
+    tasks = []
+    for i in range(total):
+        scheduled = started + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(i, scheduled)))
+    await asyncio.gather(*tasks)
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from payments.ledger import check_balances
+
+
+class Command(BaseCommand):
+    help = "Rebuild organization balances from the ledger and report any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--repair', action='store_true', help="Overwrite drifted balances with rebuilt ones")
+
+    def handle(self, *args, **options):
+        report = check_balances(chunk_size=options['chunk_size'], repair=options['repair'])
+
+        self.stdout.write(f"Checked {report['entries']} ledger entries")
+        for transaction_id in report['unbalanced_transactions']:
+            self.stdout.write(self.style.ERROR(f"Transaction {transaction_id} does not balance"))
+        for organization_id, currency, stored, expected in report['mismatches']:
+            self.stdout.write(self.style.WARNING(
+                f"Organization {organization_id}: stored {currency} {stored}, ledger says {expected}"
+            ))
+
+        if report['unbalanced_transactions'] or report['mismatches']:
+            if report['repaired']:
+                self.stdout.write(self.style.SUCCESS(f"Repaired {len(report['mismatches'])} balances"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Ledger and balances agree"))
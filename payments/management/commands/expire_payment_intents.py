@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments.intents import expire_stale_intents
+
+
+class Command(BaseCommand):
+    help = "Expire payment intents whose ticket reservation window has passed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--interval', type=float, default=30.0, help="Seconds between sweeps")
+        parser.add_argument('--once', action='store_true', help="Sweep once and exit")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            expired = expire_stale_intents(chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f"Expired {expired} payment intents"))
+            return
+
+        self.stdout.write(f"Expiring payment intents every {options['interval']}s (Ctrl+C to stop)")
+        try:
+            while True:
+                close_old_connections()
+                expire_stale_intents(chunk_size=options['chunk_size'])
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
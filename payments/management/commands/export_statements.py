@@ -0,0 +1,50 @@
+import sys
+from datetime import date, datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.statements import (
+    COLUMNS, csv_chunks, month_range, render_statements, statement_rows, with_totals, write_csv
+)
+
+
+class Command(BaseCommand):
+    help = "Stream ledger statements to CSV, or render per-organization PDF statements"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help="YYYY-MM (default: last month)")
+        parser.add_argument('--start', type=date.fromisoformat, help="YYYY-MM-DD, instead of --month")
+        parser.add_argument('--end', type=date.fromisoformat, help="YYYY-MM-DD (exclusive)")
+        parser.add_argument('--organization', help="Only this organization's transactions")
+        parser.add_argument('--output', default='-', help="CSV file to write ('-' for stdout)")
+        parser.add_argument('--pdf', metavar='DIRECTORY', help="Render one PDF per organization instead of a CSV")
+        parser.add_argument('--processes', type=int, help="PDF worker processes (default: STATEMENT_PDF_PROCESSES)")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        month = options['month'] or f"{timezone.localdate().replace(day=1) - timedelta(days=1):%Y-%m}"
+
+        if options['pdf']:
+            organizations = [options['organization']] if options['organization'] else None
+            paths = render_statements(month, options['pdf'], organizations, processes=options['processes'])
+            self.stderr.write(self.style.SUCCESS(f"Rendered {len(paths)} statements for {month}"))
+            return
+
+        if options['start'] or options['end']:
+            if not (options['start'] and options['end']):
+                raise CommandError("--start and --end go together")
+            start = timezone.make_aware(datetime.combine(options['start'], time.min))
+            end = timezone.make_aware(datetime.combine(options['end'], time.min))
+        else:
+            start, end = month_range(month)
+
+        rows = with_totals(statement_rows(
+            start, end, organization=options['organization'], chunk_size=options['chunk_size']
+        ))
+        if options['output'] == '-':
+            for chunk in csv_chunks(rows, COLUMNS):
+                sys.stdout.write(chunk)
+            return
+        count = write_csv(rows, options['output'])
+        self.stderr.write(self.style.SUCCESS(f"Wrote {count} rows to {options['output']}"))
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand
+
+from payments.http import AsyncGatewayHttpClient, GatewayHttpClient
+from payments.loadtest import OPERATIONS, run_async, run_sync
+from payments.mpesa import MpesaGateway
+from payments.mpesa_async import AsyncMpesaGateway
+from payments.simulator import DarajaSimulator
+
+
+class Command(BaseCommand):
+    help = "Drive stk_push/b2c at a target rate and report throughput and latency percentiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operation', choices=OPERATIONS, default='stk_push')
+        parser.add_argument('--mode', choices=['sync', 'async'], default='sync')
+        parser.add_argument('--rate', type=float, default=100, help="Target requests per second")
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--base-url', help="Existing Daraja endpoint; default starts a local simulator")
+        parser.add_argument('--latency', type=float, default=0.05, help="Simulator latency in seconds")
+        parser.add_argument('--jitter', type=float, default=0.02, help="Simulator latency jitter in seconds")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Simulator 503 rate")
+        parser.add_argument('--callback-delay', type=float, default=1.0)
+        parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+
+    def handle(self, *args, **options):
+        simulator = None
+        base_url = options['base_url']
+        if not base_url:
+            simulator = DarajaSimulator(
+                latency=options['latency'],
+                jitter=options['jitter'],
+                error_rate=options['error_rate'],
+                callback_delay=options['callback_delay'],
+                send_callbacks=False,
+            )
+            base_url = simulator.start()
+
+        try:
+            # The token cache key includes the base URL, so the run can't pick up production's token
+            summary = self.run(options, base_url).summary()
+        finally:
+            if simulator:
+                simulator.stop()
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        self.stdout.write(
+            f"{summary['operation']} ({options['mode']}) against {base_url}: "
+            f"{summary['requests']} requests at {summary['target_rate']}/s target"
+        )
+        self.stdout.write(f"  throughput: {summary['throughput_rps']} req/s over {summary['elapsed_s']}s")
+        self.stdout.write(
+            f"  latency:    p50 {summary['p50_ms']:.1f}ms  p95 {summary['p95_ms']:.1f}ms  p99 {summary['p99_ms']:.1f}ms"
+        )
+        self.stdout.write(f"  succeeded:  {summary['succeeded']}  errors: {summary['errors'] or 'none'}")
+
+    def run(self, options, base_url):
+        args = (options['operation'], options['rate'], options['requests'], options['concurrency'])
+        # Size the bulkhead to the offered concurrency so it doesn't shed the test's own load
+        limits = {'pool_size': options['concurrency'], 'max_concurrent': options['concurrency']}
+        if options['mode'] == 'sync':
+            gateway = MpesaGateway(http_client=GatewayHttpClient(**limits), base_url=base_url)
+            return run_sync(gateway, *args)
+
+        async def main():
+            http = AsyncGatewayHttpClient(**limits)
+            try:
+                return await run_async(AsyncMpesaGateway(http_client=http, base_url=base_url), *args)
+            finally:
+                await http.aclose()
+        return asyncio.run(main())
@@ -0,0 +1,29 @@
+from aiohttp import web
+from django.core.management.base import BaseCommand
+
+from payments.simulator import DarajaSimulator
+
+
+class Command(BaseCommand):
+    help = "Run a local M-Pesa Daraja simulator (point MPESA_BASE_URL at it)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every response")
+        parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency, in seconds")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with 503")
+        parser.add_argument('--callback-delay', type=float, default=1.0, help="Seconds before callbacks are sent")
+        parser.add_argument('--callback-failure-rate', type=float, default=0.0,
+                            help="Share of callbacks reporting a failed payment")
+
+    def handle(self, *args, **options):
+        simulator = DarajaSimulator(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            callback_delay=options['callback_delay'],
+            callback_failure_rate=options['callback_failure_rate'],
+        )
+        self.stdout.write(f"Daraja simulator on http://{options['host']}:{options['port']}")
+        web.run_app(simulator.app, host=options['host'], port=options['port'], print=None, access_log=None)
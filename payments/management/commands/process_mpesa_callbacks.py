@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments.callbacks import CallbackProcessor
+
+
+class Command(BaseCommand):
+    help = "Apply stored M-Pesa callbacks to payment state in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when idle")
+        parser.add_argument('--once', action='store_true', help="Drain the backlog and exit")
+
+    def handle(self, *args, **options):
+        processor = CallbackProcessor(batch_size=options['batch_size'])
+
+        if options['once']:
+            handled = processor.drain()
+            self.stdout.write(self.style.SUCCESS(f"Processed {handled} callbacks"))
+            return
+
+        self.stdout.write(f"Processing M-Pesa callbacks every {options['interval']}s (Ctrl+C to stop)")
+        try:
+            while True:
+                close_old_connections()
+                if not processor.process_batch():
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
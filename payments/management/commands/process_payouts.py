@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from payments.models import PayoutBatch
+from payments.payouts import PayoutDispatcher, collect_eligible_payouts
+
+
+class Command(BaseCommand):
+    help = "Batch eligible organizer payouts and send them via M-Pesa B2C"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', help="Resume a specific batch instead of collecting a new one")
+        parser.add_argument('--collect-only', action='store_true', help="Create the batch without sending")
+        parser.add_argument('--max-in-flight', type=int, help="Concurrent B2C requests")
+        parser.add_argument('--rate', type=float, help="Maximum B2C requests per second")
+
+    def handle(self, *args, **options):
+        if options['batch']:
+            try:
+                batches = [PayoutBatch.objects.get(pk=options['batch'])]
+            except (PayoutBatch.DoesNotExist, ValueError):
+                raise CommandError(f"Payout batch {options['batch']} not found")
+        else:
+            # Finish anything a previous run left behind before starting new work
+            batches = list(PayoutBatch.objects.exclude(status=PayoutBatch.Status.COMPLETED).order_by('created_at'))
+            batch = collect_eligible_payouts()
+            if batch:
+                self.stdout.write(f"Collected {batch.total_count} payouts ({batch.total_amount}) into batch {batch.pk}")
+                batches.append(batch)
+
+        if options['collect_only']:
+            return
+        if not batches:
+            self.stdout.write("No payouts to process.")
+            return
+
+        dispatcher = PayoutDispatcher(
+            max_in_flight=options['max_in_flight'],
+            rate_per_second=options['rate'],
+        )
+        for batch in batches:
+            batch = dispatcher.run(batch)
+            counts = dict(batch.payouts.values_list('status').annotate(n=Count('id')).values_list('status', 'n'))
+            self.stdout.write(self.style.SUCCESS(f"Batch {batch.pk} {batch.status}: {counts}"))
@@ -0,0 +1,46 @@
+import csv
+import json
+from datetime import date, datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.reconciliation import EXCEPTION_COLUMNS, Reconciliation, StatementFormatError, read_statement
+
+
+class Command(BaseCommand):
+    help = "Reconcile an M-Pesa paybill statement export (CSV) against payment intents"
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help="Statement CSV downloaded from the M-Pesa org portal")
+        parser.add_argument('--output', help="Write every unmatched or mismatched row to this CSV")
+        parser.add_argument('--start', type=date.fromisoformat,
+                            help="YYYY-MM-DD; default: the statement's first completion time")
+        parser.add_argument('--end', type=date.fromisoformat, help="YYYY-MM-DD (exclusive)")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        start = end = None
+        if options['start'] or options['end']:
+            if not (options['start'] and options['end']):
+                raise CommandError("--start and --end go together")
+            start = timezone.make_aware(datetime.combine(options['start'], time.min))
+            end = timezone.make_aware(datetime.combine(options['end'], time.min))
+
+        exceptions = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else None
+        try:
+            on_exception = None
+            if exceptions:
+                writer = csv.DictWriter(exceptions, EXCEPTION_COLUMNS)
+                writer.writeheader()
+                on_exception = writer.writerow
+            reconciliation = Reconciliation(chunk_size=options['chunk_size'], on_exception=on_exception)
+            with open(options['statement'], newline='', encoding='utf-8-sig') as f:
+                report = reconciliation.run(read_statement(f), start, end)
+        except StatementFormatError as e:
+            raise CommandError(str(e))
+        finally:
+            if exceptions:
+                exceptions.close()
+
+        self.stdout.write(json.dumps(report, indent=2, default=str))
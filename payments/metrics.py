@@ -0,0 +1,156 @@
+# backend/apps/payments/metrics.py
+import bisect
+import threading
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter"""
+
+    def __init__(self, name):
+        self.name = name
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def reset(self):
+        with self._lock:
+            self._value = 0
+
+    def snapshot(self):
+        return self._value
+
+
+class Gauge:
+    """Thread-safe value that can go up and down (in-flight calls, breaker state)"""
+
+    def __init__(self, name):
+        self.name = name
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    @property
+    def value(self):
+        return self._value
+
+    def reset(self):
+        self.set(0)
+
+    def snapshot(self):
+        return self._value
+
+
+class Histogram:
+    """Thread-safe latency histogram with fixed millisecond buckets"""
+
+    DEFAULT_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self, name, buckets=None):
+        self.name = name
+        self.buckets = tuple(buckets or self.DEFAULT_BUCKETS)
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+
+    @property
+    def count(self):
+        return self._count
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the given percentile"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+        if not total:
+            return None
+        rank = total * pct / 100
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._count = 0
+            self._sum = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, total_sum = self._count, self._sum
+        buckets = {str(bound): count for bound, count in zip(self.buckets, counts)}
+        buckets['+Inf'] = counts[-1]
+        return {
+            'count': total,
+            'sum': round(total_sum, 3),
+            'buckets': buckets,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(name, factory):
+    metric = _registry.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.setdefault(name, factory(name))
+    return metric
+
+
+def counter(name):
+    """Return the process-wide counter registered under `name`"""
+    return _get_or_create(name, Counter)
+
+
+def gauge(name):
+    """Return the process-wide gauge registered under `name`"""
+    return _get_or_create(name, Gauge)
+
+
+def histogram(name):
+    """Return the process-wide latency histogram registered under `name`"""
+    return _get_or_create(name, Histogram)
+
+
+def snapshot():
+    """Return the current value of every registered metric"""
+    return {name: metric.snapshot() for name, metric in sorted(_registry.items())}
+
+
+def reset():
+    """Reset every registered metric (used by tests)"""
+    for metric in list(_registry.values()):
+        metric.reset()
@@ -0,0 +1,65 @@
+# Generated by Django 6.0 on 2026-10-17 09:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('organizations', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayoutBatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('running', 'Running'), ('completed', 'Completed')], default='open', max_length=20)),
+                ('total_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Payout batches',
+                'db_table': 'deevents_payout_batches',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Payout',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('currency', models.CharField(default='KES', max_length=3)),
+                ('country', models.CharField(default='KE', max_length=2)),
+                ('phone_number', models.CharField(max_length=15)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('queued', 'Queued'), ('submitting', 'Submitting'), ('submitted', 'Submitted'), ('completed', 'Completed'), ('failed', 'Failed'), ('unconfirmed', 'Unconfirmed')], default='pending', max_length=20)),
+                ('idempotency_key', models.CharField(default=uuid.uuid4, max_length=64, unique=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('conversation_id', models.CharField(blank=True, max_length=100, null=True, unique=True)),
+                ('originator_conversation_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('response_data', models.JSONField(blank=True, default=dict)),
+                ('failure_reason', models.TextField(blank=True)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='payouts', to='organizations.organization')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='requested_payouts', to=settings.AUTH_USER_MODEL)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payouts', to='payments.payoutbatch')),
+            ],
+            options={
+                'db_table': 'deevents_payouts',
+                'ordering': ['-requested_at'],
+                'indexes': [models.Index(fields=['status', 'country', 'requested_at'], name='deevents_pa_status_c22774_idx'), models.Index(fields=['batch', 'status'], name='deevents_pa_batch_i_034c4d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MpesaCallback',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('stk', 'STK Push'), ('b2c_result', 'B2C Result'), ('b2c_timeout', 'B2C Queue Timeout')], max_length=20)),
+                ('reference', models.CharField(max_length=100)),
+                ('result_code', models.IntegerField(blank=True, null=True)),
+                ('payload', models.JSONField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'deevents_mpesa_callbacks',
+                'ordering': ['id'],
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['kind', 'id'], name='mpesa_callback_unprocessed')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'reference'), name='unique_mpesa_callback')],
+            },
+        ),
+    ]
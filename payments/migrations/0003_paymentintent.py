@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-17 11:20
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_mpesacallback'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentIntent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('currency', models.CharField(default='KES', max_length=3)),
+                ('phone_number', models.CharField(max_length=15)),
+                ('account_reference', models.CharField(max_length=100)),
+                ('description', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(choices=[('initiated', 'Initiated'), ('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed'), ('expired', 'Expired')], default='initiated', max_length=20)),
+                ('checkout_request_id', models.CharField(blank=True, max_length=100, null=True, unique=True)),
+                ('merchant_request_id', models.CharField(blank=True, max_length=100)),
+                ('mpesa_receipt_number', models.CharField(blank=True, max_length=50)),
+                ('result_code', models.IntegerField(blank=True, null=True)),
+                ('failure_reason', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField()),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment_intents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'deevents_payment_intents',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'status'], name='deevents_pa_user_id_460255_idx'), models.Index(condition=models.Q(('status__in', ['initiated', 'pending'])), fields=['expires_at', 'id'], name='payment_intent_open_expiry')],
+            },
+        ),
+    ]
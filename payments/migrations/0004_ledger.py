@@ -0,0 +1,78 @@
+# Generated by Django 6.0 on 2026-10-17 12:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0001_initial'),
+        ('payments', '0003_paymentintent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerTransaction',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('sale', 'Ticket sale'), ('payout', 'Organizer payout'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('reference', models.CharField(max_length=100)),
+                ('currency', models.CharField(default='KES', max_length=3)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_transactions', to='organizations.organization')),
+            ],
+            options={
+                'db_table': 'deevents_ledger_transactions',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('account', models.CharField(choices=[('customer_funds', 'Customer funds (M-Pesa collections)'), ('organizer_payable', 'Owed to organizers'), ('platform_revenue', 'Platform fee revenue'), ('vat_payable', 'VAT payable'), ('withholding_tax_payable', 'Withholding tax payable'), ('payout_funds', 'Payout funds (M-Pesa B2C)')], max_length=30)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('currency', models.CharField(default='KES', max_length=3)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('organization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='organizations.organization')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='payments.ledgertransaction')),
+            ],
+            options={
+                'verbose_name_plural': 'Ledger entries',
+                'db_table': 'deevents_ledger_entries',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrganizationBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(default='KES', max_length=3)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('entry_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='organizations.organization')),
+            ],
+            options={
+                'db_table': 'deevents_organization_balances',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ledgertransaction',
+            constraint=models.UniqueConstraint(fields=('kind', 'reference'), name='unique_ledger_transaction'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['organization', 'currency', 'id'], name='deevents_le_organiz_ac2ff3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['account', 'id'], name='deevents_le_account_ac186c_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='organizationbalance',
+            constraint=models.UniqueConstraint(fields=('organization', 'currency'), name='unique_organization_balance'),
+        ),
+    ]
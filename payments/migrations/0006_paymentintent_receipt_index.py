@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_mpesacallback_retry_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentintent',
+            name='mpesa_receipt_number',
+            field=models.CharField(blank=True, db_index=True, max_length=50),
+        ),
+    ]
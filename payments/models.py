@@ -1,116 +1,317 @@
-# backend/apps/payments/mpesa.py
-import requests
-import base64
-from datetime import datetime
-import json
+# backend/apps/payments/models.py
+import uuid
+from django.db import models
 from django.conf import settings
-from django.utils import timezone
-
-class MpesaGateway:
-    """M-Pesa API Integration for Kenya"""
-    
-    def __init__(self):
-        self.consumer_key = settings.MPESA_CONSUMER_KEY
-        self.consumer_secret = settings.MPESA_CONSUMER_SECRET
-        self.business_shortcode = settings.MPESA_BUSINESS_SHORTCODE
-        self.passkey = settings.MPESA_PASSKEY
-        self.callback_url = settings.MPESA_CALLBACK_URL
-        
-        # Sandbox/Production URLs
-        if settings.DEBUG:
-            self.base_url = "https://sandbox.safaricom.co.ke"
-        else:
-            self.base_url = "https://api.safaricom.co.ke"
-    
-    def get_access_token(self):
-        """Get OAuth access token from Safaricom"""
-        url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
-        
-        # Base64 encode consumer key and secret
-        auth_string = f"{self.consumer_key}:{self.consumer_secret}"
-        encoded_auth = base64.b64encode(auth_string.encode()).decode()
-        
-        headers = {
-            "Authorization": f"Basic {encoded_auth}"
-        }
-        
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            return response.json()["access_token"]
-        else:
-            raise Exception(f"M-Pesa token error: {response.text}")
-    
-    def generate_password(self):
-        """Generate M-Pesa API password"""
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        data = f"{self.business_shortcode}{self.passkey}{timestamp}"
-        encoded = base64.b64encode(data.encode()).decode()
-        return encoded, timestamp
-    
-    def stk_push(self, phone_number, amount, account_reference, transaction_desc):
-        """Initiate STK Push (Customer initiates payment)"""
-        access_token = self.get_access_token()
-        password, timestamp = self.generate_password()
-        
-        url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
-        
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
-        
-        # Format phone number (strip +254 if present, add 254)
-        if phone_number.startswith('+'):
-            phone_number = phone_number[1:]
-        if phone_number.startswith('0'):
-            phone_number = '254' + phone_number[1:]
-        elif not phone_number.startswith('254'):
-            phone_number = '254' + phone_number
-        
-        payload = {
-            "BusinessShortCode": self.business_shortcode,
-            "Password": password,
-            "Timestamp": timestamp,
-            "TransactionType": "CustomerPayBillOnline",
-            "Amount": str(int(amount)),  # Whole number
-            "PartyA": phone_number,
-            "PartyB": self.business_shortcode,
-            "PhoneNumber": phone_number,
-            "CallBackURL": self.callback_url,
-            "AccountReference": account_reference[:12],  # Max 12 chars
-            "TransactionDesc": transaction_desc[:13]  # Max 13 chars
-        }
-        
-        response = requests.post(url, json=payload, headers=headers)
-        return response.json()
-    
-    def b2c_payment(self, phone_number, amount, remarks):
-        """Business to Customer payment (payouts to organizers)"""
-        access_token = self.get_access_token()
-        
-        url = f"{self.base_url}/mpesa/b2c/v1/paymentrequest"
-        
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
-        
-        # Format phone number
-        if phone_number.startswith('0'):
-            phone_number = '254' + phone_number[1:]
-        
-        payload = {
-            "InitiatorName": settings.MPESA_INITIATOR_NAME,
-            "SecurityCredential": settings.MPESA_SECURITY_CREDENTIAL,
-            "CommandID": "BusinessPayment",
-            "Amount": str(int(amount)),
-            "PartyA": self.business_shortcode,
-            "PartyB": phone_number,
-            "Remarks": remarks[:100],
-            "QueueTimeOutURL": settings.MPESA_TIMEOUT_URL,
-            "ResultURL": settings.MPESA_RESULT_URL,
-            "Occasion": "Event Payout"
-        }
-        
-        response = requests.post(url, json=payload, headers=headers)
-        return response.json()
\ No newline at end of file
+
+
+class PayoutBatch(models.Model):
+    """A group of organizer payouts dispatched together"""
+
+    class Status(models.TextChoices):
+        OPEN = 'open', 'Open'
+        RUNNING = 'running', 'Running'
+        COMPLETED = 'completed', 'Completed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.OPEN)
+
+    total_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'deevents_payout_batches'
+        verbose_name_plural = 'Payout batches'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Payout batch {self.id} ({self.status})"
+
+
+class Payout(models.Model):
+    """M-Pesa B2C payout to an organizer"""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'              # Requested, waiting for processing days
+        QUEUED = 'queued', 'Queued'                 # Assigned to a batch
+        SUBMITTING = 'submitting', 'Submitting'     # Claimed by a dispatcher, request in flight
+        SUBMITTED = 'submitted', 'Submitted'        # Accepted by Safaricom, waiting for result
+        COMPLETED = 'completed', 'Completed'
+        FAILED = 'failed', 'Failed'
+        UNCONFIRMED = 'unconfirmed', 'Unconfirmed'  # Outcome unknown, needs reconciliation
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(
+        'organizations.Organization',
+        on_delete=models.PROTECT,
+        related_name='payouts'
+    )
+    batch = models.ForeignKey(
+        PayoutBatch,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='payouts'
+    )
+
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3, default='KES')
+    country = models.CharField(max_length=2, default='KE')
+    phone_number = models.CharField(max_length=15)
+
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    # Sent to Safaricom as the B2C Occasion so results can be traced back
+    idempotency_key = models.CharField(max_length=64, unique=True, default=uuid.uuid4)
+    attempts = models.IntegerField(default=0)
+
+    # Safaricom references
+    conversation_id = models.CharField(max_length=100, blank=True, null=True, unique=True)
+    originator_conversation_id = models.CharField(max_length=100, blank=True, null=True)
+    response_data = models.JSONField(default=dict, blank=True)
+    failure_reason = models.TextField(blank=True)
+
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='requested_payouts'
+    )
+    requested_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'deevents_payouts'
+        ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['status', 'country', 'requested_at']),
+            models.Index(fields=['batch', 'status']),
+        ]
+
+    def __str__(self):
+        return f"Payout of {self.currency} {self.amount} to {self.organization_id} ({self.status})"
+
+
+class MpesaCallback(models.Model):
+    """
+    Append-only log of callbacks received from Safaricom.
+
+    The webhook only inserts here; state changes are applied later, in
+    bulk, by payments.callbacks.CallbackProcessor.
+    """
+
+    class Kind(models.TextChoices):
+        STK = 'stk', 'STK Push'
+        B2C_RESULT = 'b2c_result', 'B2C Result'
+        B2C_TIMEOUT = 'b2c_timeout', 'B2C Queue Timeout'
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    # CheckoutRequestID for STK callbacks, ConversationID for B2C
+    reference = models.CharField(max_length=100)
+    result_code = models.IntegerField(null=True, blank=True)
+    payload = models.JSONField()
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # Set while no intent/payout carries the reference yet (the callback beat our own write)
+    retry_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'deevents_mpesa_callbacks'
+        ordering = ['id']
+        constraints = [
+            # Safaricom retries callbacks; only the first copy is kept
+            models.UniqueConstraint(fields=['kind', 'reference'], name='unique_mpesa_callback'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['kind', 'id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='mpesa_callback_unprocessed',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} callback {self.reference}"
+
+
+class PaymentIntent(models.Model):
+    """
+    A customer payment started with an STK push.
+
+    initiated -> pending (Safaricom accepted the push) -> paid / failed,
+    driven by the STK callback; open intents that outlive the ticket
+    reservation window become expired.
+    """
+
+    class Status(models.TextChoices):
+        INITIATED = 'initiated', 'Initiated'    # Created, STK push not yet accepted
+        PENDING = 'pending', 'Pending'          # Waiting for the customer / STK callback
+        PAID = 'paid', 'Paid'
+        FAILED = 'failed', 'Failed'
+        EXPIRED = 'expired', 'Expired'
+
+    OPEN_STATUSES = [Status.INITIATED, Status.PENDING]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='payment_intents'
+    )
+
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3, default='KES')
+    phone_number = models.CharField(max_length=15)
+    account_reference = models.CharField(max_length=100)
+    description = models.CharField(max_length=100, blank=True)
+
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.INITIATED)
+
+    # Safaricom references
+    checkout_request_id = models.CharField(max_length=100, blank=True, null=True, unique=True)
+    merchant_request_id = models.CharField(max_length=100, blank=True)
+    # Indexed: reconciliation looks statements up by receipt, a chunk at a time
+    mpesa_receipt_number = models.CharField(max_length=50, blank=True, db_index=True)
+    result_code = models.IntegerField(null=True, blank=True)
+    failure_reason = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'deevents_payment_intents'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status']),
+            # Only open intents are indexed, so the expiry sweep scans a
+            # small range however many settled intents pile up
+            models.Index(
+                fields=['expires_at', 'id'],
+                condition=models.Q(status__in=['initiated', 'pending']),
+                name='payment_intent_open_expiry',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Payment of {self.currency} {self.amount} from {self.phone_number} ({self.status})"
+
+
+class LedgerTransaction(models.Model):
+    """
+    One balanced posting in the double-entry ledger.
+
+    Append-only: corrections are new transactions, never edits. The
+    (kind, reference) pair is unique so the same sale or payout can only
+    be posted once.
+    """
+
+    class Kind(models.TextChoices):
+        SALE = 'sale', 'Ticket sale'
+        PAYOUT = 'payout', 'Organizer payout'
+        ADJUSTMENT = 'adjustment', 'Adjustment'
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    # PaymentIntent / Payout id, or a free-form reference for adjustments
+    reference = models.CharField(max_length=100)
+    organization = models.ForeignKey(
+        'organizations.Organization',
+        on_delete=models.PROTECT,
+        related_name='ledger_transactions'
+    )
+    currency = models.CharField(max_length=3, default='KES')
+    description = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'deevents_ledger_transactions'
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'reference'], name='unique_ledger_transaction'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.reference}"
+
+
+class LedgerEntry(models.Model):
+    """
+    One leg of a LedgerTransaction.
+
+    Amounts are signed: debits are positive and credits negative, so the
+    entries of every transaction sum to zero.
+    """
+
+    class Account(models.TextChoices):
+        CUSTOMER_FUNDS = 'customer_funds', 'Customer funds (M-Pesa collections)'
+        ORGANIZER_PAYABLE = 'organizer_payable', 'Owed to organizers'
+        PLATFORM_REVENUE = 'platform_revenue', 'Platform fee revenue'
+        VAT_PAYABLE = 'vat_payable', 'VAT payable'
+        WITHHOLDING_TAX_PAYABLE = 'withholding_tax_payable', 'Withholding tax payable'
+        PAYOUT_FUNDS = 'payout_funds', 'Payout funds (M-Pesa B2C)'
+
+    id = models.BigAutoField(primary_key=True)
+    transaction = models.ForeignKey(LedgerTransaction, on_delete=models.PROTECT, related_name='entries')
+    account = models.CharField(max_length=30, choices=Account.choices)
+    # Set on ORGANIZER_PAYABLE entries, which make up the organization's balance
+    organization = models.ForeignKey(
+        'organizations.Organization',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='ledger_entries'
+    )
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    currency = models.CharField(max_length=3, default='KES')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'deevents_ledger_entries'
+        ordering = ['id']
+        verbose_name_plural = 'Ledger entries'
+        indexes = [
+            models.Index(fields=['organization', 'currency', 'id']),
+            models.Index(fields=['account', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.account} {self.amount} {self.currency}"
+
+
+class OrganizationBalance(models.Model):
+    """
+    Running balance owed to an organization, per currency.
+
+    Maintained incrementally by every ledger posting, so reading a balance
+    is a single-row lookup; payments.ledger.check_balances rebuilds it
+    from the entries to verify it.
+    """
+    organization = models.ForeignKey(
+        'organizations.Organization',
+        on_delete=models.CASCADE,
+        related_name='balances'
+    )
+    currency = models.CharField(max_length=3, default='KES')
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    entry_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'deevents_organization_balances'
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'currency'], name='unique_organization_balance'),
+        ]
+
+    def __str__(self):
+        return f"{self.organization_id}: {self.currency} {self.balance}"
@@ -0,0 +1,163 @@
+# backend/apps/payments/mpesa.py
+import base64
+import hashlib
+from datetime import datetime
+import json
+from django.conf import settings
+from django.utils import timezone
+
+from .http import get_client
+from .tokens import AccessTokenCache
+
+
+def normalize_phone(phone_number):
+    """Format a Kenyan number the way Daraja expects it (strip +254 if present, add 254)"""
+    if phone_number.startswith('+'):
+        phone_number = phone_number[1:]
+    if phone_number.startswith('0'):
+        phone_number = '254' + phone_number[1:]
+    elif not phone_number.startswith('254'):
+        phone_number = '254' + phone_number
+    return phone_number
+
+
+class MpesaGateway:
+    """M-Pesa API Integration for Kenya"""
+    
+    token_cache_class = AccessTokenCache
+    
+    def __init__(self, http_client=None, base_url=None):
+        self.http = http_client or get_client()
+        self.load_settings()
+        if base_url:
+            self.base_url = base_url.rstrip('/')
+        self.token_cache = self.token_cache_class(
+            key=self.token_cache_key(),
+            fetch_token=self.fetch_access_token,
+            refresh_margin=getattr(settings, 'MPESA_TOKEN_REFRESH_MARGIN', 300),
+        )
+    
+    def load_settings(self):
+        self.consumer_key = settings.MPESA_CONSUMER_KEY
+        self.consumer_secret = settings.MPESA_CONSUMER_SECRET
+        self.business_shortcode = settings.MPESA_BUSINESS_SHORTCODE
+        self.passkey = settings.MPESA_PASSKEY
+        self.callback_url = settings.MPESA_CALLBACK_URL
+        
+        # Sandbox/Production URLs (MPESA_BASE_URL overrides, e.g. for a local stub)
+        if getattr(settings, 'MPESA_BASE_URL', ''):
+            self.base_url = settings.MPESA_BASE_URL.rstrip('/')
+        elif settings.DEBUG:
+            self.base_url = "https://sandbox.safaricom.co.ke"
+        else:
+            self.base_url = "https://api.safaricom.co.ke"
+    
+    def token_cache_key(self):
+        # One token per credential set, shared by all workers
+        key_hash = hashlib.sha1(f"{self.base_url}:{self.consumer_key}".encode()).hexdigest()[:16]
+        return f"mpesa:token:{key_hash}"
+    
+    def get_access_token(self):
+        """Get a cached OAuth access token, refreshing it only when needed"""
+        return self.token_cache.get()
+    
+    def fetch_access_token(self):
+        """Request a new OAuth access token from Safaricom"""
+        url, headers = self.build_token_request()
+        response = self.http.get(url, 'oauth', headers=headers)
+        return self.parse_token_response(response.status_code, response)
+    
+    def build_token_request(self):
+        """URL and headers for the OAuth token request"""
+        url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
+        
+        # Base64 encode consumer key and secret
+        auth_string = f"{self.consumer_key}:{self.consumer_secret}"
+        encoded_auth = base64.b64encode(auth_string.encode()).decode()
+        
+        headers = {
+            "Authorization": f"Basic {encoded_auth}"
+        }
+        return url, headers
+    
+    def parse_token_response(self, status_code, response):
+        """Extract (access_token, expires_in) from an OAuth response"""
+        if status_code == 200:
+            data = response.json()
+            return data["access_token"], int(data.get("expires_in", 3599))
+        else:
+            raise Exception(f"M-Pesa token error: {response.text}")
+    
+    def bearer_headers(self, access_token):
+        return {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+    
+    def generate_password(self):
+        """Generate M-Pesa API password"""
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        data = f"{self.business_shortcode}{self.passkey}{timestamp}"
+        encoded = base64.b64encode(data.encode()).decode()
+        return encoded, timestamp
+    
+    def stk_push(self, phone_number, amount, account_reference, transaction_desc):
+        """Initiate STK Push (Customer initiates payment)"""
+        access_token = self.get_access_token()
+        url, payload = self.build_stk_push_request(phone_number, amount, account_reference, transaction_desc)
+        
+        response = self.http.post(url, 'stk_push', json=payload, headers=self.bearer_headers(access_token))
+        return response.json()
+    
+    def build_stk_push_request(self, phone_number, amount, account_reference, transaction_desc):
+        """URL and payload for an STK push"""
+        password, timestamp = self.generate_password()
+        
+        url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
+        
+        phone_number = normalize_phone(phone_number)
+        
+        payload = {
+            "BusinessShortCode": self.business_shortcode,
+            "Password": password,
+            "Timestamp": timestamp,
+            "TransactionType": "CustomerPayBillOnline",
+            "Amount": str(int(amount)),  # Whole number
+            "PartyA": phone_number,
+            "PartyB": self.business_shortcode,
+            "PhoneNumber": phone_number,
+            "CallBackURL": self.callback_url,
+            "AccountReference": account_reference[:12],  # Max 12 chars
+            "TransactionDesc": transaction_desc[:13]  # Max 13 chars
+        }
+        return url, payload
+    
+    def b2c_payment(self, phone_number, amount, remarks, occasion="Event Payout"):
+        """Business to Customer payment (payouts to organizers)"""
+        access_token = self.get_access_token()
+        url, payload = self.build_b2c_request(phone_number, amount, remarks, occasion)
+        
+        response = self.http.post(url, 'b2c', json=payload, headers=self.bearer_headers(access_token))
+        return response.json()
+    
+    def build_b2c_request(self, phone_number, amount, remarks, occasion="Event Payout"):
+        """URL and payload for a B2C payment"""
+        url = f"{self.base_url}/mpesa/b2c/v1/paymentrequest"
+        
+        # Format phone number
+        if phone_number.startswith('0'):
+            phone_number = '254' + phone_number[1:]
+        
+        payload = {
+            "InitiatorName": settings.MPESA_INITIATOR_NAME,
+            "SecurityCredential": settings.MPESA_SECURITY_CREDENTIAL,
+            "CommandID": "BusinessPayment",
+            "Amount": str(int(amount)),
+            "PartyA": self.business_shortcode,
+            "PartyB": phone_number,
+            "Remarks": remarks[:100],
+            "QueueTimeOutURL": settings.MPESA_TIMEOUT_URL,
+            "ResultURL": settings.MPESA_RESULT_URL,
+            "Occasion": occasion[:100]
+        }
+        return url, payload
\ No newline at end of file
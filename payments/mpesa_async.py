@@ -0,0 +1,46 @@
+# backend/apps/payments/mpesa_async.py
+from .http import get_async_client
+from .mpesa import MpesaGateway
+from .tokens import AsyncAccessTokenCache
+
+
+class AsyncMpesaGateway(MpesaGateway):
+    """
+    asyncio M-Pesa gateway for ASGI deployments.
+
+    Builds exactly the same requests as MpesaGateway and shares its token
+    cache entries; only the I/O is non-blocking, so one event loop can keep
+    hundreds of STK pushes in flight.
+    """
+
+    token_cache_class = AsyncAccessTokenCache
+
+    def __init__(self, http_client=None, base_url=None):
+        # Must be created inside a running event loop when http_client is omitted
+        super().__init__(http_client=http_client or get_async_client(), base_url=base_url)
+
+    async def get_access_token(self):
+        """Get a cached OAuth access token, refreshing it only when needed"""
+        return await self.token_cache.aget()
+
+    async def fetch_access_token(self):
+        """Request a new OAuth access token from Safaricom"""
+        url, headers = self.build_token_request()
+        response = await self.http.get(url, 'oauth', headers=headers)
+        return self.parse_token_response(response.status_code, response)
+
+    async def stk_push(self, phone_number, amount, account_reference, transaction_desc):
+        """Initiate STK Push (Customer initiates payment)"""
+        access_token = await self.get_access_token()
+        url, payload = self.build_stk_push_request(phone_number, amount, account_reference, transaction_desc)
+
+        response = await self.http.post(url, 'stk_push', json=payload, headers=self.bearer_headers(access_token))
+        return response.json()
+
+    async def b2c_payment(self, phone_number, amount, remarks, occasion="Event Payout"):
+        """Business to Customer payment (payouts to organizers)"""
+        access_token = await self.get_access_token()
+        url, payload = self.build_b2c_request(phone_number, amount, remarks, occasion)
+
+        response = await self.http.post(url, 'b2c', json=payload, headers=self.bearer_headers(access_token))
+        return response.json()
@@ -0,0 +1,219 @@
+# backend/apps/payments/payouts.py
+import logging
+import queue
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from core.models import CountryConfiguration
+from . import metrics
+from .models import Payout, PayoutBatch
+from .mpesa import MpesaGateway
+from .ratelimit import RateLimiter
+from .resilience import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Defaults for countries without a CountryConfiguration row
+DEFAULT_MIN_PAYOUT = Decimal(str(CountryConfiguration._meta.get_field('min_payout_amount').default))
+DEFAULT_PROCESSING_DAYS = CountryConfiguration._meta.get_field('payout_processing_days').default
+
+
+def business_days_before(moment, days):
+    """Step back `days` weekdays from `moment` (weekends don't count)"""
+    while days > 0:
+        moment -= timedelta(days=1)
+        if moment.weekday() < 5:
+            days -= 1
+    return moment
+
+
+def collect_eligible_payouts(now=None):
+    """
+    Move every eligible PENDING payout into a new batch.
+
+    A payout is eligible once it is at least `min_payout_amount` and has
+    waited `payout_processing_days` business days, per its country's
+    CountryConfiguration. Assignment is one set-based UPDATE per country.
+    Returns the batch, or None when nothing is eligible.
+    """
+    now = now or timezone.now()
+    rules = {
+        config.country_id: (config.min_payout_amount, config.payout_processing_days)
+        for config in CountryConfiguration.objects.all()
+    }
+
+    with transaction.atomic():
+        batch = PayoutBatch.objects.create()
+        pending = Payout.objects.filter(status=Payout.Status.PENDING, batch__isnull=True)
+
+        for country, (min_amount, days) in rules.items():
+            pending.filter(
+                country=country,
+                amount__gte=min_amount,
+                requested_at__lte=business_days_before(now, days),
+            ).update(batch=batch, status=Payout.Status.QUEUED, updated_at=now)
+
+        pending.exclude(country__in=list(rules)).filter(
+            amount__gte=DEFAULT_MIN_PAYOUT,
+            requested_at__lte=business_days_before(now, DEFAULT_PROCESSING_DAYS),
+        ).update(batch=batch, status=Payout.Status.QUEUED, updated_at=now)
+
+        totals = batch.payouts.aggregate(count=Count('id'), amount=Sum('amount'))
+        if not totals['count']:
+            batch.delete()
+            return None
+
+        batch.total_count = totals['count']
+        batch.total_amount = totals['amount']
+        batch.save(update_fields=['total_count', 'total_amount'])
+
+    return batch
+
+
+class PayoutDispatcher:
+    """
+    Sends the B2C requests for a batch concurrently.
+
+    - At most `max_in_flight` requests are outstanding at once and no more
+      than `rate_per_second` are started per second
+    - Each payout is claimed with a conditional UPDATE (QUEUED -> SUBMITTING)
+      before it is sent, so two dispatchers can never send the same payout
+    - After a crash, payouts left in SUBMITTING may or may not have reached
+      Safaricom; they become UNCONFIRMED for reconciliation instead of being
+      sent again
+    """
+
+    def __init__(self, gateway=None, max_in_flight=None, rate_per_second=None, stale_after=None):
+        self.gateway = gateway or MpesaGateway()
+        self.max_in_flight = max_in_flight or getattr(settings, 'PAYOUT_MAX_IN_FLIGHT', 20)
+        self.limiter = RateLimiter(rate_per_second or getattr(settings, 'PAYOUT_RATE_PER_SECOND', 50))
+        # A SUBMITTING payout older than this belongs to a dead dispatcher
+        self.stale_after = stale_after or timedelta(minutes=5)
+
+        self.sent = metrics.counter('payouts.sent')
+        self.failed = metrics.counter('payouts.failed')
+        self.unconfirmed = metrics.counter('payouts.unconfirmed')
+
+    def run(self, batch):
+        """Dispatch every queued payout in `batch`; safe to call again to resume"""
+        PayoutBatch.objects.filter(pk=batch.pk).exclude(status=PayoutBatch.Status.COMPLETED).update(
+            status=PayoutBatch.Status.RUNNING,
+            started_at=timezone.now(),
+        )
+        self.recover_stale(batch)
+
+        pending = queue.Queue()
+        for payout_id in batch.payouts.filter(status=Payout.Status.QUEUED).values_list('pk', flat=True):
+            pending.put(payout_id)
+
+        workers = [
+            threading.Thread(target=self._worker, args=(pending,), name=f"payout-worker-{i}")
+            for i in range(min(self.max_in_flight, pending.qsize()))
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        return self.finish(batch)
+
+    def recover_stale(self, batch):
+        """Flag payouts a crashed dispatcher left in flight"""
+        stale = batch.payouts.filter(
+            status=Payout.Status.SUBMITTING,
+            submitted_at__lt=timezone.now() - self.stale_after,
+        ).update(
+            status=Payout.Status.UNCONFIRMED,
+            failure_reason='Dispatcher stopped before the M-Pesa response was recorded',
+            updated_at=timezone.now(),
+        )
+        if stale:
+            self.unconfirmed.inc(stale)
+            logger.warning("Marked %s in-flight payouts in batch %s as unconfirmed", stale, batch.pk)
+        return stale
+
+    def finish(self, batch):
+        """Close the batch once nothing is left to send"""
+        batch.refresh_from_db()
+        outstanding = batch.payouts.filter(
+            status__in=[Payout.Status.QUEUED, Payout.Status.SUBMITTING]
+        ).exists()
+        if not outstanding and batch.status != PayoutBatch.Status.COMPLETED:
+            batch.status = PayoutBatch.Status.COMPLETED
+            batch.completed_at = timezone.now()
+            batch.save(update_fields=['status', 'completed_at'])
+        return batch
+
+    def _worker(self, pending):
+        try:
+            while True:
+                try:
+                    payout_id = pending.get_nowait()
+                except queue.Empty:
+                    return
+                self.limiter.acquire()
+                try:
+                    self.dispatch(payout_id)
+                except Exception:
+                    logger.exception("Payout %s dispatch crashed", payout_id)
+        finally:
+            connection.close()
+
+    def dispatch(self, payout_id):
+        """Claim one payout and send it; returns False if another worker owns it"""
+        claimed = Payout.objects.filter(pk=payout_id, status=Payout.Status.QUEUED).update(
+            status=Payout.Status.SUBMITTING,
+            attempts=F('attempts') + 1,
+            submitted_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        if not claimed:
+            return False
+
+        payout = Payout.objects.get(pk=payout_id)
+        try:
+            response = self.gateway.b2c_payment(
+                payout.phone_number,
+                payout.amount,
+                f"DeEvents payout {payout.organization_id}",
+                occasion=payout.idempotency_key,
+            )
+        except (requests.ConnectTimeout, UpstreamUnavailable):
+            # Never reached Safaricom; safe to send again later
+            self._update(payout, status=Payout.Status.QUEUED)
+            return True
+        except Exception as e:
+            self.unconfirmed.inc()
+            self._update(payout, status=Payout.Status.UNCONFIRMED, failure_reason=str(e))
+            return True
+
+        if str(response.get('ResponseCode')) == '0':
+            self.sent.inc()
+            self._update(
+                payout,
+                status=Payout.Status.SUBMITTED,
+                conversation_id=response.get('ConversationID'),
+                originator_conversation_id=response.get('OriginatorConversationID'),
+                response_data=response,
+            )
+        else:
+            self.failed.inc()
+            self._update(
+                payout,
+                status=Payout.Status.FAILED,
+                response_data=response,
+                failure_reason=response.get('errorMessage') or response.get('ResponseDescription', ''),
+            )
+        return True
+
+    def _update(self, payout, **fields):
+        # Only the claiming worker may move a payout out of SUBMITTING
+        fields['updated_at'] = timezone.now()
+        Payout.objects.filter(pk=payout.pk, status=Payout.Status.SUBMITTING).update(**fields)
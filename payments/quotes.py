@@ -0,0 +1,61 @@
+# backend/apps/payments/quotes.py
+from decimal import Decimal
+
+from .tax import CENT
+from .tax_rules import calculator_for
+
+ZERO = Decimal('0')
+TOTAL_FIELDS = ('ticket_price', 'service_fee', 'vat', 'subtotal', 'total')
+
+
+def platform_fees(calculator, prices):
+    """Per-ticket platform fee: a percentage of the price but at least the minimum (free tickets pay none)"""
+    rate, minimum = calculator.PLATFORM_FEE_RATE, calculator.MIN_PLATFORM_FEE
+    return [max((price * rate).quantize(CENT), minimum) if price else ZERO for price in prices]
+
+
+def quote_cart(country_code, items):
+    """
+    Price a whole cart in one call.
+
+    `items` is a sequence of (ticket_price, quantity) pairs. Fees and VAT
+    come from the compiled per-country rules (payments.tax_rules), so no
+    query runs however many lines the cart has. Each line carries the
+    per-ticket receipt breakdown from generate_receipt_details plus its
+    quantity and line total; `totals` sums every figure over the cart.
+    """
+    calculator = calculator_for(country_code)
+    prices = [price if isinstance(price, Decimal) else Decimal(str(price)) for price, _ in items]
+    quantities = [quantity for _, quantity in items]
+
+    fees = platform_fees(calculator, prices)
+    receipt = calculator.generate_receipt_details_batch(prices, fees)
+    vat = receipt['vat']
+
+    lines = []
+    totals = dict.fromkeys(TOTAL_FIELDS, ZERO)
+    for i, quantity in enumerate(quantities):
+        line = {
+            'ticket_price': receipt['ticket_price'][i],
+            'service_fee': receipt['service_fee'][i],
+            'vat': vat['amount'][i],
+            'subtotal': receipt['subtotal'][i],
+            'total': receipt['total'][i],
+        }
+        for field in TOTAL_FIELDS:
+            totals[field] += line[field] * quantity
+        line['quantity'] = quantity
+        line['line_total'] = line['total'] * quantity
+        lines.append(line)
+
+    return {
+        'country': calculator.COUNTRY,
+        'currency': receipt['currency'],
+        'vat': {
+            'name': calculator.TAX_NAME,
+            'rate': vat['rate'],
+            'on': vat['on'],
+        },
+        'items': lines,
+        'totals': totals,
+    }
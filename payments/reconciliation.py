@@ -0,0 +1,287 @@
+# backend/apps/payments/reconciliation.py
+import csv
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.utils import timezone
+
+from .intents import reservation_window
+from .models import PaymentIntent
+from .mpesa import normalize_phone
+
+# Columns of the M-Pesa org portal statement export that we use
+RECEIPT = 'Receipt No.'
+COMPLETED = 'Completion Time'
+STATUS = 'Transaction Status'
+PAID_IN = 'Paid In'
+OTHER_PARTY = 'Other Party Info'
+
+TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%d-%m-%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M')
+
+
+class Outcome:
+    MATCHED = 'matched'
+    # Paid to us, but the intent never got its STK callback; found by phone and amount
+    MATCHED_WITHOUT_RECEIPT = 'matched_without_receipt'
+    AMOUNT_MISMATCH = 'amount_mismatch'
+    PHONE_MISMATCH = 'phone_mismatch'
+    DUPLICATE = 'duplicate'
+    # On the statement but not in our records / paid in our records but not on the statement
+    MISSING_INTERNALLY = 'missing_internally'
+    MISSING_ON_STATEMENT = 'missing_on_statement'
+
+
+OUTCOMES = [
+    Outcome.MATCHED, Outcome.MATCHED_WITHOUT_RECEIPT, Outcome.AMOUNT_MISMATCH, Outcome.PHONE_MISMATCH,
+    Outcome.DUPLICATE, Outcome.MISSING_INTERNALLY, Outcome.MISSING_ON_STATEMENT,
+]
+EXCEPTION_COLUMNS = [
+    'outcome', 'receipt', 'statement_amount', 'statement_phone', 'payment_intent', 'intent_amount', 'intent_phone',
+    'note',
+]
+
+
+class StatementFormatError(ValueError):
+    """The file isn't an M-Pesa statement export"""
+
+
+def read_statement(lines):
+    """
+    Yield completed paid-in rows of a statement export as dicts.
+
+    Exports start with a few lines of account details before the table;
+    everything up to the header row is skipped. Charges, withdrawals and
+    failed transactions are dropped here.
+    """
+    reader = csv.reader(lines)
+    for header in reader:
+        if RECEIPT in header:
+            break
+    else:
+        raise StatementFormatError(f"No '{RECEIPT}' header row found")
+
+    columns = {name: header.index(name) for name in (RECEIPT, COMPLETED, STATUS, PAID_IN, OTHER_PARTY)
+               if name in header}
+    if PAID_IN not in columns:
+        raise StatementFormatError(f"No '{PAID_IN}' column")
+
+    for record in reader:
+        if len(record) < len(header):
+            continue
+        if STATUS in columns and record[columns[STATUS]].strip().lower() != 'completed':
+            continue
+        paid_in = _amount(record[columns[PAID_IN]])
+        if not paid_in:
+            continue
+        yield {
+            'receipt': record[columns[RECEIPT]].strip().upper(),
+            'completed_at': record[columns[COMPLETED]].strip() if COMPLETED in columns else '',
+            'phone': _phone(record[columns[OTHER_PARTY]]) if OTHER_PARTY in columns else '',
+            'amount': paid_in,
+        }
+
+
+def _amount(text):
+    try:
+        return Decimal(text.replace(',', '').strip() or 0)
+    except InvalidOperation:
+        return None
+
+
+def _phone(other_party):
+    """'254712345678 - JANE DOE' -> '254712345678' (masked digits are kept as '*')"""
+    number = other_party.split(' - ', 1)[0].strip()
+    return normalize_phone(number) if number else ''
+
+
+def _phones_match(statement_phone, intent_phone):
+    """Compare digit by digit, letting masked statement digits ('2547******78') match anything"""
+    if not statement_phone:
+        return True
+    return len(statement_phone) == len(intent_phone) and all(
+        s == '*' or s == i for s, i in zip(statement_phone, intent_phone)
+    )
+
+
+def _parse_time(text, preferred=None):
+    """Return (aware datetime or None, the format that matched); `preferred` is tried first"""
+    formats = TIME_FORMATS if preferred is None else (preferred, *TIME_FORMATS)
+    for time_format in formats:
+        try:
+            return timezone.make_aware(datetime.strptime(text, time_format)), time_format
+        except ValueError:
+            continue
+    return None, preferred
+
+
+def charged_amount(intent):
+    """What the STK push asked for: Daraja only takes whole shillings (see build_stk_push_request)"""
+    return Decimal(int(intent.amount))
+
+
+class Reconciliation:
+    """
+    Chunked hash join of statement rows against payment intents.
+
+    Statement rows are probed in chunks of `chunk_size`. For each chunk
+    the intents with those receipt numbers are fetched with one query and
+    put in a dict (the build side), so memory holds one chunk at a time.
+    Rows whose receipt we don't know (payments whose STK callback never
+    arrived) are set aside until the statement period is known, then
+    matched one amount at a time against the receipt-less intents created
+    in that period, comparing phones within the amount. Only the set of
+    receipts already seen (to spot duplicates) and the set-aside rows grow
+    with the statement; intent history outside the period is never read.
+
+    Every row that isn't a clean match is passed to `on_exception`.
+    """
+
+    def __init__(self, chunk_size=5000, on_exception=None):
+        self.chunk_size = chunk_size
+        self.on_exception = on_exception or (lambda item: None)
+        self.counts = Counter()
+        self.seen = set()
+        self.first_at = self.last_at = None
+        self.rows = 0
+        self.amount = Decimal('0')
+        self._unreceipted = []
+        # One export uses one format throughout; remembered per reconciliation, so runs don't share it
+        self._time_format = None
+
+    def run(self, rows, start=None, end=None):
+        """Reconcile `rows` against intents paid in [start, end), by default the statement's own period"""
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self._probe(chunk)
+
+        if start is None and self.first_at:
+            start = self.first_at
+        if end is None and self.last_at:
+            # Completion times have whole seconds; make the last one inclusive
+            end = self.last_at + timedelta(seconds=1)
+        self._match_without_receipt(start, end)
+        if start and end:
+            self._find_missing_on_statement(start, end)
+        return self.report(start, end)
+
+    def report(self, start=None, end=None):
+        return {
+            'rows': self.rows,
+            'amount': self.amount,
+            'start': start,
+            'end': end,
+            'counts': {outcome: self.counts[outcome] for outcome in OUTCOMES},
+        }
+
+    def _exception(self, outcome, row=None, intent=None, note=''):
+        self.counts[outcome] += 1
+        self.on_exception({
+            'outcome': outcome,
+            'receipt': row['receipt'] if row else intent.mpesa_receipt_number,
+            'statement_amount': row['amount'] if row else '',
+            'statement_phone': row['phone'] if row else '',
+            'payment_intent': str(intent.pk) if intent else '',
+            'intent_amount': intent.amount if intent else '',
+            'intent_phone': intent.phone_number if intent else '',
+            'note': note,
+        })
+
+    def _probe(self, chunk):
+        receipts = [row['receipt'] for row in chunk]
+        by_receipt = defaultdict(list)
+        for intent in (
+            PaymentIntent.objects
+            .filter(mpesa_receipt_number__in=receipts)
+            .only('id', 'amount', 'phone_number', 'mpesa_receipt_number')
+        ):
+            by_receipt[intent.mpesa_receipt_number].append(intent)
+
+        for row in chunk:
+            self._track_period(row)
+            self.rows += 1
+            self.amount += row['amount']
+
+            if row['receipt'] in self.seen:
+                self._exception(Outcome.DUPLICATE, row, note='Receipt appears more than once on the statement')
+                continue
+            self.seen.add(row['receipt'])
+
+            intents = by_receipt.get(row['receipt'])
+            if not intents:
+                self._unreceipted.append(row)
+                continue
+            if len(intents) > 1:
+                self._exception(Outcome.DUPLICATE, row, intents[0], note=f"{len(intents)} intents share this receipt")
+                continue
+
+            intent = intents[0]
+            if charged_amount(intent) != row['amount']:
+                self._exception(Outcome.AMOUNT_MISMATCH, row, intent)
+            elif not _phones_match(row['phone'], normalize_phone(intent.phone_number)):
+                self._exception(Outcome.PHONE_MISMATCH, row, intent)
+            else:
+                self.counts[Outcome.MATCHED] += 1
+
+    def _match_without_receipt(self, start, end):
+        """Match the set-aside rows against receipt-less intents created during [start - reservation, end)"""
+        by_amount = defaultdict(list)
+        for row in self._unreceipted:
+            by_amount[row['amount']].append(row)
+        self._unreceipted = []
+
+        candidates = PaymentIntent.objects.filter(mpesa_receipt_number='').exclude(
+            status=PaymentIntent.Status.INITIATED
+        )
+        if start:
+            # The customer pays within the reservation window after the intent is created
+            candidates = candidates.filter(created_at__gte=start - reservation_window())
+        if end:
+            candidates = candidates.filter(created_at__lt=end)
+
+        for amount, rows in by_amount.items():
+            # Statement phones can be masked, so they're compared within the amount's bucket
+            bucket = [
+                (normalize_phone(intent.phone_number), intent)
+                for intent in candidates
+                .filter(amount__gte=amount, amount__lt=amount + 1)
+                .only('id', 'amount', 'phone_number', 'mpesa_receipt_number')
+                .order_by('created_at')
+                if charged_amount(intent) == amount
+            ]
+            for row in rows:
+                for index, (phone, intent) in enumerate(bucket):
+                    if _phones_match(row['phone'], phone):
+                        del bucket[index]
+                        self._exception(
+                            Outcome.MATCHED_WITHOUT_RECEIPT, row, intent, note='STK callback never recorded'
+                        )
+                        break
+                else:
+                    self._exception(Outcome.MISSING_INTERNALLY, row)
+
+    def _track_period(self, row):
+        completed_at, self._time_format = _parse_time(row['completed_at'], self._time_format)
+        if completed_at is None:
+            return
+        if self.first_at is None or completed_at < self.first_at:
+            self.first_at = completed_at
+        if self.last_at is None or completed_at > self.last_at:
+            self.last_at = completed_at
+
+    def _find_missing_on_statement(self, start, end):
+        """Intents paid during the statement period whose receipt the statement never showed"""
+        paid = (
+            PaymentIntent.objects
+            .filter(status=PaymentIntent.Status.PAID, paid_at__gte=start, paid_at__lt=end)
+            .only('id', 'amount', 'phone_number', 'mpesa_receipt_number')
+            .order_by()
+            .iterator(chunk_size=self.chunk_size)
+        )
+        for intent in paid:
+            if intent.mpesa_receipt_number not in self.seen:
+                self._exception(Outcome.MISSING_ON_STATEMENT, intent=intent)
@@ -0,0 +1,171 @@
+# backend/apps/payments/resilience.py
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+
+
+class UpstreamUnavailable(Exception):
+    """The call was refused locally, before anything was sent upstream"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """The endpoint has been failing; calls are refused until it cools down"""
+
+
+class BulkheadFull(UpstreamUnavailable):
+    """Too many outbound calls are already in flight"""
+
+
+class CircuitBreaker:
+    """
+    Per-process circuit breaker for one upstream endpoint.
+
+    - closed: calls go through; `failure_threshold` consecutive failures
+      (errors, 429/5xx responses, or calls slower than `slow_call_seconds`)
+      open the circuit
+    - open: calls fail immediately with CircuitOpen for `reset_timeout`
+      seconds, so workers aren't tied up waiting on a struggling upstream
+    - half_open: a single trial call is let through; success closes the
+      circuit, failure opens it again
+
+    The state is published as the `<name>.circuit_state` gauge
+    (0 closed, 1 half open, 2 open).
+    """
+
+    CLOSED = 'closed'
+    HALF_OPEN = 'half_open'
+    OPEN = 'open'
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None, slow_call_seconds=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or getattr(settings, 'MPESA_CIRCUIT_FAILURE_THRESHOLD', 5)
+        self.reset_timeout = reset_timeout or getattr(settings, 'MPESA_CIRCUIT_RESET_TIMEOUT', 30)
+        self.slow_call_seconds = slow_call_seconds or getattr(settings, 'MPESA_CIRCUIT_SLOW_CALL_SECONDS', 10)
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+        self.state_gauge = metrics.gauge(f"{name}.circuit_state")
+        self.opened = metrics.counter(f"{name}.circuit_opened")
+        self.rejected = metrics.counter(f"{name}.circuit_rejected")
+        self.state_gauge.set(0)
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow(self):
+        """Admit one call or raise CircuitOpen"""
+        with self._lock:
+            if self._state == self.OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected.inc()
+                    raise CircuitOpen(f"{self.name} circuit is open", retry_after=remaining)
+                self._set_state(self.HALF_OPEN)
+            if self._state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    self.rejected.inc()
+                    raise CircuitOpen(f"{self.name} circuit is half open", retry_after=1)
+                self._trial_in_flight = True
+
+    def record(self, ok, elapsed):
+        """Report the outcome of an admitted call that took `elapsed` seconds"""
+        ok = ok and elapsed < self.slow_call_seconds
+        with self._lock:
+            self._trial_in_flight = False
+            if ok:
+                self._failures = 0
+                if self._state != self.CLOSED:
+                    self._set_state(self.CLOSED)
+                return
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+                self.opened.inc()
+
+    def reset(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            self._set_state(self.CLOSED)
+
+    def _set_state(self, state):
+        self._state = state
+        self.state_gauge.set(self.STATE_VALUES[state])
+
+
+class Bulkhead:
+    """
+    Cap on concurrent calls, shared by every thread (and event loop task)
+    of the process.
+
+    A call over the cap fails immediately with BulkheadFull instead of
+    queueing, so a slow upstream can hold at most `max_concurrent` workers.
+    """
+
+    def __init__(self, name, max_concurrent):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+        self.in_flight = metrics.gauge(f"{name}.in_flight")
+        self.rejected = metrics.counter(f"{name}.rejected")
+
+    def acquire(self):
+        with self._lock:
+            if self._in_flight >= self.max_concurrent:
+                self.rejected.inc()
+                raise BulkheadFull(f"{self.max_concurrent} {self.name} calls already in flight", retry_after=1)
+            self._in_flight += 1
+        self.in_flight.inc()
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self.in_flight.dec()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(name):
+    """Return the process-wide breaker for the upstream endpoint `name`"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def reset():
+    """Drop every breaker; new ones pick up the current settings (used by tests)"""
+    with _breakers_lock:
+        for breaker in _breakers.values():
+            breaker.reset()
+        _breakers.clear()
@@ -0,0 +1,225 @@
+# backend/apps/payments/routing.py
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from urllib3.exceptions import NewConnectionError
+
+from . import metrics
+from .mpesa import MpesaGateway
+from .resilience import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderError(Exception):
+    """The provider answered that it couldn't handle the request (outage, 5xx error code)"""
+
+
+class PaymentUnconfirmed(Exception):
+    """
+    The call failed after the request may have reached the provider (read
+    timeout, dropped connection, unexpected error). It isn't retried
+    elsewhere, since that could charge or pay twice; the outcome has to be
+    confirmed from the provider's callback or status query.
+    """
+
+    def __init__(self, message, provider):
+        super().__init__(message)
+        self.provider = provider
+
+
+class NoProviderAvailable(Exception):
+    """No provider for the country and methods could take the request"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
+class PaymentProvider:
+    """
+    Common interface for payment gateways.
+
+    `collect` charges a customer and `disburse` pays money out. Both
+    return the provider's response as a dict, and raise only when the
+    provider itself failed; a declined payment is a normal response.
+    ProviderError, UpstreamUnavailable and connect errors mean nothing was
+    sent; any other exception leaves the outcome unknown.
+    """
+
+    name = None
+    # One of mpesa, airtel_money, card, bank_transfer (the Country.supports_<method> flags)
+    method = None
+
+    def collect(self, phone_number, amount, reference, description):
+        raise NotImplementedError
+
+    def disburse(self, phone_number, amount, remarks, reference):
+        raise NotImplementedError
+
+
+class MpesaProvider(PaymentProvider):
+    """M-Pesa Daraja: STK push to collect, B2C to disburse"""
+
+    name = 'mpesa'
+    method = 'mpesa'
+
+    def __init__(self, gateway=None):
+        self.gateway = gateway or MpesaGateway()
+
+    def collect(self, phone_number, amount, reference, description):
+        return self._check(self.gateway.stk_push(phone_number, amount, reference, description))
+
+    def disburse(self, phone_number, amount, remarks, reference):
+        return self._check(self.gateway.b2c_payment(phone_number, amount, remarks, occasion=reference))
+
+    def _check(self, response):
+        # Daraja reports its own faults as 500.* error codes with a 200/500 body
+        if str(response.get('errorCode', '')).startswith('500.'):
+            raise ProviderError(response.get('errorMessage') or response['errorCode'])
+        return response
+
+
+class ProviderStats:
+    """
+    Exponentially weighted success rate and latency of one provider.
+
+    Each call moves the averages `alpha` of the way towards its outcome,
+    so a provider that starts failing drops below the healthy threshold
+    within a few calls, and recovers as quickly.
+    """
+
+    def __init__(self, name, alpha):
+        self.alpha = alpha
+        self.success_rate = 1.0
+        self.latency_ms = None  # Unknown until the first call
+        self.last_call = 0.0
+        self._lock = threading.Lock()
+
+        self.success_gauge = metrics.gauge(f"payments.router.{name}.success_rate")
+        self.latency_gauge = metrics.gauge(f"payments.router.{name}.latency_ms")
+        self.success_gauge.set(1.0)
+
+    def record(self, ok, latency_ms):
+        with self._lock:
+            self.success_rate += self.alpha * ((1.0 if ok else 0.0) - self.success_rate)
+            if ok:
+                # Failures are often fast (refused connections, open circuits); keep them out of latency
+                if self.latency_ms is None:
+                    self.latency_ms = latency_ms
+                else:
+                    self.latency_ms += self.alpha * (latency_ms - self.latency_ms)
+            self.last_call = time.monotonic()
+        self.success_gauge.set(round(self.success_rate, 3))
+        if self.latency_ms is not None:
+            self.latency_gauge.set(round(self.latency_ms, 1))
+
+
+class PaymentRouter:
+    """
+    Pick a provider per call from the country's payment flags and live stats.
+
+    - Only providers whose method the country supports (and the caller
+      accepts) are candidates
+    - Healthy providers (success rate at least `min_success_rate`) go
+      first, fastest moving-average latency first; providers not called
+      yet count as fastest so the router learns their latency
+    - Degraded providers go last, except that one whose last call is
+      older than `probe_interval` seconds is tried among the healthy ones
+      so it can recover
+    - If a provider fails before the request could have reached it, the
+      call fails over to the next candidate; NoProviderAvailable is raised
+      once all of them have failed
+    - Any other failure stops at that provider with PaymentUnconfirmed
+    """
+
+    def __init__(self, providers, min_success_rate=None, probe_interval=None, alpha=0.2):
+        self.providers = list(providers)
+        self.min_success_rate = min_success_rate or getattr(settings, 'PAYMENT_ROUTER_MIN_SUCCESS_RATE', 0.8)
+        self.probe_interval = probe_interval or getattr(settings, 'PAYMENT_ROUTER_PROBE_INTERVAL', 30)
+        self.stats = {provider.name: ProviderStats(provider.name, alpha) for provider in self.providers}
+        self.failovers = metrics.counter('payments.router.failovers')
+
+    def candidates(self, country, methods=None):
+        """Providers for `country` (a Country or its code), best first"""
+        if isinstance(country, str):
+            from core.models import Country
+            country = Country.objects.get(code=country.upper())
+        supported = [
+            provider for provider in self.providers
+            if getattr(country, f"supports_{provider.method}", False)
+            and (methods is None or provider.method in methods)
+        ]
+        return sorted(supported, key=self._rank)
+
+    def _rank(self, provider):
+        stats = self.stats[provider.name]
+        healthy = (
+            stats.success_rate >= self.min_success_rate
+            or time.monotonic() - stats.last_call >= self.probe_interval
+        )
+        return (not healthy, (stats.latency_ms or 0.0) if healthy else -stats.success_rate)
+
+    def collect(self, country, phone_number, amount, reference, description, methods=None):
+        """Charge a customer; returns (provider name, response)"""
+        return self._call(country, methods, 'collect', phone_number, amount, reference, description)
+
+    def disburse(self, country, phone_number, amount, remarks, reference, methods=None):
+        """Pay money out; returns (provider name, response)"""
+        return self._call(country, methods, 'disburse', phone_number, amount, remarks, reference)
+
+    def _call(self, country, methods, operation, *args):
+        candidates = self.candidates(country, methods)
+        if not candidates:
+            raise NoProviderAvailable(f"No payment provider for {getattr(country, 'code', country)}")
+
+        errors = {}
+        for position, provider in enumerate(candidates, 1):
+            stats = self.stats[provider.name]
+            started = time.perf_counter()
+            try:
+                response = getattr(provider, operation)(*args)
+            except Exception as e:
+                stats.record(False, (time.perf_counter() - started) * 1000)
+                if not _never_sent(e):
+                    logger.warning("Payment provider %s %s unconfirmed: %s", provider.name, operation, e)
+                    raise PaymentUnconfirmed(str(e), provider.name) from e
+                errors[provider.name] = str(e)
+                logger.warning("Payment provider %s failed %s: %s", provider.name, operation, e)
+                if position < len(candidates):
+                    self.failovers.inc()
+                continue
+            stats.record(True, (time.perf_counter() - started) * 1000)
+            return provider.name, response
+
+        raise NoProviderAvailable(f"Every payment provider failed: {errors}", errors)
+
+
+def _never_sent(error):
+    """Whether `error` proves the request never reached the provider"""
+    if isinstance(error, (ProviderError, UpstreamUnavailable, requests.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.ConnectionError):
+        # Refused or unresolvable, as opposed to dropped mid-request
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Return the process-wide router over the PAYMENT_PROVIDERS classes"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                paths = getattr(settings, 'PAYMENT_PROVIDERS', ['payments.routing.MpesaProvider'])
+                _router = PaymentRouter([import_string(path)() for path in paths])
+    return _router
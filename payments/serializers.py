@@ -0,0 +1,54 @@
+# backend/apps/payments/serializers.py
+from django.conf import settings
+from rest_framework import serializers
+
+
+class StkPushSerializer(serializers.Serializer):
+    """Input for initiating an M-Pesa STK push"""
+    phone_number = serializers.CharField(max_length=15)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=1)
+    account_reference = serializers.CharField(max_length=100)
+    transaction_desc = serializers.CharField(max_length=100, required=False, default='Payment')
+
+
+class B2CPaymentSerializer(serializers.Serializer):
+    """Input for an M-Pesa B2C payout"""
+    phone_number = serializers.CharField(max_length=15)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=1)
+    remarks = serializers.CharField(max_length=100, required=False, default='Event payout')
+
+
+class QuoteItemSerializer(serializers.Serializer):
+    """One cart line: a ticket price and how many"""
+    ticket_price = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=0)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CheckoutQuoteSerializer(serializers.Serializer):
+    """Input for pricing a cart"""
+    country = serializers.CharField(max_length=2, default=settings.DEEVENTS['DEFAULT_COUNTRY'])
+    items = QuoteItemSerializer(many=True, allow_empty=False, max_length=500)
+
+
+def _money():
+    return serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class QuoteLineSerializer(serializers.Serializer):
+    """Per-ticket receipt breakdown for one cart line"""
+    ticket_price = _money()
+    service_fee = _money()
+    vat = _money()
+    subtotal = _money()
+    total = _money()
+    quantity = serializers.IntegerField()
+    line_total = _money()
+
+
+class QuoteSerializer(serializers.Serializer):
+    """Output of payments.quotes.quote_cart (amounts as strings)"""
+    country = serializers.CharField()
+    currency = serializers.CharField()
+    vat = serializers.DictField(child=serializers.CharField())
+    items = QuoteLineSerializer(many=True)
+    totals = serializers.DictField(child=_money())
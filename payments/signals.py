@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Country, CountryConfiguration
+from .tax_rules import tax_rules
+
+
+@receiver([post_save, post_delete], sender=Country)
+@receiver([post_save, post_delete], sender=CountryConfiguration)
+def invalidate_tax_rules(sender, **kwargs):
+    """Recompile the tax rule table once the change is committed"""
+    transaction.on_commit(tax_rules.invalidate)
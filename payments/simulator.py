@@ -0,0 +1,226 @@
+# backend/apps/payments/simulator.py
+import asyncio
+import logging
+import random
+import secrets
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+class DarajaSimulator:
+    """
+    Local stand-in for Safaricom's Daraja API.
+
+    Serves the OAuth, STK push and B2C endpoints MpesaGateway calls and
+    later POSTs the matching callback to the CallBackURL/ResultURL from the
+    request, so the whole payment path can run without network access.
+
+    - `latency` (+ up to `jitter`) seconds are added to every response
+    - `error_rate` of requests fail with a 503 "System is busy"
+    - callbacks follow after `callback_delay` seconds; `callback_failure_rate`
+      of them report a failed payment (cancelled STK / declined B2C)
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, callback_delay=1.0,
+                 callback_failure_rate=0.0, token_ttl=3599, send_callbacks=True, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.callback_delay = callback_delay
+        self.callback_failure_rate = callback_failure_rate
+        self.token_ttl = token_ttl
+        self.send_callbacks = send_callbacks
+        self.random = random.Random(seed)
+
+        self.tokens = {}
+        self.stats = Counter()
+        self._tasks = set()
+        self._session = None
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self.url = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/oauth/v1/generate', self.oauth)
+        self.app.router.add_post('/mpesa/stkpush/v1/processrequest', self.stk_push)
+        self.app.router.add_post('/mpesa/b2c/v1/paymentrequest', self.b2c_payment)
+        self.app.on_cleanup.append(self._close_session)
+
+    # Behaviour helpers
+
+    async def _simulate_latency(self):
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def _injected_error(self, endpoint):
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats[f"{endpoint}.errors"] += 1
+            return web.json_response(
+                {'requestId': secrets.token_hex(8), 'errorCode': '500.003.02', 'errorMessage': 'System is busy'},
+                status=503,
+            )
+        return None
+
+    def _authorized(self, request):
+        token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        return self.tokens.get(token, 0) > time.time()
+
+    def _unauthorized(self):
+        return web.json_response(
+            {'requestId': secrets.token_hex(8), 'errorCode': '404.001.03', 'errorMessage': 'Invalid Access Token'},
+            status=401,
+        )
+
+    def _schedule_callback(self, url, body):
+        if not self.send_callbacks or not url:
+            return
+        task = asyncio.create_task(self._deliver(url, body))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, url, body):
+        await asyncio.sleep(self.callback_delay)
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        try:
+            async with self._session.post(url, json=body) as response:
+                await response.read()
+            self.stats['callbacks.sent'] += 1
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats['callbacks.failed'] += 1
+            logger.debug("Simulated callback to %s failed: %s", url, e)
+
+    async def _close_session(self, app):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._session is not None:
+            await self._session.close()
+
+    # Endpoints
+
+    async def oauth(self, request):
+        self.stats['oauth.requests'] += 1
+        await self._simulate_latency()
+        error = self._injected_error('oauth')
+        if error:
+            return error
+        if not request.headers.get('Authorization', '').startswith('Basic '):
+            return web.json_response({'errorCode': '400.008.01', 'errorMessage': 'Invalid Authentication passed'}, status=400)
+
+        token = secrets.token_urlsafe(24)
+        self.tokens[token] = time.time() + self.token_ttl
+        return web.json_response({'access_token': token, 'expires_in': str(self.token_ttl)})
+
+    async def stk_push(self, request):
+        self.stats['stk_push.requests'] += 1
+        await self._simulate_latency()
+        error = self._injected_error('stk_push')
+        if error:
+            return error
+        if not self._authorized(request):
+            return self._unauthorized()
+
+        payload = await request.json()
+        merchant_id = f"{self.random.randint(10000, 99999)}-{self.random.randint(10 ** 7, 10 ** 8 - 1)}-1"
+        checkout_id = f"ws_CO_{datetime.now():%d%m%Y%H%M%S}{secrets.token_hex(6)}"
+
+        if self.random.random() < self.callback_failure_rate:
+            result = {'ResultCode': 1032, 'ResultDesc': 'Request cancelled by user'}
+        else:
+            result = {
+                'ResultCode': 0,
+                'ResultDesc': 'The service request is processed successfully.',
+                'CallbackMetadata': {'Item': [
+                    {'Name': 'Amount', 'Value': int(payload.get('Amount', 0))},
+                    {'Name': 'MpesaReceiptNumber', 'Value': secrets.token_hex(5).upper()},
+                    {'Name': 'TransactionDate', 'Value': int(f"{datetime.now():%Y%m%d%H%M%S}")},
+                    {'Name': 'PhoneNumber', 'Value': int(payload.get('PhoneNumber') or 0)},
+                ]},
+            }
+        self._schedule_callback(payload.get('CallBackURL'), {'Body': {'stkCallback': {
+            'MerchantRequestID': merchant_id,
+            'CheckoutRequestID': checkout_id,
+            **result,
+        }}})
+
+        return web.json_response({
+            'MerchantRequestID': merchant_id,
+            'CheckoutRequestID': checkout_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        })
+
+    async def b2c_payment(self, request):
+        self.stats['b2c.requests'] += 1
+        await self._simulate_latency()
+        error = self._injected_error('b2c')
+        if error:
+            return error
+        if not self._authorized(request):
+            return self._unauthorized()
+
+        payload = await request.json()
+        conversation_id = f"AG_{datetime.now():%Y%m%d}_{secrets.token_hex(10)}"
+        originator_id = f"{self.random.randint(10000, 99999)}-{self.random.randint(10 ** 6, 10 ** 7 - 1)}-1"
+
+        if self.random.random() < self.callback_failure_rate:
+            result = {'ResultCode': 2001, 'ResultDesc': 'The initiator information is invalid.'}
+        else:
+            result = {'ResultCode': 0, 'ResultDesc': 'The service request is processed successfully.'}
+        self._schedule_callback(payload.get('ResultURL'), {'Result': {
+            'ResultType': 0,
+            'OriginatorConversationID': originator_id,
+            'ConversationID': conversation_id,
+            'TransactionID': secrets.token_hex(5).upper(),
+            'ReferenceData': {'ReferenceItem': {'Key': 'Occasion', 'Value': payload.get('Occasion', '')}},
+            **result,
+        }})
+
+        return web.json_response({
+            'ConversationID': conversation_id,
+            'OriginatorConversationID': originator_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Accept the service request successfully.',
+        })
+
+    # Running in the background (tests, load tests, benchmarks)
+
+    def start(self, host='127.0.0.1', port=0):
+        """Serve on a background thread; returns the base URL"""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.app, access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, host, port, backlog=1024)
+            self._loop.run_until_complete(site.start())
+            bound_host, bound_port = self._runner.addresses[0][:2]
+            self.url = f"http://{bound_host}:{bound_port}"
+            started.set()
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='daraja-simulator', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
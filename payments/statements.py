@@ -0,0 +1,256 @@
+# backend/apps/payments/statements.py
+import csv
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageFont
+
+from .models import LedgerEntry, LedgerTransaction
+
+Account = LedgerEntry.Account
+ZERO = Decimal('0')
+
+# Money columns, in the order they appear in exports and statements
+AMOUNT_COLUMNS = ['gross', 'ticket_sales', 'service_fees', 'vat', 'withholding_tax', 'payouts', 'net']
+COLUMNS = ['date', 'organization', 'kind', 'reference', 'description', 'currency'] + AMOUNT_COLUMNS
+
+# Which column each ledger account feeds, with the sign that makes it positive
+ACCOUNT_COLUMNS = {
+    Account.CUSTOMER_FUNDS: ('gross', 1),
+    Account.ORGANIZER_PAYABLE: ('ticket_sales', -1),
+    Account.PLATFORM_REVENUE: ('service_fees', -1),
+    Account.VAT_PAYABLE: ('vat', -1),
+    Account.WITHHOLDING_TAX_PAYABLE: ('withholding_tax', -1),
+    Account.PAYOUT_FUNDS: ('payouts', -1),
+}
+
+
+def month_range(month):
+    """[start, end) of a 'YYYY-MM' month in the current time zone"""
+    start = timezone.make_aware(datetime.strptime(month, '%Y-%m'))
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+def statement_rows(start, end, organization=None, chunk_size=2000):
+    """
+    Yield one row per ledger transaction in [start, end).
+
+    Transactions and their entries are read as two iterator() streams,
+    `chunk_size` rows at a time, both in transaction order, and merged as
+    they go: each transaction's legs are folded into its row and dropped.
+    The entry stream carries only (transaction, account, amount), so the
+    per-transaction columns are fetched and converted once, not per leg.
+    """
+    transactions = LedgerTransaction.objects.filter(created_at__gte=start, created_at__lt=end)
+    entries = LedgerEntry.objects.filter(transaction__created_at__gte=start, transaction__created_at__lt=end)
+    if organization is not None:
+        transactions = transactions.filter(organization=organization)
+        entries = entries.filter(transaction__organization=organization)
+    transactions = transactions.order_by('id').values_list(
+        'id', 'created_at', 'organization_id', 'kind', 'reference', 'description', 'currency',
+    ).iterator(chunk_size=chunk_size)
+    legs_by_transaction = groupby(
+        entries.order_by('transaction_id', 'id').values_list(
+            'transaction_id', 'account', 'amount',
+        ).iterator(chunk_size=chunk_size),
+        key=itemgetter(0),
+    )
+
+    tz = timezone.get_current_timezone()
+    legs_id, legs = next(legs_by_transaction, (None, ()))
+    for transaction_id, created_at, organization_id, kind, reference, description, currency in transactions:
+        row = dict.fromkeys(AMOUNT_COLUMNS, ZERO)
+        # Skip legs whose transaction the other stream never saw (posted between the two reads)
+        while legs_id is not None and legs_id < transaction_id:
+            legs_id, legs = next(legs_by_transaction, (None, ()))
+        if legs_id == transaction_id:
+            for _, account, amount in legs:
+                column, sign = ACCOUNT_COLUMNS[account]
+                row[column] += sign * amount
+                if account == Account.ORGANIZER_PAYABLE:
+                    row['net'] -= amount
+            legs_id, legs = next(legs_by_transaction, (None, ()))
+        if kind == LedgerTransaction.Kind.PAYOUT:
+            # A payout debits the organizer; show it as a payout, not negative sales
+            row['ticket_sales'] = ZERO
+        row.update(
+            date=created_at.astimezone(tz).date().isoformat(),
+            organization=organization_id,
+            kind=kind,
+            reference=reference,
+            description=description,
+            currency=currency,
+        )
+        yield row
+
+
+def with_totals(rows):
+    """Pass rows through, then yield one totals row per currency"""
+    totals = defaultdict(lambda: dict.fromkeys(AMOUNT_COLUMNS, ZERO))
+    for row in rows:
+        currency_totals = totals[row['currency']]
+        for column in AMOUNT_COLUMNS:
+            currency_totals[column] += row[column]
+        yield row
+    for currency, currency_totals in sorted(totals.items()):
+        yield {'date': 'TOTAL', 'currency': currency, **currency_totals}
+
+
+class _Echo:
+    """File-like object whose write() just returns the line"""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(rows, columns=COLUMNS, chunk_bytes=64 * 1024):
+    """
+    Encode rows as CSV text, yielding ~`chunk_bytes` at a time.
+
+    Meant for StreamingHttpResponse: the response is written while rows
+    are still being read, and buffering a few hundred lines per chunk
+    keeps the per-write overhead down.
+    """
+    writer = csv.writer(_Echo())
+    buffer, size = [writer.writerow(columns)], 0
+    for row in rows:
+        line = writer.writerow([row.get(column, '') for column in columns])
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def write_csv(rows, path, columns=COLUMNS):
+    """Stream rows into a CSV file; returns the number of rows written"""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for chunk in csv_chunks(counted(), columns):
+            f.write(chunk)
+    return count
+
+
+def daily_summary(rows):
+    """Fold transaction rows into one line per day, kind and currency"""
+    days = {}
+    for row in rows:
+        key = (row['date'], row['kind'], row['currency'])
+        line = days.get(key)
+        if line is None:
+            line = days[key] = {'date': key[0], 'kind': key[1], 'currency': key[2], 'count': 0,
+                                **dict.fromkeys(AMOUNT_COLUMNS, ZERO)}
+        line['count'] += 1
+        for column in AMOUNT_COLUMNS:
+            line[column] += row[column]
+    return [days[key] for key in sorted(days)]
+
+
+# PDF statements: landscape A4 rendered at 144 dpi
+PDF_DPI = 144
+PAGE_SIZE = (1684, 1190)
+MARGIN = 80
+LINE_HEIGHT = 30
+PDF_COLUMNS = [
+    ('Date', 'date', 0), ('Type', 'kind', 170), ('Count', 'count', 330), ('Gross', 'gross', 480),
+    ('Ticket sales', 'ticket_sales', 640), ('Service fees', 'service_fees', 800), ('VAT', 'vat', 960),
+    ('Withholding', 'withholding_tax', 1120), ('Payouts', 'payouts', 1280), ('Net', 'net', 1440),
+]
+
+
+def _render_pages(title, subtitle, lines):
+    font = ImageFont.load_default(size=20)
+    bold = ImageFont.load_default(size=30)
+    rows_per_page = (PAGE_SIZE[1] - 2 * MARGIN - 140) // LINE_HEIGHT
+
+    pages = []
+    chunks = [lines[i:i + rows_per_page] for i in range(0, len(lines), rows_per_page)] or [[]]
+    for number, chunk in enumerate(chunks, 1):
+        page = Image.new('RGB', PAGE_SIZE, 'white')
+        draw = ImageDraw.Draw(page)
+        draw.text((MARGIN, MARGIN), title, font=bold, fill='black')
+        draw.text((MARGIN, MARGIN + 45), f"{subtitle}  (page {number} of {len(chunks)})", font=font, fill='black')
+
+        y = MARGIN + 110
+        for heading, _, x in PDF_COLUMNS:
+            draw.text((MARGIN + x, y), heading, font=font, fill='black')
+        draw.line((MARGIN, y + LINE_HEIGHT - 4, PAGE_SIZE[0] - MARGIN, y + LINE_HEIGHT - 4), fill='black')
+        for line in chunk:
+            y += LINE_HEIGHT
+            for _, key, x in PDF_COLUMNS:
+                draw.text((MARGIN + x, y), str(line.get(key, '')), font=font, fill='black')
+        pages.append(page)
+    return pages
+
+
+def render_statement_pdf(organization_id, month, path):
+    """
+    Render one organization's monthly statement to `path`.
+
+    Rows are summarized per day and kind while they stream, so the PDF
+    stays a few pages however many sales the month had.
+    """
+    from organizations.models import Organization
+
+    organization = Organization.objects.only('name').get(pk=organization_id)
+    start, end = month_range(month)
+    lines = list(with_totals(daily_summary(statement_rows(start, end, organization=organization_id))))
+
+    pages = _render_pages(f"{organization.name} statement", f"{start:%B %Y}", lines)
+    pages[0].save(path, 'PDF', save_all=True, append_images=pages[1:], resolution=PDF_DPI)
+    return path
+
+
+def _init_worker():
+    django.setup()
+
+
+def render_statements(month, directory, organization_ids=None, processes=None):
+    """
+    Render the `month` statement of every organization with ledger activity,
+    one PDF each, across a process pool (rendering is CPU-bound).
+
+    Returns the paths written.
+    """
+    start, end = month_range(month)
+    if organization_ids is None:
+        organization_ids = (
+            LedgerTransaction.objects
+            .filter(created_at__gte=start, created_at__lt=end)
+            .order_by('organization_id')
+            .values_list('organization_id', flat=True)
+            .distinct()
+        )
+    jobs = [
+        (str(organization_id), month, os.path.join(directory, f"statement-{month}-{organization_id}.pdf"))
+        for organization_id in organization_ids
+    ]
+    os.makedirs(directory, exist_ok=True)
+
+    # Worker processes must open their own database connections
+    connections.close_all()
+    processes = processes or getattr(settings, 'STATEMENT_PDF_PROCESSES', None) or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker) as pool:
+        return list(pool.map(render_statement_pdf, *zip(*jobs))) if jobs else []
@@ -0,0 +1,127 @@
+# backend/apps/payments/tax_rules.py
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.models import Country, CountryConfiguration
+from . import metrics
+from .tax import TaxCalculator
+
+# Used for active countries without a CountryConfiguration row
+DEFAULT_CONFIGURATION = {
+    name: Decimal(str(CountryConfiguration._meta.get_field(name).default))
+    for name in (
+        'resident_withholding_rate', 'non_resident_withholding_rate',
+        'platform_fee_percentage', 'min_platform_fee',
+    )
+}
+
+
+class UnknownTaxCountry(LookupError):
+    """No active Country row for the requested code"""
+
+
+def _percent(value):
+    """Country rates are stored as percentages (16.00 -> 0.16)"""
+    return Decimal(str(value)) / 100
+
+
+def compile_rules():
+    """
+    Build a TaxCalculator subclass for every active country.
+
+    One query reads Country joined to CountryConfiguration; the result maps
+    country code to a calculator class whose tax rates and platform fee
+    are plain Decimals.
+    """
+    table = {}
+    for country in Country.objects.filter(is_active=True).select_related('countryconfiguration'):
+        configuration = getattr(country, 'countryconfiguration', None)
+        if configuration is None:
+            rules = DEFAULT_CONFIGURATION
+        else:
+            rules = {name: getattr(configuration, name) for name in DEFAULT_CONFIGURATION}
+
+        table[country.code] = type(f"{country.code}TaxCalculator", (TaxCalculator,), {
+            '__doc__': f"Calculate taxes for {country.name}",
+            'COUNTRY': country.code,
+            'CURRENCY': country.currency,
+            'TAX_NAME': country.tax_name,
+            'VAT_RATE': _percent(country.tax_rate),
+            'RESIDENT_WITHHOLDING_RATE': _percent(rules['resident_withholding_rate']),
+            'NON_RESIDENT_WITHHOLDING_RATE': _percent(rules['non_resident_withholding_rate']),
+            'PLATFORM_FEE_RATE': _percent(rules['platform_fee_percentage']),
+            'MIN_PLATFORM_FEE': Decimal(str(rules['min_platform_fee'])),
+        })
+    return table
+
+
+class TaxRuleTable:
+    """
+    Process-local table of compiled per-country tax calculators.
+
+    Lookups are a dict access. The table is compiled on first use and
+    recompiled only when the version stamp in the shared cache changes;
+    saving or deleting a Country or CountryConfiguration row bumps it
+    (see payments.signals). Each process compares versions at most once
+    every `check_interval` seconds, so between checks a lookup does no I/O
+    at all, and a rate change reaches every worker within that interval.
+    """
+
+    version_key = 'payments:tax-rules:version'
+
+    def __init__(self, check_interval=None):
+        if check_interval is None:
+            check_interval = getattr(settings, 'TAX_RULES_CHECK_INTERVAL', 5)
+        self.check_interval = check_interval
+        self._table = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = metrics.counter('tax.rules.reloads')
+
+    def calculator(self, country_code):
+        """TaxCalculator subclass for `country_code`"""
+        try:
+            return self._current()[country_code]
+        except KeyError:
+            raise UnknownTaxCountry(f"No tax rules for country {country_code!r}")
+
+    def countries(self):
+        return sorted(self._current())
+
+    def invalidate(self):
+        """Make every process recompile on its next check (this one at once)"""
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+        self._checked_at = 0.0
+
+    def _current(self):
+        table = self._table
+        if table is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return table
+
+        with self._lock:
+            if self._table is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._table
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+            if self._table is None or version != self._version:
+                # Read the version first: a change landing mid-compile bumps
+                # it again and is picked up on the next check
+                self._table = compile_rules()
+                self._version = version
+                self.reloads.inc()
+            self._checked_at = time.monotonic()
+            return self._table
+
+
+tax_rules = TaxRuleTable()
+
+
+def calculator_for(country_code):
+    """Shortcut for tax_rules.calculator()"""
+    return tax_rules.calculator(country_code)
@@ -1,3 +1,1543 @@
-from django.test import TestCase
+# backend/apps/payments/tests.py
+import asyncio
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch, MagicMock, AsyncMock
+import requests
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from core.models import Country, CountryConfiguration
+from core.testing import requires_file_database
+from . import http as http_module, metrics, resilience
+from .http import GatewayHttpClient, AsyncGatewayHttpClient, get_async_client
+from .mpesa import MpesaGateway, normalize_phone
+from .callbacks import CallbackProcessor
+from .idempotency import IdempotencyKeyReused, IdempotencyStore
+from .intents import create_intent, expire_stale_intents
+from .ledger import UnbalancedTransaction, balance_for, check_balances, post, post_payout, post_sale
+from .models import (
+    LedgerEntry, LedgerTransaction, MpesaCallback, OrganizationBalance, PaymentIntent, Payout, PayoutBatch
+)
+from .mpesa_async import AsyncMpesaGateway
+from .loadtest import run_async, run_sync
+from .quotes import quote_cart
+from .reconciliation import Outcome, Reconciliation, StatementFormatError, read_statement
+from .resilience import Bulkhead, BulkheadFull, CircuitBreaker, CircuitOpen
+from .routing import NoProviderAvailable, PaymentProvider, PaymentRouter, PaymentUnconfirmed, ProviderError
+from .payouts import PayoutDispatcher, business_days_before, collect_eligible_payouts
+from .simulator import DarajaSimulator
+from .statements import csv_chunks, month_range, render_statements, statement_rows, with_totals
+from .tax import KenyaTaxCalculator
+from .tax_rules import TaxRuleTable, UnknownTaxCountry, tax_rules
+from .tokens import AccessTokenCache
+
+User = get_user_model()
+
+
+class AccessTokenCacheTests(SimpleTestCase):
+    """Test the shared OAuth token cache"""
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.fetch = MagicMock(return_value=('token-1', 3600))
+        self.tokens = AccessTokenCache('test:token', self.fetch, refresh_margin=300)
+
+    def test_miss_then_hit(self):
+        """First call fetches, later calls reuse the cached token"""
+        self.assertEqual(self.tokens.get(), 'token-1')
+        self.assertEqual(self.tokens.get(), 'token-1')
+        self.assertEqual(self.tokens.get(), 'token-1')
+
+        self.assertEqual(self.fetch.call_count, 1)
+        self.assertEqual(self.tokens.misses.value, 1)
+        self.assertEqual(self.tokens.hits.value, 2)
+
+    def test_expired_token_is_refetched(self):
+        """Tokens are not served past expires_in"""
+        self.tokens.get()
+        with patch('payments.tokens.time.time', return_value=time.time() + 3601):
+            self.fetch.return_value = ('token-2', 3600)
+            self.assertEqual(self.tokens.get(), 'token-2')
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_early_refresh_serves_current_token(self):
+        """Inside the refresh window the old token is returned while a new one is fetched"""
+        self.tokens.get()
+        self.fetch.return_value = ('token-2', 3600)
+
+        with patch('payments.tokens.time.time', return_value=time.time() + 3400):
+            self.assertEqual(self.tokens.get(), 'token-1')
+
+        # Wait for the background refresh to land
+        for _ in range(100):
+            if cache.get('test:token')['token'] == 'token-2':
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.tokens.get(), 'token-2')
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_single_flight_refresh(self):
+        """Concurrent misses trigger exactly one OAuth request"""
+        def slow_fetch():
+            time.sleep(0.1)
+            return ('token-1', 3600)
+        self.fetch.side_effect = slow_fetch
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.tokens.get())) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['token-1'] * 10)
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_invalidate(self):
+        """Invalidating forces a new fetch"""
+        self.tokens.get()
+        self.tokens.invalidate()
+        self.tokens.get()
+        self.assertEqual(self.fetch.call_count, 2)
+
+
+class MpesaGatewayTokenTests(SimpleTestCase):
+    """Test that payment calls reuse the cached token"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stk_push_reuses_token(self):
+        http = MagicMock()
+        http.get.return_value = MagicMock(
+            status_code=200,
+            json=lambda: {'access_token': 'abc', 'expires_in': '3599'}
+        )
+        http.post.return_value = MagicMock(json=lambda: {'ResponseCode': '0'})
+
+        gateway = MpesaGateway(http_client=http)
+        gateway.stk_push('0712345678', 100, 'EVT123', 'Tickets')
+        gateway.stk_push('0712345678', 100, 'EVT124', 'Tickets')
+
+        self.assertEqual(http.get.call_count, 1)
+        self.assertEqual(http.post.call_count, 2)
+        headers = http.post.call_args.kwargs['headers']
+        self.assertEqual(headers['Authorization'], 'Bearer abc')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers with the next status in `server.statuses`, then 200"""
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length)) if length else None
+        self.server.hits.append((self.command, self.path))
+        self.server.payloads.append(payload)
+        code = self.server.statuses.pop(0) if self.server.statuses else 200
+        if self.path.startswith('/oauth'):
+            body = json.dumps({'access_token': 'stub-token', 'expires_in': '3599'}).encode()
+        else:
+            body = json.dumps({'ok': code == 200, 'ResponseCode': '0'}).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients dropping keep-alive connections at teardown
+
+
+class StubServerMixin:
+    """Runs StubHandler on a random local port for the duration of a test"""
+
+    def start_stub(self):
+        self.server = StubServer(('127.0.0.1', 0), StubHandler)
+        self.server.hits = []
+        self.server.payloads = []
+        self.server.statuses = []
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop_stub(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class GatewayHttpClientTests(StubServerMixin, SimpleTestCase):
+    """Test the pooled gateway HTTP client against a local stub server"""
+
+    def setUp(self):
+        metrics.reset()
+        resilience.reset()
+        self.start_stub()
+        self.client = GatewayHttpClient(pool_size=2, max_retries=3, backoff_factor=0, backoff_jitter=0)
+
+    def tearDown(self):
+        self.client.close()
+        self.stop_stub()
+
+    def test_get_is_retried(self):
+        """Idempotent requests are retried on 5xx"""
+        self.server.statuses = [503, 502]
+        response = self.client.get(f"{self.url}/oauth", 'oauth')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.hits), 3)
+
+    def test_post_is_not_retried(self):
+        """Payment requests are never replayed"""
+        self.server.statuses = [503]
+        response = self.client.post(f"{self.url}/stk", 'stk_push', json={})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.hits), 1)
+
+    def test_latency_histogram_per_endpoint(self):
+        self.client.get(f"{self.url}/oauth", 'oauth')
+        self.client.post(f"{self.url}/stk", 'stk_push', json={})
+        self.client.post(f"{self.url}/stk", 'stk_push', json={})
+
+        self.assertEqual(metrics.histogram('mpesa.http.oauth.latency_ms').count, 1)
+        self.assertEqual(metrics.histogram('mpesa.http.stk_push.latency_ms').count, 2)
+
+    @override_settings(MPESA_CIRCUIT_FAILURE_THRESHOLD=3)
+    def test_circuit_opens_after_consecutive_failures(self):
+        resilience.reset()
+        self.server.statuses = [503, 503, 503]
+        for _ in range(3):
+            self.assertEqual(self.client.post(f"{self.url}/stk", 'stk_push', json={}).status_code, 503)
+
+        with self.assertRaises(CircuitOpen):
+            self.client.post(f"{self.url}/stk", 'stk_push', json={})
+        self.assertEqual(len(self.server.hits), 3)
+        self.assertEqual(metrics.gauge('mpesa.http.stk_push.circuit_state').value, 2)
+        # Other endpoints have their own breaker
+        self.assertEqual(self.client.get(f"{self.url}/oauth", 'oauth').status_code, 200)
+
+    def test_default_timeout_is_applied(self):
+        client = GatewayHttpClient(connect_timeout=1, read_timeout=2)
+        with patch.object(client.session, 'request') as mock_request:
+            client.get('http://example.com', 'oauth')
+        self.assertEqual(mock_request.call_args.kwargs['timeout'], (1, 2))
+
+
+class ResilienceTests(SimpleTestCase):
+    """Test the circuit breaker and bulkhead state machines"""
+
+    def setUp(self):
+        self.breaker = CircuitBreaker('test.endpoint', failure_threshold=2, reset_timeout=0.05, slow_call_seconds=1)
+
+    def test_half_open_trial_closes_or_reopens(self):
+        for _ in range(2):
+            self.breaker.allow()
+            self.breaker.record(False, 0.01)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpen):
+            self.breaker.allow()
+
+        time.sleep(0.06)
+        self.breaker.allow()  # The trial call
+        with self.assertRaises(CircuitOpen):
+            self.breaker.allow()  # Only one trial at a time
+        self.breaker.record(False, 0.01)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.06)
+        self.breaker.allow()
+        self.breaker.record(True, 0.01)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(metrics.gauge('test.endpoint.circuit_state').value, 0)
+
+    def test_slow_calls_count_as_failures(self):
+        for _ in range(2):
+            self.breaker.allow()
+            self.breaker.record(True, 5)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_bulkhead_rejects_over_capacity(self):
+        bulkhead = Bulkhead('test.bulkhead', 2)
+        with bulkhead, bulkhead:
+            self.assertEqual(metrics.gauge('test.bulkhead.in_flight').value, 2)
+            with self.assertRaises(BulkheadFull):
+                bulkhead.acquire()
+        with bulkhead:
+            pass
+        self.assertEqual(metrics.gauge('test.bulkhead.in_flight').value, 0)
+
+
+class AsyncMpesaGatewayTests(StubServerMixin, SimpleTestCase):
+    """Test that the async gateway behaves like the sync one"""
+
+    def setUp(self):
+        cache.clear()
+        resilience.reset()
+        self.start_stub()
+        self.settings_override = override_settings(MPESA_BASE_URL=self.url)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.stop_stub()
+
+    async def test_requests_match_sync_gateway(self):
+        """Both gateways send identical STK push and B2C payloads"""
+        with patch.object(MpesaGateway, 'generate_password', return_value=('pw', '20260101000000')):
+            sync_gateway = MpesaGateway(http_client=GatewayHttpClient())
+            await sync_to_async(sync_gateway.stk_push)('+254712345678', 150.7, 'EVT-0001-LONGREF', 'Ticket purchase')
+            await sync_to_async(sync_gateway.b2c_payment)('0712345678', 2500, 'Payout')
+
+            http = AsyncGatewayHttpClient()
+            async_gateway = AsyncMpesaGateway(http_client=http)
+            result = await async_gateway.stk_push('+254712345678', 150.7, 'EVT-0001-LONGREF', 'Ticket purchase')
+            await async_gateway.b2c_payment('0712345678', 2500, 'Payout')
+            await http.aclose()
+
+        self.assertEqual(result['ResponseCode'], '0')
+        paths = [path for _, path in self.server.hits]
+        # One OAuth call in total: the async gateway reuses the sync token
+        self.assertEqual(sum(path.startswith('/oauth') for path in paths), 1)
+        sync_stk, sync_b2c, async_stk, async_b2c = [p for p in self.server.payloads if p]
+        self.assertEqual(sync_stk, async_stk)
+        self.assertEqual(sync_b2c, async_b2c)
+        self.assertEqual(async_stk['PhoneNumber'], '254712345678')
+        self.assertEqual(async_stk['Amount'], '150')
+
+    async def test_concurrent_stk_push_single_token_fetch(self):
+        http = AsyncGatewayHttpClient(pool_size=50, max_concurrent=100)
+        gateway = AsyncMpesaGateway(http_client=http)
+        results = await asyncio.gather(*(
+            gateway.stk_push('0712345678', 100, f"EVT{i}", 'Tickets') for i in range(100)
+        ))
+        await http.aclose()
+
+        self.assertEqual(len(results), 100)
+        oauth_calls = [path for _, path in self.server.hits if path.startswith('/oauth')]
+        self.assertEqual(len(oauth_calls), 1)
+
+
+class AsyncClientLifetimeTests(SimpleTestCase):
+    """Test the per-loop async client is closed with its loop"""
+
+    def test_session_closed_when_loop_finishes(self):
+        async def view():
+            return get_async_client().session
+
+        # As under WSGI: each async view runs in its own event loop
+        sessions = [async_to_sync(view)() for _ in range(2)]
+
+        self.assertIsNot(sessions[0], sessions[1])
+        self.assertTrue(all(session.closed for session in sessions))
+
+    def test_finished_loops_are_forgotten(self):
+        async def view():
+            get_async_client()
+
+        before = len(http_module._async_clients)
+        for _ in range(5):
+            async_to_sync(view)()
+
+        self.assertEqual(len(http_module._async_clients), before)
+
+
+class AsyncPaymentViewTests(TestCase):
+    """Test the async payment endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='buyer@example.com',
+            password='TestPass123!',
+            first_name='Buyer',
+            last_name='User'
+        )
+        self.auth = f"Bearer {RefreshToken.for_user(self.user).access_token}"
+        self.url = reverse('mpesa_stk_push')
+        self.data = {
+            'phone_number': '0712345678',
+            'amount': '500.00',
+            'account_reference': 'EVT123',
+        }
+
+    def test_stk_push_requires_authentication(self):
+        response = self.client.post(self.url, self.data, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    @patch.object(AsyncMpesaGateway, 'stk_push', new_callable=AsyncMock)
+    def test_stk_push(self, mock_stk_push):
+        mock_stk_push.return_value = {'ResponseCode': '0', 'CheckoutRequestID': 'ws_CO_1'}
+
+        response = self.client.post(
+            self.url, self.data, content_type='application/json', HTTP_AUTHORIZATION=self.auth
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['CheckoutRequestID'], 'ws_CO_1')
+        mock_stk_push.assert_awaited_once()
+
+        intent = PaymentIntent.objects.get()
+        self.assertEqual(response.json()['payment_intent'], str(intent.pk))
+        self.assertEqual(intent.status, PaymentIntent.Status.PENDING)
+        self.assertEqual(intent.checkout_request_id, 'ws_CO_1')
+        self.assertEqual(intent.user, self.user)
+
+    @patch.object(AsyncMpesaGateway, 'stk_push', new_callable=AsyncMock)
+    def test_stk_push_refused_connection_fails_intent(self, mock_stk_push):
+        mock_stk_push.side_effect = ConnectionRefusedError('Connection refused')
+
+        response = self.client.post(
+            self.url, self.data, content_type='application/json', HTTP_AUTHORIZATION=self.auth
+        )
+
+        self.assertEqual(response.status_code, 503)
+        intent = PaymentIntent.objects.get()
+        self.assertEqual(intent.status, PaymentIntent.Status.FAILED)
+        self.assertEqual(intent.failure_reason, 'Connection refused')
+
+    @patch.object(AsyncMpesaGateway, 'stk_push', new_callable=AsyncMock)
+    def test_stk_push_fails_fast_when_circuit_is_open(self, mock_stk_push):
+        mock_stk_push.side_effect = CircuitOpen('mpesa.http.stk_push circuit is open', retry_after=12.5)
+
+        response = self.client.post(
+            self.url, self.data, content_type='application/json', HTTP_AUTHORIZATION=self.auth
+        )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '13')
+        self.assertEqual(PaymentIntent.objects.get().status, PaymentIntent.Status.FAILED)
+
+    def test_stk_push_invalid_data(self):
+        response = self.client.post(
+            self.url, {'amount': '0'}, content_type='application/json', HTTP_AUTHORIZATION=self.auth
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('phone_number', response.json())
+
+    @patch.object(AsyncMpesaGateway, 'stk_push', new_callable=AsyncMock)
+    def test_stk_push_retry_replays_first_response(self, mock_stk_push):
+        cache.clear()
+        mock_stk_push.return_value = {'ResponseCode': '0', 'CheckoutRequestID': 'ws_CO_1'}
+
+        def post(data):
+            return self.client.post(
+                self.url, data, content_type='application/json',
+                HTTP_AUTHORIZATION=self.auth, HTTP_IDEMPOTENCY_KEY='tap-1'
+            )
+
+        first, retry = post(self.data), post(self.data)
+
+        mock_stk_push.assert_awaited_once()
+        self.assertEqual(PaymentIntent.objects.count(), 1)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(post({**self.data, 'amount': '600.00'}).status_code, 422)
+
+    @patch.object(AsyncMpesaGateway, 'stk_push', new_callable=AsyncMock)
+    def test_stk_push_that_was_never_sent_is_not_replayed(self, mock_stk_push):
+        cache.clear()
+        mock_stk_push.side_effect = [ConnectionRefusedError('Connection refused'), {'ResponseCode': '0'}]
+
+        for expected in (503, 200):
+            response = self.client.post(
+                self.url, self.data, content_type='application/json',
+                HTTP_AUTHORIZATION=self.auth, HTTP_IDEMPOTENCY_KEY='tap-2'
+            )
+            self.assertEqual(response.status_code, expected)
+        self.assertEqual(mock_stk_push.await_count, 2)
+
+    @patch.object(AsyncMpesaGateway, 'stk_push', new_callable=AsyncMock)
+    def test_stk_push_timeout_is_replayed_not_resent(self, mock_stk_push):
+        cache.clear()
+        mock_stk_push.side_effect = [asyncio.TimeoutError(), {'ResponseCode': '0'}]
+
+        responses = [
+            self.client.post(
+                self.url, self.data, content_type='application/json',
+                HTTP_AUTHORIZATION=self.auth, HTTP_IDEMPOTENCY_KEY='tap-3'
+            )
+            for _ in range(2)
+        ]
+
+        # Safaricom may have accepted the first push; the retry must not prompt the customer again
+        mock_stk_push.assert_awaited_once()
+        self.assertEqual([response.status_code for response in responses], [502, 502])
+        self.assertEqual(responses[1]['Idempotent-Replayed'], 'true')
+        self.assertEqual(PaymentIntent.objects.get().status, PaymentIntent.Status.INITIATED)
+
+    def test_b2c_requires_staff(self):
+        response = self.client.post(
+            reverse('mpesa_b2c_payment'),
+            {'phone_number': '0712345678', 'amount': '1000'},
+            content_type='application/json',
+            HTTP_AUTHORIZATION=self.auth
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class IdempotencyStoreTests(SimpleTestCase):
+    """Test replaying responses for repeated idempotency keys"""
+
+    def setUp(self):
+        cache.clear()
+        self.store = IdempotencyStore(prefix='test:idempotency', poll_interval=0.01)
+        self.calls = 0
+
+    async def handler(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return 201, b'{"ok": true}'
+
+    def test_in_flight_duplicates_wait_for_the_original(self):
+        async def run():
+            return await asyncio.gather(*[self.store.arun('key-1', 'body', self.handler) for _ in range(5)])
+
+        results = asyncio.run(run())
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({(status, content) for status, content, _ in results}, {(201, b'{"ok": true}')})
+        self.assertEqual(sorted(replayed for _, _, replayed in results), [False, True, True, True, True])
+
+    def test_key_reused_with_different_body(self):
+        asyncio.run(self.store.arun('key-1', 'body', self.handler))
+        with self.assertRaises(IdempotencyKeyReused):
+            asyncio.run(self.store.arun('key-1', 'other body', self.handler))
+        self.assertEqual(self.calls, 1)
+
+
+class FakeB2CGateway:
+    """Thread-safe stand-in for MpesaGateway.b2c_payment"""
+
+    def __init__(self, delay=0, response=None):
+        self.delay = delay
+        self.response = response
+        self.calls = []
+        self.in_flight = 0
+        self.max_seen = 0
+        self._lock = threading.Lock()
+
+    def b2c_payment(self, phone_number, amount, remarks, occasion="Event Payout"):
+        with self._lock:
+            self.calls.append(occasion)
+            self.in_flight += 1
+            self.max_seen = max(self.max_seen, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return self.response or {
+            'ConversationID': f"AG_{occasion}",
+            'OriginatorConversationID': f"OC_{occasion}",
+            'ResponseCode': '0',
+            'ResponseDescription': 'Accept the service request successfully.'
+        }
+
+
+class PayoutEngineTests(TransactionTestCase):
+    """Test payout collection and concurrent B2C dispatch"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            email='organizer@example.com',
+            password='TestPass123!',
+            first_name='Olive',
+            last_name='Organizer'
+        )
+        self.organization = self.owner.owned_organizations.first()
+        kenya = Country.objects.create(code='KE', name='Kenya', currency='KES', currency_symbol='KSh')
+        CountryConfiguration.objects.create(country=kenya, min_payout_amount=500, payout_processing_days=3)
+        self.old = timezone.now() - timedelta(days=10)
+
+    def make_payout(self, amount=1000, country='KE', requested_at=None, **kwargs):
+        payout = Payout.objects.create(
+            organization=self.organization,
+            amount=Decimal(amount),
+            country=country,
+            phone_number='0712345678',
+            **kwargs
+        )
+        Payout.objects.filter(pk=payout.pk).update(requested_at=requested_at or self.old)
+        return payout
+
+    def test_business_days_skip_weekends(self):
+        monday = timezone.now().replace(year=2026, month=10, day=12)
+        self.assertEqual(business_days_before(monday, 3).weekday(), 2)  # Previous Wednesday
+
+    def test_collect_respects_country_rules(self):
+        eligible = self.make_payout(1000)
+        too_small = self.make_payout(100)
+        too_recent = self.make_payout(1000, requested_at=timezone.now())
+        other_country = self.make_payout(600, country='UG')  # Uses the model defaults
+
+        batch = collect_eligible_payouts()
+
+        queued = set(batch.payouts.values_list('pk', flat=True))
+        self.assertEqual(queued, {eligible.pk, other_country.pk})
+        self.assertEqual(batch.total_count, 2)
+        self.assertEqual(batch.total_amount, Decimal('1600'))
+        too_small.refresh_from_db()
+        too_recent.refresh_from_db()
+        self.assertEqual(too_small.status, Payout.Status.PENDING)
+        self.assertEqual(too_recent.status, Payout.Status.PENDING)
+
+    def test_collect_nothing_eligible(self):
+        self.make_payout(100)
+        self.assertIsNone(collect_eligible_payouts())
+        self.assertFalse(PayoutBatch.objects.exists())
+
+    @requires_file_database
+    def test_dispatch_sends_each_payout_once(self):
+        for _ in range(30):
+            self.make_payout(1000)
+        batch = collect_eligible_payouts()
+        gateway = FakeB2CGateway(delay=0.01)
+
+        batch = PayoutDispatcher(gateway=gateway, max_in_flight=5, rate_per_second=1000).run(batch)
+
+        self.assertEqual(batch.status, PayoutBatch.Status.COMPLETED)
+        self.assertEqual(len(gateway.calls), 30)
+        self.assertEqual(len(set(gateway.calls)), 30)
+        self.assertLessEqual(gateway.max_seen, 5)
+        self.assertEqual(batch.payouts.filter(status=Payout.Status.SUBMITTED).count(), 30)
+        payout = batch.payouts.first()
+        self.assertEqual(payout.conversation_id, f"AG_{payout.idempotency_key}")
+        self.assertEqual(payout.attempts, 1)
+
+        # Running the batch again sends nothing
+        PayoutDispatcher(gateway=gateway, max_in_flight=5).run(batch)
+        self.assertEqual(len(gateway.calls), 30)
+
+    @requires_file_database
+    def test_resume_after_crash_never_resends(self):
+        for _ in range(3):
+            self.make_payout(1000)
+        batch = collect_eligible_payouts()
+        in_flight, sent, queued = batch.payouts.all()
+        # Simulate a dispatcher that died mid-batch
+        Payout.objects.filter(pk=in_flight.pk).update(
+            status=Payout.Status.SUBMITTING,
+            submitted_at=timezone.now() - timedelta(hours=1)
+        )
+        Payout.objects.filter(pk=sent.pk).update(status=Payout.Status.SUBMITTED)
+        PayoutBatch.objects.filter(pk=batch.pk).update(status=PayoutBatch.Status.RUNNING)
+        gateway = FakeB2CGateway()
+
+        batch = PayoutDispatcher(gateway=gateway, max_in_flight=2).run(batch)
+
+        self.assertEqual(gateway.calls, [queued.idempotency_key])
+        in_flight.refresh_from_db()
+        self.assertEqual(in_flight.status, Payout.Status.UNCONFIRMED)
+        self.assertEqual(batch.status, PayoutBatch.Status.COMPLETED)
+
+    @requires_file_database
+    def test_rejected_payout_is_failed(self):
+        self.make_payout(1000)
+        batch = collect_eligible_payouts()
+        gateway = FakeB2CGateway(response={'errorCode': '401.002.01', 'errorMessage': 'Error Occurred - Invalid Access Token'})
+
+        PayoutDispatcher(gateway=gateway, max_in_flight=1).run(batch)
+
+        payout = batch.payouts.get()
+        self.assertEqual(payout.status, Payout.Status.FAILED)
+        self.assertIn('Invalid Access Token', payout.failure_reason)
+
+
+class MpesaCallbackTests(TestCase):
+    """Test callback ingestion and batched processing"""
+
+    def setUp(self):
+        owner = User.objects.create_user(
+            email='organizer@example.com',
+            password='TestPass123!',
+            first_name='Olive',
+            last_name='Organizer'
+        )
+        self.payout = Payout.objects.create(
+            organization=owner.owned_organizations.first(),
+            amount=Decimal('1000'),
+            phone_number='0712345678',
+            status=Payout.Status.SUBMITTED,
+            conversation_id='AG_20260101_0001'
+        )
+
+    def b2c_result(self, conversation_id='AG_20260101_0001', code=0):
+        return {'Result': {
+            'ResultType': 0,
+            'ResultCode': code,
+            'ResultDesc': 'The service request is processed successfully.' if code == 0 else 'Declined',
+            'OriginatorConversationID': '10571-7910404-1',
+            'ConversationID': conversation_id,
+            'TransactionID': 'LHG31AA5TX',
+        }}
+
+    def stk_callback(self, checkout_id='ws_CO_191220191020363925'):
+        return {'Body': {'stkCallback': {
+            'MerchantRequestID': '29115-34620561-1',
+            'CheckoutRequestID': checkout_id,
+            'ResultCode': 0,
+            'ResultDesc': 'The service request is processed successfully.',
+        }}}
+
+    def test_callback_is_stored_and_acknowledged(self):
+        response = self.client.post(
+            reverse('mpesa_stk_callback'), self.stk_callback(), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'ResultCode': 0, 'ResultDesc': 'Accepted'})
+
+        callback = MpesaCallback.objects.get()
+        self.assertEqual(callback.kind, MpesaCallback.Kind.STK)
+        self.assertEqual(callback.reference, 'ws_CO_191220191020363925')
+        self.assertEqual(callback.result_code, 0)
+        self.assertIsNone(callback.processed_at)
+
+    def test_duplicate_callbacks_are_dropped(self):
+        for _ in range(3):
+            response = self.client.post(
+                reverse('mpesa_b2c_result'), self.b2c_result(), content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(MpesaCallback.objects.count(), 1)
+
+    def test_invalid_callback(self):
+        response = self.client.post(
+            reverse('mpesa_stk_callback'), {'Body': {}}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MpesaCallback.objects.exists())
+
+    def test_processor_applies_b2c_results_in_bulk(self):
+        other = Payout.objects.create(
+            organization=self.payout.organization,
+            amount=Decimal('700'),
+            phone_number='0712345678',
+            status=Payout.Status.SUBMITTED,
+            conversation_id='AG_20260101_0002'
+        )
+        for body in [self.b2c_result(), self.b2c_result('AG_20260101_0002', code=2001)]:
+            self.client.post(reverse('mpesa_b2c_result'), body, content_type='application/json')
+
+        with self.assertNumQueries(7):
+            # Savepoint, claim, payouts SELECT, completed UPDATE, failed bulk UPDATE, mark processed, release
+            self.assertEqual(CallbackProcessor().process_batch(), 2)
+
+        self.payout.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.payout.status, Payout.Status.COMPLETED)
+        self.assertIsNotNone(self.payout.completed_at)
+        self.assertEqual(other.status, Payout.Status.FAILED)
+        self.assertEqual(other.failure_reason, 'Declined')
+        self.assertFalse(MpesaCallback.objects.filter(processed_at__isnull=True).exists())
+
+    def test_b2c_timeout_marks_payout_unconfirmed(self):
+        self.client.post(reverse('mpesa_b2c_timeout'), self.b2c_result(), content_type='application/json')
+        CallbackProcessor().drain()
+        self.payout.refresh_from_db()
+        self.assertEqual(self.payout.status, Payout.Status.UNCONFIRMED)
+
+
+class PaymentIntentTests(TestCase):
+    """Test the STK payment state machine and expiry sweep"""
+
+    def setUp(self):
+        self.intent = self.make_intent('ws_CO_0001')
+
+    def make_intent(self, checkout_id=None, status=PaymentIntent.Status.PENDING, expires_at=None):
+        intent = create_intent(None, '0712345678', Decimal('500'), 'EVT123')
+        PaymentIntent.objects.filter(pk=intent.pk).update(
+            status=status,
+            checkout_request_id=checkout_id,
+            expires_at=expires_at or intent.expires_at,
+        )
+        intent.refresh_from_db()
+        return intent
+
+    def stk_callback(self, checkout_id='ws_CO_0001', code=0):
+        body = {
+            'MerchantRequestID': '29115-34620561-1',
+            'CheckoutRequestID': checkout_id,
+            'ResultCode': code,
+            'ResultDesc': 'Request cancelled by user' if code else 'The service request is processed successfully.',
+        }
+        if code == 0:
+            body['CallbackMetadata'] = {'Item': [
+                {'Name': 'Amount', 'Value': 500},
+                {'Name': 'MpesaReceiptNumber', 'Value': 'NLJ7RT61SV'},
+            ]}
+        self.client.post(
+            reverse('mpesa_stk_callback'), {'Body': {'stkCallback': body}}, content_type='application/json'
+        )
+
+    @override_settings(DEEVENTS={'TICKET_RESERVATION_MINUTES': 10})
+    def test_expiry_uses_reservation_window(self):
+        intent = create_intent(None, '0712345678', Decimal('500'), 'EVT123')
+        self.assertEqual(intent.status, PaymentIntent.Status.INITIATED)
+        self.assertAlmostEqual(
+            (intent.expires_at - timezone.now()).total_seconds(), 600, delta=5
+        )
+
+    def test_paid_callback(self):
+        self.stk_callback()
+        CallbackProcessor().drain()
+
+        self.intent.refresh_from_db()
+        self.assertEqual(self.intent.status, PaymentIntent.Status.PAID)
+        self.assertEqual(self.intent.mpesa_receipt_number, 'NLJ7RT61SV')
+        self.assertEqual(self.intent.result_code, 0)
+        self.assertIsNotNone(self.intent.paid_at)
+
+    def test_cancelled_callback(self):
+        self.stk_callback(code=1032)
+        CallbackProcessor().drain()
+
+        self.intent.refresh_from_db()
+        self.assertEqual(self.intent.status, PaymentIntent.Status.FAILED)
+        self.assertEqual(self.intent.failure_reason, 'Request cancelled by user')
+
+    def test_sweep_expires_only_stale_open_intents(self):
+        past = timezone.now() - timedelta(minutes=1)
+        stale = [self.make_intent(f"ws_CO_1{i}", expires_at=past) for i in range(5)]
+        initiated = self.make_intent(status=PaymentIntent.Status.INITIATED, expires_at=past)
+        paid = self.make_intent('ws_CO_2', status=PaymentIntent.Status.PAID, expires_at=past)
+
+        # A full chunk of four, then a short chunk of two ends the sweep
+        with self.assertNumQueries(4):
+            self.assertEqual(expire_stale_intents(chunk_size=4), 6)
+
+        expired = PaymentIntent.objects.filter(status=PaymentIntent.Status.EXPIRED)
+        self.assertEqual(set(expired.values_list('pk', flat=True)), {i.pk for i in stale} | {initiated.pk})
+        paid.refresh_from_db()
+        self.intent.refresh_from_db()
+        self.assertEqual(paid.status, PaymentIntent.Status.PAID)
+        self.assertEqual(self.intent.status, PaymentIntent.Status.PENDING)
+
+    def test_late_payment_after_expiry_is_recorded(self):
+        PaymentIntent.objects.filter(pk=self.intent.pk).update(expires_at=timezone.now())
+        expire_stale_intents()
+        self.stk_callback()
+        self.stk_callback('ws_CO_missing', code=1032)  # No matching intent; ignored
+        CallbackProcessor().drain()
+
+        self.intent.refresh_from_db()
+        self.assertEqual(self.intent.status, PaymentIntent.Status.PAID)
+        # The unmatched one waits for a while in case its intent just hasn't stored the id yet
+        missing = MpesaCallback.objects.get(reference='ws_CO_missing')
+        self.assertIsNone(missing.processed_at)
+        self.assertIsNotNone(missing.retry_at)
+
+        long_ago = timezone.now() - timedelta(hours=2)
+        MpesaCallback.objects.filter(pk=missing.pk).update(received_at=long_ago, retry_at=long_ago)
+        CallbackProcessor().drain()
+        self.assertFalse(MpesaCallback.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(metrics.counter('mpesa.callbacks.unmatched').value, 1)
+
+    def test_callback_before_checkout_id_is_stored(self):
+        intent = self.make_intent()
+        self.stk_callback('ws_CO_early')
+
+        self.assertEqual(CallbackProcessor().drain(), 1)
+        callback = MpesaCallback.objects.get(reference='ws_CO_early')
+        self.assertIsNone(callback.processed_at)
+
+        # The STK view stores the id; the retry then settles the intent
+        PaymentIntent.objects.filter(pk=intent.pk).update(checkout_request_id='ws_CO_early')
+        MpesaCallback.objects.filter(pk=callback.pk).update(retry_at=timezone.now())
+        CallbackProcessor().drain()
+
+        intent.refresh_from_db()
+        self.assertEqual(intent.status, PaymentIntent.Status.PAID)
+        callback.refresh_from_db()
+        self.assertIsNotNone(callback.processed_at)
+
+
+class DarajaSimulatorTests(StubServerMixin, SimpleTestCase):
+    """Test the local Daraja simulator and load-test harness"""
+
+    def setUp(self):
+        cache.clear()
+        resilience.reset()
+        self.start_stub()  # Receives the simulated callbacks
+        self.simulator = DarajaSimulator(callback_delay=0)
+        base_url = self.simulator.start()
+        self.settings_override = override_settings(
+            MPESA_BASE_URL=base_url,
+            MPESA_CALLBACK_URL=f"{self.url}/callback",
+            MPESA_RESULT_URL=f"{self.url}/result",
+        )
+        self.settings_override.enable()
+        self.gateway = MpesaGateway(http_client=GatewayHttpClient(max_retries=0))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.simulator.stop()
+        self.stop_stub()
+
+    def wait_for_callbacks(self, count):
+        for _ in range(200):
+            if len(self.server.payloads) >= count:
+                return
+            time.sleep(0.01)
+
+    def test_stk_push_and_callback(self):
+        response = self.gateway.stk_push('0712345678', 250, 'EVT123', 'Tickets')
+
+        self.assertEqual(response['ResponseCode'], '0')
+        self.wait_for_callbacks(1)
+        callback = self.server.payloads[0]['Body']['stkCallback']
+        self.assertEqual(callback['CheckoutRequestID'], response['CheckoutRequestID'])
+        self.assertEqual(callback['ResultCode'], 0)
+        self.assertEqual(self.server.hits[0], ('POST', '/callback'))
+
+    def test_b2c_result_callback(self):
+        response = self.gateway.b2c_payment('0712345678', 1000, 'Payout', occasion='key-1')
+
+        self.wait_for_callbacks(1)
+        result = self.server.payloads[0]['Result']
+        self.assertEqual(result['ConversationID'], response['ConversationID'])
+        self.assertEqual(result['ReferenceData']['ReferenceItem']['Value'], 'key-1')
+
+    def test_invalid_token_is_rejected(self):
+        self.gateway.get_access_token = lambda: 'not-a-token'
+        response = self.gateway.stk_push('0712345678', 250, 'EVT123', 'Tickets')
+        self.assertEqual(response['errorCode'], '404.001.03')
+
+    def test_error_injection(self):
+        self.simulator.error_rate = 1.0
+        with self.assertRaises(Exception):
+            self.gateway.get_access_token()
+
+    def test_sync_load_test(self):
+        result = run_sync(self.gateway, 'stk_push', rate=200, total=40, concurrency=10)
+
+        self.assertEqual(result.total, 40)
+        self.assertEqual(result.succeeded, 40)
+        self.assertLessEqual(result.percentile(50), result.percentile(99))
+        self.assertEqual(self.simulator.stats['stk_push.requests'], 40)
+
+    @override_settings(MPESA_CIRCUIT_FAILURE_THRESHOLD=1000)
+    async def test_async_load_test_reports_errors(self):
+        resilience.reset()
+        self.simulator.send_callbacks = False
+        await sync_to_async(self.gateway.get_access_token)()
+        self.simulator.error_rate = 0.5
+        http = AsyncGatewayHttpClient(max_retries=0, max_concurrent=100)
+
+        result = await run_async(AsyncMpesaGateway(http_client=http), 'b2c', rate=500, total=100)
+        await http.aclose()
+
+        self.assertEqual(result.total, 100)
+        self.assertGreater(result.errors['500.003.02'], 0)
+        self.assertEqual(result.succeeded + result.errors['500.003.02'], 100)
+        self.assertEqual(result.summary()['requests'], 100)
+
+
+class KenyaTaxCalculatorBatchTests(SimpleTestCase):
+    """Test the batch tax API against the scalar methods"""
+
+    # Half-cent ties (0.03125 * 0.16 = 0.005), sub-cent inputs and large values
+    amounts = [
+        Decimal('0.03125'), Decimal('0.09375'), Decimal('1'), Decimal('99.99'), Decimal('1234.565'),
+        Decimal('0.005'), Decimal('0'), Decimal('1000000.01'), Decimal('58'), Decimal('7.25'),
+    ]
+    fees = [Decimal('0.58'), Decimal('1.16'), Decimal('0.005'), Decimal('2.5'), Decimal('0'),
+            Decimal('100'), Decimal('0.03'), Decimal('9999.99'), Decimal('11.6'), Decimal('0.125')]
+
+    def test_vat_matches_scalar(self):
+        business = [i % 2 == 0 for i in range(len(self.amounts))]
+        result = KenyaTaxCalculator.calculate_vat_batch(self.amounts, is_business=business)
+
+        for i, amount in enumerate(self.amounts):
+            expected = KenyaTaxCalculator(amount, is_business=business[i]).calculate_vat()
+            self.assertEqual(result['vat_amount'][i], expected['vat_amount'])
+            self.assertEqual(result['net_amount'][i], expected['net_amount'])
+            self.assertEqual(str(result['net_amount'][i]), str(expected['net_amount']))
+        self.assertEqual(result['vat_rate'], Decimal('0.16'))
+
+    def test_withholding_tax_matches_scalar(self):
+        residency = [i % 3 != 0 for i in range(len(self.amounts))]
+        result = KenyaTaxCalculator.calculate_withholding_tax_batch(self.amounts, residency)
+
+        calculator = KenyaTaxCalculator(0)
+        for i, amount in enumerate(self.amounts):
+            expected = calculator.calculate_withholding_tax(amount, is_resident=residency[i])
+            self.assertEqual(result['withholding_tax'][i], expected['withholding_tax'])
+            self.assertEqual(result['net_payout'][i], expected['net_payout'])
+            self.assertEqual(result['rate'][i], expected['rate'])
+
+    def test_receipt_details_match_scalar(self):
+        result = KenyaTaxCalculator.generate_receipt_details_batch(self.amounts, self.fees)
+
+        calculator = KenyaTaxCalculator(0)
+        for i, (price, fee) in enumerate(zip(self.amounts, self.fees)):
+            expected = calculator.generate_receipt_details(price, fee)
+            self.assertEqual(result['ticket_price'][i], expected['ticket_price'])
+            self.assertEqual(result['service_fee'][i], expected['service_fee'])
+            self.assertEqual(result['vat']['amount'][i], expected['vat']['amount'])
+            self.assertEqual(result['subtotal'][i], expected['subtotal'])
+            self.assertEqual(result['total'][i], expected['total'])
+        self.assertEqual(result['vat']['rate'], calculator.generate_receipt_details(1, 1)['vat']['rate'])
+
+    def test_mismatched_columns(self):
+        with self.assertRaises(ValueError):
+            KenyaTaxCalculator.calculate_withholding_tax_batch(self.amounts, [True])
+        with self.assertRaises(ValueError):
+            KenyaTaxCalculator.generate_receipt_details_batch(self.amounts, self.fees[:2])
+
+
+class TaxRuleTableTests(TestCase):
+    """Test the compiled per-country tax rule table"""
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        kenya = Country.objects.create(code='KE', name='Kenya', currency='KES', currency_symbol='KSh')
+        self.nigeria = Country.objects.create(
+            code='NG', name='Nigeria', currency='NGN', currency_symbol='₦', tax_rate=Decimal('7.50')
+        )
+        Country.objects.create(code='GH', name='Ghana', currency='GHS', currency_symbol='GH₵', tax_rate=15)
+        Country.objects.create(code='UG', name='Uganda', currency='UGX', currency_symbol='USh', is_active=False)
+        CountryConfiguration.objects.create(country=kenya)
+        CountryConfiguration.objects.create(
+            country=self.nigeria, resident_withholding_rate=10, non_resident_withholding_rate=10
+        )
+        self.table = TaxRuleTable(check_interval=0)
+
+    def test_rules_come_from_country_rows(self):
+        self.assertEqual(self.table.countries(), ['GH', 'KE', 'NG'])
+
+        nigeria = self.table.calculator('NG')
+        self.assertEqual(nigeria.VAT_RATE, Decimal('0.075'))
+        self.assertEqual(nigeria.NON_RESIDENT_WITHHOLDING_RATE, Decimal('0.1'))
+        receipt = nigeria(0).generate_receipt_details(Decimal('1000'), Decimal('107.5'))
+        self.assertEqual(receipt['vat']['amount'], Decimal('7.50'))
+        self.assertEqual(receipt['currency'], 'NGN')
+
+        ghana = self.table.calculator('GH')  # No configuration row: default withholding
+        self.assertEqual(ghana.RESIDENT_WITHHOLDING_RATE, Decimal('0.05'))
+        self.assertEqual(ghana.calculate_vat_batch([Decimal('115')])['vat_amount'], [Decimal('15.00')])
+
+    def test_kenya_rules_match_kenya_calculator(self):
+        compiled = self.table.calculator('KE')(Decimal('1160.00'))
+        reference = KenyaTaxCalculator(Decimal('1160.00'))
+        self.assertEqual(compiled.calculate_vat(), reference.calculate_vat())
+        self.assertEqual(
+            compiled.generate_receipt_details(Decimal('1000'), Decimal('58')),
+            reference.generate_receipt_details(Decimal('1000'), Decimal('58')),
+        )
+
+    def test_lookups_do_not_query_the_database(self):
+        self.table.calculator('KE')
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                self.table.calculator('NG')
+
+    def test_table_reloads_when_rows_change(self):
+        self.assertEqual(self.table.calculator('NG').VAT_RATE, Decimal('0.075'))
+
+        self.nigeria.tax_rate = Decimal('10.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nigeria.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.table.calculator('NG').VAT_RATE, Decimal('0.1'))
+        self.assertEqual(self.table.reloads.value, 2)
+
+    def test_unknown_or_inactive_country(self):
+        with self.assertRaises(UnknownTaxCountry):
+            self.table.calculator('UG')
+
+
+class CheckoutQuoteTests(TestCase):
+    """Test cart pricing from the compiled country rules"""
+
+    def setUp(self):
+        cache.clear()
+        kenya = Country.objects.create(code='KE', name='Kenya', currency='KES', currency_symbol='KSh')
+        CountryConfiguration.objects.create(country=kenya, platform_fee_percentage=3, min_platform_fee=50)
+        tax_rules.invalidate()
+        self.items = [(Decimal('1000'), 2), (Decimal('5000'), 1), (Decimal('0'), 3)]
+
+    def test_quote_cart(self):
+        quote = quote_cart('KE', self.items)
+
+        self.assertEqual(quote['currency'], 'KES')
+        self.assertEqual(quote['vat'], {'name': 'VAT', 'rate': '16.00%', 'on': 'service_fee'})
+        first, second, free = quote['items']
+        self.assertEqual(first['service_fee'], Decimal('50.00'))  # 3% is below the minimum fee
+        self.assertEqual(first['vat'], Decimal('6.90'))
+        self.assertEqual(first['subtotal'], Decimal('1043.10'))
+        self.assertEqual(first['line_total'], Decimal('2100.00'))
+        self.assertEqual(second['service_fee'], Decimal('150.00'))
+        self.assertEqual(free['service_fee'], Decimal('0'))
+        self.assertEqual(free['line_total'], Decimal('0'))
+        self.assertEqual(quote['totals'], {
+            'ticket_price': Decimal('7000.00'),
+            'service_fee': Decimal('250.00'),
+            'vat': Decimal('34.49'),
+            'subtotal': Decimal('7215.51'),
+            'total': Decimal('7250.00'),
+        })
+
+    def test_lines_match_receipt_details(self):
+        quote = quote_cart('KE', self.items)
+        receipt = KenyaTaxCalculator(0).generate_receipt_details(Decimal('5000'), Decimal('150.00'))
+        self.assertEqual(quote['items'][1]['vat'], receipt['vat']['amount'])
+        self.assertEqual(quote['items'][1]['total'], receipt['total'])
+
+    def test_quote_runs_no_queries(self):
+        quote_cart('KE', self.items)
+        with self.assertNumQueries(0):
+            quote_cart('KE', [(Decimal(100 + i), 1) for i in range(200)])
+
+    def test_quote_endpoint(self):
+        response = self.client.post(reverse('checkout_quote'), {
+            'country': 'ke',
+            'items': [{'ticket_price': '1000', 'quantity': 2}, {'ticket_price': '5000'}],
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['totals']['total'], '7250.00')
+        self.assertEqual(response.json()['items'][0]['vat'], '6.90')
+        self.assertEqual(len(response.json()['items']), 2)
+
+    def test_quote_endpoint_unknown_country(self):
+        response = self.client.post(reverse('checkout_quote'), {
+            'country': 'ZZ',
+            'items': [{'ticket_price': '1000'}],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ZZ', response.json()['error'])
+
+
+class LedgerTests(TestCase):
+    """Test the double-entry ledger and running balances"""
+
+    def setUp(self):
+        owner = User.objects.create_user(
+            email='organizer@example.com',
+            password='TestPass123!',
+            first_name='Olive',
+            last_name='Organizer'
+        )
+        self.organization = owner.owned_organizations.first()
+
+    def test_sale_is_balanced_and_updates_balance(self):
+        ledger_transaction, created = post_sale(self.organization, 'intent-1', Decimal('1000'), Decimal('58'), 2)
+
+        self.assertTrue(created)
+        entries = dict(ledger_transaction.entries.values_list('account', 'amount'))
+        self.assertEqual(entries, {
+            LedgerEntry.Account.CUSTOMER_FUNDS: Decimal('2116.00'),
+            LedgerEntry.Account.ORGANIZER_PAYABLE: Decimal('-2000.00'),
+            LedgerEntry.Account.PLATFORM_REVENUE: Decimal('-100.00'),
+            LedgerEntry.Account.VAT_PAYABLE: Decimal('-16.00'),
+        })
+        with self.assertNumQueries(1):
+            self.assertEqual(balance_for(self.organization), Decimal('2000.00'))
+
+    def test_posting_twice_is_a_no_op(self):
+        post_sale(self.organization, 'intent-1', Decimal('1000'), Decimal('58'))
+        ledger_transaction, created = post_sale(self.organization, 'intent-1', Decimal('1000'), Decimal('58'))
+
+        self.assertFalse(created)
+        self.assertEqual(LedgerTransaction.objects.count(), 1)
+        self.assertEqual(balance_for(self.organization), Decimal('1000.00'))
+
+    def test_payout_withholds_tax(self):
+        post_sale(self.organization, 'intent-1', Decimal('5000'), Decimal('150'))
+        payout = Payout.objects.create(
+            organization=self.organization, amount=Decimal('3000'), phone_number='0712345678'
+        )
+
+        ledger_transaction, _ = post_payout(payout)
+
+        entries = dict(ledger_transaction.entries.values_list('account', 'amount'))
+        self.assertEqual(entries[LedgerEntry.Account.WITHHOLDING_TAX_PAYABLE], Decimal('-150.00'))
+        self.assertEqual(entries[LedgerEntry.Account.PAYOUT_FUNDS], Decimal('-2850.00'))
+        self.assertEqual(balance_for(self.organization), Decimal('2000.00'))
+
+    def test_unbalanced_posting_is_rejected(self):
+        with self.assertRaises(UnbalancedTransaction):
+            post(LedgerTransaction.Kind.ADJUSTMENT, 'adj-1', self.organization, 'KES', [
+                (LedgerEntry.Account.ORGANIZER_PAYABLE, Decimal('-10')),
+                (LedgerEntry.Account.PLATFORM_REVENUE, Decimal('5')),
+            ])
+        self.assertFalse(LedgerTransaction.objects.exists())
+
+    def test_check_balances_streams_and_repairs(self):
+        for i in range(5):
+            post_sale(self.organization, f"intent-{i}", Decimal('1000'), Decimal('58'))
+        self.assertEqual(check_balances(chunk_size=3)['mismatches'], [])
+
+        OrganizationBalance.objects.update(balance=Decimal('1'))
+        report = check_balances(chunk_size=3, repair=True)
+
+        self.assertEqual(report['entries'], 20)
+        self.assertEqual(report['unbalanced_transactions'], [])
+        self.assertEqual(report['mismatches'], [(self.organization.pk, 'KES', Decimal('1.00'), Decimal('5000.00'))])
+        self.assertEqual(balance_for(self.organization), Decimal('5000.00'))
+
+    def test_check_balances_finds_unbalanced_transactions(self):
+        ledger_transaction, _ = post_sale(self.organization, 'intent-1', Decimal('1000'), Decimal('58'))
+        LedgerEntry.objects.filter(
+            transaction=ledger_transaction, account=LedgerEntry.Account.VAT_PAYABLE
+        ).update(amount=Decimal('-15'))
+
+        self.assertEqual(check_balances(chunk_size=2)['unbalanced_transactions'], [ledger_transaction.pk])
+
+
+class StatementTests(TestCase):
+    """Test streamed statements and CSV exports"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            email='organizer@example.com',
+            password='TestPass123!',
+            first_name='Olive',
+            last_name='Organizer'
+        )
+        self.organization = self.owner.owned_organizations.first()
+        for i in range(3):
+            post_sale(self.organization, f"intent-{i}", Decimal('1000'), Decimal('58'))
+        payout = Payout.objects.create(
+            organization=self.organization, amount=Decimal('2000'), phone_number='0712345678'
+        )
+        post_payout(payout)
+        self.month = f"{timezone.localdate():%Y-%m}"
+
+    def test_rows_fold_entries_per_transaction(self):
+        rows = list(statement_rows(*month_range(self.month), organization=self.organization, chunk_size=3))
+
+        self.assertEqual([row['kind'] for row in rows], ['sale', 'sale', 'sale', 'payout'])
+        sale, payout = rows[0], rows[-1]
+        self.assertEqual(
+            [sale[c] for c in ('gross', 'ticket_sales', 'service_fees', 'vat', 'net')],
+            [Decimal('1058.00'), Decimal('1000.00'), Decimal('50.00'), Decimal('8.00'), Decimal('1000.00')],
+        )
+        self.assertEqual(payout['withholding_tax'], Decimal('100.00'))
+        self.assertEqual(payout['payouts'], Decimal('1900.00'))
+        self.assertEqual(payout['net'], Decimal('-2000.00'))
+        self.assertEqual(payout['ticket_sales'], Decimal('0'))
+
+    def test_rows_skip_entries_of_unseen_transactions(self):
+        first = LedgerTransaction.objects.first()
+        filter_transactions = LedgerTransaction.objects.filter
+
+        # The entry stream sees the first sale, the transaction stream doesn't
+        with patch.object(
+            LedgerTransaction.objects, 'filter',
+            side_effect=lambda *args, **kwargs: filter_transactions(*args, **kwargs).exclude(pk=first.pk),
+        ):
+            rows = list(statement_rows(*month_range(self.month), organization=self.organization, chunk_size=3))
+
+        self.assertEqual([row['kind'] for row in rows], ['sale', 'sale', 'payout'])
+        self.assertEqual([row['gross'] for row in rows[:2]], [Decimal('1058.00')] * 2)
+        self.assertEqual(rows[-1]['net'], Decimal('-2000.00'))
+
+    def test_rows_are_generated_lazily(self):
+        rows = statement_rows(*month_range(self.month))
+        with self.assertNumQueries(2):  # One cursor for transactions, one for entries
+            next(rows)
+        rows.close()
+
+    def test_csv_chunks_with_totals(self):
+        text = ''.join(csv_chunks(with_totals(statement_rows(*month_range(self.month))), chunk_bytes=100))
+        lines = list(csv.DictReader(text.splitlines()))
+
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[-1]['date'], 'TOTAL')
+        self.assertEqual(lines[-1]['net'], '1000.00')
+
+    def test_organization_statement_endpoint(self):
+        auth = f"Bearer {RefreshToken.for_user(self.owner).access_token}"
+        url = reverse('organization_statement', args=[self.organization.pk])
+
+        response = self.client.get(url, {'month': self.month}, HTTP_AUTHORIZATION=auth)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(body.strip().splitlines()), 6)  # Header, four transactions, totals
+
+    def test_statement_requires_membership(self):
+        outsider = User.objects.create_user(
+            email='outsider@example.com', password='TestPass123!', first_name='Out', last_name='Sider'
+        )
+        auth = f"Bearer {RefreshToken.for_user(outsider).access_token}"
+        response = self.client.get(
+            reverse('organization_statement', args=[self.organization.pk]), HTTP_AUTHORIZATION=auth
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_finance_export_is_staff_only(self):
+        auth = f"Bearer {RefreshToken.for_user(self.owner).access_token}"
+        params = {'start': '2026-01-01', 'end': '2027-01-01'}
+        response = self.client.get(reverse('finance_export'), params, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 403)
+
+        self.owner.is_staff = True
+        self.owner.save()
+        response = self.client.get(reverse('finance_export'), params, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 200)
+
+
+class StatementPdfTests(TransactionTestCase):
+    """Test PDF statement rendering in a process pool"""
+
+    def test_render_statements(self):
+        owners = [
+            User.objects.create_user(
+                email=f"organizer{i}@example.com", password='TestPass123!', first_name=f"Org{i}", last_name='User'
+            )
+            for i in range(2)
+        ]
+        for i, owner in enumerate(owners):
+            post_sale(owner.owned_organizations.first(), f"intent-{i}", Decimal('1000'), Decimal('58'))
+        month = f"{timezone.localdate():%Y-%m}"
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = render_statements(month, directory, processes=2)
+
+            self.assertEqual(len(paths), 2)
+            for path in paths:
+                with open(path, 'rb') as f:
+                    self.assertEqual(f.read(5), b'%PDF-')
+            self.assertEqual(sorted(os.listdir(directory)), sorted(os.path.basename(p) for p in paths))
+
+
+class StatementReconciliationTests(TestCase):
+    """Test reconciling M-Pesa statement exports against payment intents"""
+
+    def setUp(self):
+        self.now = timezone.localtime()
+        self.matched = self.paid_intent('0712345678', '500', 'RKA1')
+        self.short = self.paid_intent('0712345678', '1000.50', 'RKA2')
+        self.unlisted = self.paid_intent('0733000000', '200', 'RKA3')
+        self.uncallbacked = create_intent(None, '+254722000111', Decimal('750'), 'EVT123')
+        PaymentIntent.objects.filter(pk=self.uncallbacked.pk).update(status=PaymentIntent.Status.EXPIRED)
+
+    def paid_intent(self, phone, amount, receipt):
+        intent = create_intent(None, phone, Decimal(amount), 'EVT123')
+        PaymentIntent.objects.filter(pk=intent.pk).update(
+            status=PaymentIntent.Status.PAID, mpesa_receipt_number=receipt, paid_at=self.now
+        )
+        return intent
+
+    def statement(self):
+        def line(receipt, minutes, status, paid_in, other_party):
+            completed = f"{self.now + timedelta(minutes=minutes):%d-%m-%Y %H:%M:%S}"
+            return f"{receipt},{completed},Pay Bill from {other_party},{status},\"{paid_in}\",,{other_party}\n"
+
+        return [
+            'Account Holder:,DEEVENTS LTD\n',
+            'Time Period:,This month\n',
+            '\n',
+            'Receipt No.,Completion Time,Details,Transaction Status,Paid In,Withdrawn,Other Party Info\n',
+            line('RKA1', -30, 'Completed', '500.00', '2547*****678 - JANE DOE'),
+            line('RKA2', -20, 'Completed', '900.00', '254712345678 - JANE DOE'),
+            line('RKA4', -10, 'Completed', '750.00', '254722000111 - JOHN DOE'),
+            line('RKA1', 0, 'Completed', '500.00', '2547*****678 - JANE DOE'),
+            line('RKA5', 10, 'Completed', '1,300.00', '254799999999 - SOMEONE ELSE'),
+            line('RKA6', 20, 'Failed', '100.00', '254799999999 - SOMEONE ELSE'),
+            line('RKA7', 30, 'Completed', '', 'Business charges'),
+        ]
+
+    def test_phone_normalization_matches_stk_push(self):
+        for number in ('0712345678', '+254712345678', '254712345678', '712345678'):
+            self.assertEqual(normalize_phone(number), '254712345678')
+
+    def test_read_statement_skips_preamble_and_non_payments(self):
+        rows = list(read_statement(self.statement()))
+
+        self.assertEqual([row['receipt'] for row in rows], ['RKA1', 'RKA2', 'RKA4', 'RKA1', 'RKA5'])
+        self.assertEqual(rows[0]['phone'], '2547*****678')
+        self.assertEqual(rows[-1]['amount'], Decimal('1300.00'))
+        with self.assertRaises(StatementFormatError):
+            list(read_statement(['Date,Amount\n', '2026-10-01,100\n']))
+
+    def test_reconcile_reports_every_outcome(self):
+        exceptions = []
+        report = Reconciliation(chunk_size=2, on_exception=exceptions.append).run(read_statement(self.statement()))
+
+        self.assertEqual(report['rows'], 5)
+        self.assertEqual(report['amount'], Decimal('3950.00'))
+        self.assertEqual(report['counts'], {
+            Outcome.MATCHED: 1,
+            Outcome.MATCHED_WITHOUT_RECEIPT: 1,
+            Outcome.AMOUNT_MISMATCH: 1,
+            Outcome.PHONE_MISMATCH: 0,
+            Outcome.DUPLICATE: 1,
+            Outcome.MISSING_INTERNALLY: 1,
+            Outcome.MISSING_ON_STATEMENT: 1,
+        })
+        by_outcome = {item['outcome']: item for item in exceptions}
+        self.assertEqual(by_outcome[Outcome.AMOUNT_MISMATCH]['payment_intent'], str(self.short.pk))
+        self.assertEqual(by_outcome[Outcome.MATCHED_WITHOUT_RECEIPT]['payment_intent'], str(self.uncallbacked.pk))
+        self.assertEqual(by_outcome[Outcome.MISSING_ON_STATEMENT]['payment_intent'], str(self.unlisted.pk))
+        self.assertEqual(by_outcome[Outcome.MISSING_INTERNALLY]['receipt'], 'RKA5')
+
+    def test_receiptless_matches_are_limited_to_the_statement_period(self):
+        # Same amount and phone as the RKA5 row, but from months before the statement
+        old = create_intent(None, '0799999999', Decimal('1300'), 'EVT123')
+        PaymentIntent.objects.filter(pk=old.pk).update(
+            status=PaymentIntent.Status.EXPIRED, created_at=self.now - timedelta(days=90)
+        )
+        exceptions = []
+
+        report = Reconciliation(on_exception=exceptions.append).run(read_statement(self.statement()))
+
+        self.assertEqual(report['counts'][Outcome.MATCHED_WITHOUT_RECEIPT], 1)
+        missing = [item for item in exceptions if item['outcome'] == Outcome.MISSING_INTERNALLY]
+        self.assertEqual([item['receipt'] for item in missing], ['RKA5'])
+
+    def test_time_format_is_remembered_per_reconciliation(self):
+        first, second = Reconciliation(), Reconciliation()
+        first._track_period({'completed_at': '17/10/2026 09:30'})
+        second._track_period({'completed_at': '2026-10-17 09:30:00'})
+        first._track_period({'completed_at': '18/10/2026 09:30'})
+
+        self.assertEqual(first._time_format, '%d/%m/%Y %H:%M')
+        self.assertEqual(second._time_format, '%Y-%m-%d %H:%M:%S')
+        self.assertEqual((first.last_at - first.first_at).days, 1)
+
+    def test_one_receipt_query_per_chunk(self):
+        reconciliation = Reconciliation(chunk_size=2)
+        rows = [row for row in read_statement(self.statement()) if row['receipt'] in ('RKA1', 'RKA2')]
+
+        with self.assertNumQueries(1):
+            reconciliation._probe(rows)
+        self.assertEqual(reconciliation.counts[Outcome.MATCHED], 1)
+
+    def test_reconcile_endpoint_is_staff_only(self):
+        user = User.objects.create_user(
+            email='finance@example.com', password='TestPass123!', first_name='Fin', last_name='Ance'
+        )
+        auth = f"Bearer {RefreshToken.for_user(user).access_token}"
+
+        def upload():
+            statement = SimpleUploadedFile('statement.csv', ''.join(self.statement()).encode(), 'text/csv')
+            return self.client.post(reverse('reconcile_statement'), {'statement': statement}, HTTP_AUTHORIZATION=auth)
+
+        self.assertEqual(upload().status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = upload()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['counts'][Outcome.MATCHED], 1)
+        self.assertEqual(len(response.json()['exceptions']), 5)
+        self.assertFalse(response.json()['exceptions_truncated'])
+
+
+class StubProvider(PaymentProvider):
+    """Provider with a fixed latency that fails while `down` is set"""
+
+    def __init__(self, name, method='mpesa', latency=0.0):
+        self.name = name
+        self.method = method
+        self.latency = latency
+        self.down = False
+        self.error = None
+        self.calls = 0
+
+    def collect(self, phone_number, amount, reference, description):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.error:
+            raise self.error
+        if self.down:
+            raise ProviderError(f"{self.name} is down")
+        return {'ResponseCode': '0', 'provider': self.name}
+
+
+class PaymentRouterTests(TestCase):
+    """Test provider selection and failover with stubbed providers"""
+
+    def setUp(self):
+        metrics.reset()
+        self.kenya = Country.objects.create(
+            code='KE', name='Kenya', currency='KES', currency_symbol='KSh',
+            supports_mpesa=True, supports_airtel_money=True, supports_card=False,
+        )
+        self.fast = StubProvider('fast-mpesa', latency=0.001)
+        self.slow = StubProvider('slow-mpesa', latency=0.02)
+        self.card = StubProvider('card', method='card')
+        self.router = PaymentRouter([self.slow, self.fast, self.card], min_success_rate=0.8, probe_interval=60)
+
+    def collect(self):
+        return self.router.collect(self.kenya, '0712345678', Decimal('500'), 'EVT123', 'Tickets')[0]
+
+    def test_prefers_lower_latency(self):
+        for _ in range(2):  # Both are tried while their latency is unknown
+            self.collect()
+        self.assertEqual([self.collect() for _ in range(5)], ['fast-mpesa'] * 5)
+        self.assertEqual(self.card.calls, 0)  # Cards aren't supported in this country
+
+    def test_fails_over_when_provider_degrades(self):
+        self.collect()
+        self.collect()
+        self.fast.down = True
+
+        # Each failing call still succeeds through the other provider
+        self.assertEqual([self.collect() for _ in range(5)], ['slow-mpesa'] * 5)
+        # Two failures degrade it; after that it isn't tried first any more
+        self.assertEqual(self.fast.calls, 3)
+        self.assertLess(self.router.stats['fast-mpesa'].success_rate, 0.8)
+        self.assertEqual(metrics.counter('payments.router.failovers').value, 2)
+
+        # After the probe interval, a successful call makes it healthy again
+        self.fast.down = False
+        self.router.probe_interval = 0.01
+        time.sleep(0.02)
+        self.assertEqual(self.collect(), 'fast-mpesa')
+
+    def test_all_providers_down(self):
+        self.fast.down = self.slow.down = True
+        with self.assertRaises(NoProviderAvailable) as raised:
+            self.collect()
+        self.assertEqual(set(raised.exception.errors), {'fast-mpesa', 'slow-mpesa'})
+
+        with self.assertRaises(NoProviderAvailable):
+            self.router.collect(self.kenya, '0712345678', Decimal('500'), 'EVT123', 'Tickets', methods=['card'])
+
+    def test_ambiguous_failure_is_not_retried(self):
+        self.collect()
+        self.collect()
+        self.fast.error = requests.ReadTimeout("read timed out")
+
+        with self.assertRaises(PaymentUnconfirmed) as raised:
+            self.collect()
+
+        # The push may have reached the customer; trying the other provider could charge twice
+        self.assertEqual(raised.exception.provider, 'fast-mpesa')
+        self.assertEqual(self.slow.calls, 1)
+
+    def test_connect_failure_fails_over(self):
+        self.collect()
+        self.collect()
+        self.fast.error = requests.ConnectTimeout("connect timed out")
+
+        self.assertEqual(self.collect(), 'slow-mpesa')
@@ -0,0 +1,213 @@
+# backend/apps/payments/tokens.py
+import asyncio
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AccessTokenCache:
+    """
+    OAuth token cache shared by every worker through the Django cache.
+
+    - Tokens are kept for the `expires_in` Safaricom returns
+    - Once a token enters its refresh window it is still served while a
+      single background thread fetches the next one
+    - Only the caller holding the cache lock talks to the OAuth endpoint;
+      everyone else reuses the current token or waits for the new one
+    """
+
+    def __init__(self, key, fetch_token, refresh_margin=300, lock_timeout=30,
+                 wait_timeout=10, poll_interval=0.05):
+        # fetch_token() must return (access_token, expires_in_seconds)
+        self.key = key
+        self.lock_key = f"{key}:lock"
+        self.fetch_token = fetch_token
+        self.refresh_margin = refresh_margin
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+        self.hits = metrics.counter('mpesa.token.hits')
+        self.misses = metrics.counter('mpesa.token.misses')
+        self.refreshes = metrics.counter('mpesa.token.refreshes')
+
+    def get(self):
+        """Return a valid access token, fetching one only when necessary"""
+        entry = self._current()
+        if entry:
+            self.hits.inc()
+            if time.time() >= entry['refresh_at']:
+                self._refresh_in_background()
+            return entry['token']
+
+        self.misses.inc()
+        return self._refresh_blocking()
+
+    def invalidate(self):
+        """Drop the cached token (e.g. after Safaricom rejects it)"""
+        cache.delete(self.key)
+
+    def _current(self):
+        entry = cache.get(self.key)
+        if entry and time.time() < entry['expires_at']:
+            return entry
+        return None
+
+    def _acquire(self):
+        return cache.add(self.lock_key, 1, self.lock_timeout)
+
+    def _release(self):
+        cache.delete(self.lock_key)
+
+    def _refresh(self):
+        token, expires_in = self.fetch_token()
+        expires_in = int(expires_in)
+        now = time.time()
+        entry = {
+            'token': token,
+            'expires_at': now + expires_in,
+            'refresh_at': now + expires_in - min(self.refresh_margin, expires_in / 2),
+        }
+        cache.set(self.key, entry, expires_in)
+        self.refreshes.inc()
+        return entry
+
+    def _refresh_blocking(self):
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            if self._acquire():
+                try:
+                    # Another worker may have finished while we were waiting
+                    entry = self._current() or self._refresh()
+                    return entry['token']
+                finally:
+                    self._release()
+
+            time.sleep(self.poll_interval)
+            entry = self._current()
+            if entry:
+                return entry['token']
+
+            if time.monotonic() >= deadline:
+                # The lock holder is stuck; don't block the payment on it
+                logger.warning("Timed out waiting for M-Pesa token refresh, fetching directly")
+                return self._refresh()['token']
+
+    def _refresh_in_background(self):
+        if not self._acquire():
+            return
+
+        def run():
+            try:
+                self._refresh()
+            except Exception:
+                logger.exception("Background M-Pesa token refresh failed")
+            finally:
+                self._release()
+
+        threading.Thread(target=run, name='mpesa-token-refresh', daemon=True).start()
+
+
+class AsyncAccessTokenCache(AccessTokenCache):
+    """
+    asyncio flavour of AccessTokenCache.
+
+    Uses the same cache entries as the sync cache, so sync and async
+    workers share one token. `fetch_token` must be a coroutine function.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._background = set()
+        # Last entry seen by this process; skips the cache round trip
+        # (a thread hop for most backends) on the hot path
+        self._local = None
+
+    async def aget(self):
+        entry = self._local
+        if entry and time.time() < entry['refresh_at']:
+            self.hits.inc()
+            return entry['token']
+
+        entry = await self._acurrent()
+        if entry:
+            self.hits.inc()
+            if time.time() >= entry['refresh_at']:
+                await self._arefresh_in_background()
+            return entry['token']
+
+        self.misses.inc()
+        return await self._arefresh_blocking()
+
+    async def ainvalidate(self):
+        self._local = None
+        await cache.adelete(self.key)
+
+    async def _acurrent(self):
+        entry = await cache.aget(self.key)
+        if entry and time.time() < entry['expires_at']:
+            self._local = entry
+            return entry
+        return None
+
+    async def _aacquire(self):
+        return await cache.aadd(self.lock_key, 1, self.lock_timeout)
+
+    async def _arelease(self):
+        await cache.adelete(self.lock_key)
+
+    async def _arefresh(self):
+        token, expires_in = await self.fetch_token()
+        expires_in = int(expires_in)
+        now = time.time()
+        entry = {
+            'token': token,
+            'expires_at': now + expires_in,
+            'refresh_at': now + expires_in - min(self.refresh_margin, expires_in / 2),
+        }
+        await cache.aset(self.key, entry, expires_in)
+        self._local = entry
+        self.refreshes.inc()
+        return entry
+
+    async def _arefresh_blocking(self):
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            if await self._aacquire():
+                try:
+                    entry = await self._acurrent() or await self._arefresh()
+                    return entry['token']
+                finally:
+                    await self._arelease()
+
+            await asyncio.sleep(self.poll_interval)
+            entry = await self._acurrent()
+            if entry:
+                return entry['token']
+
+            if time.monotonic() >= deadline:
+                logger.warning("Timed out waiting for M-Pesa token refresh, fetching directly")
+                return (await self._arefresh())['token']
+
+    async def _arefresh_in_background(self):
+        if not await self._aacquire():
+            return
+
+        async def run():
+            try:
+                await self._arefresh()
+            except Exception:
+                logger.exception("Background M-Pesa token refresh failed")
+            finally:
+                await self._arelease()
+
+        # Keep a reference so the task isn't garbage collected mid-flight
+        task = asyncio.create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
@@ -0,0 +1,22 @@
+# backend/apps/payments/urls.py
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # M-Pesa (async views, served without blocking under ASGI)
+    path('mpesa/stk-push/', views.mpesa_stk_push, name='mpesa_stk_push'),
+    path('mpesa/b2c/', views.mpesa_b2c_payment, name='mpesa_b2c_payment'),
+    
+    # Checkout
+    path('quote/', views.CheckoutQuoteView.as_view(), name='checkout_quote'),
+
+    # Statements (streamed CSV)
+    path('statements/export/', views.FinanceExportView.as_view(), name='finance_export'),
+    path('statements/reconcile/', views.StatementReconciliationView.as_view(), name='reconcile_statement'),
+    path('statements/<uuid:organization_id>/', views.OrganizationStatementView.as_view(), name='organization_statement'),
+
+    # Safaricom callbacks (must match MPESA_CALLBACK_URL / RESULT_URL / TIMEOUT_URL)
+    path('mpesa/callback/', views.mpesa_stk_callback, name='mpesa_stk_callback'),
+    path('mpesa/result/', views.mpesa_b2c_result, name='mpesa_b2c_result'),
+    path('mpesa/timeout/', views.mpesa_b2c_timeout, name='mpesa_b2c_timeout'),
+]
@@ -1,3 +1,339 @@
-from django.shortcuts import render
+# backend/apps/payments/views.py
+import io
+import json
+import math
+from datetime import date, datetime, time
 
-# Create your views here.
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .callbacks import InvalidCallback, ingest_callback
+from .idempotency import (
+    HEADER, MAX_KEY_LENGTH, IdempotencyInProgress, IdempotencyKeyReused, fingerprint, idempotency
+)
+from .intents import acreate_intent, atransition, stk_push_fields
+from .models import MpesaCallback, PaymentIntent
+from .mpesa_async import AsyncMpesaGateway
+from .quotes import quote_cart
+from .reconciliation import Outcome, Reconciliation, StatementFormatError, read_statement
+from .resilience import UpstreamUnavailable
+from .serializers import StkPushSerializer, B2CPaymentSerializer, CheckoutQuoteSerializer, QuoteSerializer
+from .statements import csv_chunks, month_range, statement_rows, with_totals
+from .tax_rules import UnknownTaxCountry
+
+
+async def _authenticate(request):
+    """Resolve the user from a JWT bearer token, falling back to the session"""
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    if result is not None:
+        return result[0]
+
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def _parse_json(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+async def _idempotent(request, user, scope, view):
+    """
+    Run `view()` at most once per Idempotency-Key header, per user and endpoint.
+
+    Retries get the first response back (marked Idempotent-Replayed); a
+    retry that arrives while the first request is still running waits for
+    it. Requests without the header run as usual.
+    """
+    key = request.headers.get(HEADER)
+    if not key:
+        return await view()
+    if len(key) > MAX_KEY_LENGTH:
+        return JsonResponse({'detail': f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."}, status=400)
+
+    async def handler():
+        response = await view()
+        return response.status_code, response.content
+
+    try:
+        status_code, content, replayed = await idempotency.arun(
+            f"{scope}:{user.pk}:{key}", fingerprint(request.body), handler
+        )
+    except IdempotencyKeyReused as e:
+        return JsonResponse({
+            'error': str(e),
+            'detail': f"This {HEADER} was already used for a different request."
+        }, status=422)
+    except IdempotencyInProgress as e:
+        return JsonResponse({
+            'error': str(e),
+            'detail': 'A request with this key is still in progress. Retry shortly.'
+        }, status=409)
+
+    response = HttpResponse(content, status=status_code, content_type='application/json')
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+# Failures that prove the request never reached Safaricom
+NOT_SENT_ERRORS = (UpstreamUnavailable, aiohttp.ClientConnectorError, ConnectionRefusedError)
+
+
+def _unavailable(e):
+    """Fast failure (open circuit, full bulkhead, refused connection); nothing reached Safaricom"""
+    response = JsonResponse({
+        'error': str(e),
+        'detail': 'M-Pesa is temporarily unavailable. Please try again shortly.'
+    }, status=503)
+    retry_after = getattr(e, 'retry_after', None)
+    if retry_after:
+        response['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def mpesa_stk_push(request):
+    """Initiate an STK push without holding a worker thread (ASGI)"""
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    return await _idempotent(request, user, 'stk_push', lambda: _stk_push(request, user))
+
+
+async def _stk_push(request, user):
+    serializer = StkPushSerializer(data=_parse_json(request))
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+    data = serializer.validated_data
+
+    intent = await acreate_intent(
+        user,
+        data['phone_number'],
+        data['amount'],
+        data['account_reference'],
+        data['transaction_desc'],
+    )
+    try:
+        result = await AsyncMpesaGateway().stk_push(
+            data['phone_number'],
+            data['amount'],
+            data['account_reference'],
+            data['transaction_desc'],
+        )
+    except NOT_SENT_ERRORS as e:
+        await atransition(
+            intent, [PaymentIntent.Status.INITIATED], PaymentIntent.Status.FAILED, failure_reason=str(e)
+        )
+        return _unavailable(e)
+    except Exception as e:
+        # The push may already be on the customer's phone. The intent stays open until its
+        # callback or expiry, and this response is replayed to retries so no second push goes out.
+        return JsonResponse({
+            'error': str(e),
+            'detail': 'M-Pesa did not confirm the request. Check the payment status before retrying.',
+            'payment_intent': str(intent.pk),
+            'status': intent.status,
+        }, status=502)
+
+    status, fields = stk_push_fields(result)
+    await atransition(intent, [PaymentIntent.Status.INITIATED], status, **fields)
+    return JsonResponse({**result, 'payment_intent': str(intent.pk), 'status': status})
+
+
+@csrf_exempt
+@require_POST
+async def mpesa_b2c_payment(request):
+    """Send a B2C payout (staff only)"""
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    if not user.is_staff:
+        return JsonResponse({'detail': 'You do not have permission to perform this action.'}, status=403)
+    return await _idempotent(request, user, 'b2c', lambda: _b2c_payment(request))
+
+
+async def _b2c_payment(request):
+    serializer = B2CPaymentSerializer(data=_parse_json(request))
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+    data = serializer.validated_data
+
+    try:
+        result = await AsyncMpesaGateway().b2c_payment(
+            data['phone_number'],
+            data['amount'],
+            data['remarks'],
+        )
+    except NOT_SENT_ERRORS as e:
+        return _unavailable(e)
+    except Exception as e:
+        return JsonResponse({
+            'error': str(e),
+            'detail': 'M-Pesa did not confirm the request. Check for the B2C result before retrying.'
+        }, status=502)
+
+    return JsonResponse(result)
+
+
+class CheckoutQuoteView(APIView):
+    """Price a cart: per-line receipt breakdown and cart totals"""
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = CheckoutQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        try:
+            quote = quote_cart(
+                data['country'].upper(),
+                [(item['ticket_price'], item['quantity']) for item in data['items']],
+            )
+        except UnknownTaxCountry as e:
+            return Response({
+                'error': str(e),
+                'detail': 'We do not sell tickets in this country.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(QuoteSerializer(quote).data)
+
+
+def _csv_response(rows, filename):
+    response = StreamingHttpResponse(csv_chunks(with_totals(rows)), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class OrganizationStatementView(APIView):
+    """Monthly statement for one organization as a streamed CSV (?month=YYYY-MM)"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, organization_id):
+        from organizations.memberships import memberships_for
+
+        is_member = memberships_for(request).is_member(organization_id)
+        if not (is_member or request.user.is_staff):
+            return Response({
+                'detail': 'You do not have permission to perform this action.'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        month = request.query_params.get('month') or f"{timezone.localdate():%Y-%m}"
+        try:
+            start, end = month_range(month)
+        except ValueError as e:
+            return Response({
+                'error': str(e),
+                'detail': 'month must be YYYY-MM.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = statement_rows(start, end, organization=organization_id)
+        return _csv_response(rows, f"statement-{month}-{organization_id}.csv")
+
+
+class FinanceExportView(APIView):
+    """Every ledger transaction in [start, end) as a streamed CSV (staff only)"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            start = date.fromisoformat(request.query_params['start'])
+            end = date.fromisoformat(request.query_params['end'])
+        except (KeyError, ValueError) as e:
+            return Response({
+                'error': str(e),
+                'detail': 'start and end must be YYYY-MM-DD dates.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = statement_rows(_start_of_day(start), _start_of_day(end))
+        return _csv_response(rows, f"ledger-{start}-{end}.csv")
+
+
+class StatementReconciliationView(APIView):
+    """Upload an M-Pesa statement CSV (`statement`) and reconcile it against payment intents (staff only)"""
+    permission_classes = [IsAdminUser]
+    max_exceptions = 1000
+
+    def post(self, request):
+        upload = request.FILES.get('statement')
+        if upload is None:
+            return Response({
+                'detail': 'Attach the statement CSV as "statement".'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        exceptions = []
+
+        def collect(item):
+            if len(exceptions) < self.max_exceptions:
+                exceptions.append(item)
+
+        try:
+            report = Reconciliation(on_exception=collect).run(
+                read_statement(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''))
+            )
+        except (StatementFormatError, UnicodeDecodeError) as e:
+            return Response({
+                'error': str(e),
+                'detail': 'This does not look like an M-Pesa statement export.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        unmatched = sum(count for outcome, count in report['counts'].items() if outcome != Outcome.MATCHED)
+        report.update(
+            amount=str(report['amount']),
+            exceptions=exceptions,
+            exceptions_truncated=unmatched > len(exceptions),
+        )
+        return Response(report)
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _receive_callback(request, kind):
+    """Store the callback and acknowledge straight away"""
+    payload = _parse_json(request)
+    if not isinstance(payload, dict):
+        return JsonResponse({'ResultCode': 1, 'ResultDesc': 'Invalid JSON'}, status=400)
+    try:
+        ingest_callback(kind, payload)
+    except InvalidCallback as e:
+        return JsonResponse({'ResultCode': 1, 'ResultDesc': str(e)}, status=400)
+    return JsonResponse({'ResultCode': 0, 'ResultDesc': 'Accepted'})
+
+
+@csrf_exempt
+@require_POST
+def mpesa_stk_callback(request):
+    """STK push result (CallBackURL)"""
+    return _receive_callback(request, MpesaCallback.Kind.STK)
+
+
+@csrf_exempt
+@require_POST
+def mpesa_b2c_result(request):
+    """B2C payout result (ResultURL)"""
+    return _receive_callback(request, MpesaCallback.Kind.B2C_RESULT)
+
+
+@csrf_exempt
+@require_POST
+def mpesa_b2c_timeout(request):
+    """B2C queue timeout (QueueTimeOutURL)"""
+    return _receive_callback(request, MpesaCallback.Kind.B2C_TIMEOUT)